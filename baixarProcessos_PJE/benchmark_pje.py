@@ -0,0 +1,409 @@
+# benchmark_pje.py
+# Roda o fluxo completo (login + Acesso Rápido + PDF) com Chrome headless contra o mock_pje_server.py e mede
+# processos/hora, p50/p95 de cada passo e o pico de memória (Python + chromedriver + Chrome).
+#
+# Uso: python benchmark_pje.py [--processos 50] [--workers 2] [--motor http] [--latencia 0.1]
+#                              [--enxuto | --comparar-perfis]
+#                              [--motor-navegacao cdp --abas 4 --limite-por-host 4 | --comparar-motores]
+#                              [--saida resultado.json] [--base resultado_anterior.json] [--tolerancia 0.15]
+# Com --base, compara com uma execução anterior e sai com código 1 se houver regressão acima da tolerância.
+# Com --comparar-perfis, roda com o perfil padrão do Chrome e com o enxuto (PJE_NAVEGADOR_ENXUTO) e compara.
+# Com --comparar-motores, roda o pool Selenium (--workers navegadores) e o motor CDP (--abas abas em um
+# navegador) e compara vazão e memória.
+# Com --convergencia, não abre navegador: simula o fluxo só com HTTP contra o mock com --capacidade limitada e
+# verifica se o agendador adaptativo (pje_agendador) converge para perto da capacidade do servidor.
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+
+import mock_pje_server
+import pje_abas
+import pje_agendador
+import pje_cnj
+import pje_downloader
+import pje_ledger
+import pje_metricas
+import pje_scraper
+import pje_sessao
+
+
+def gerar_numeros_cnj(quantidade, ano=2024, origem="6100"):
+    """Números CNJ sintéticos válidos (Justiça Federal, TRF3) com dígito verificador correto."""
+    numeros = []
+    for sequencial in range(1, quantidade + 1):
+        sem_digito = f"{sequencial:07d}00{ano:04d}403{origem}"
+        numeros.append(sem_digito[:7] + pje_cnj.calcular_digito(sem_digito) + sem_digito[9:])
+    return numeros
+
+
+class _AmostradorMemoria(threading.Thread):
+    """Amostra periodicamente o RSS da árvore de processos deste script (inclui chromedriver e Chrome)."""
+
+    def __init__(self, intervalo=0.5):
+        super().__init__(name="amostrador-memoria-pje", daemon=True)
+        self.intervalo = intervalo
+        self.pico_mb = 0.0
+        self._parar = threading.Event()
+
+    def run(self):
+        while not self._parar.is_set():
+            self.pico_mb = max(self.pico_mb, pje_abas.rss_arvore_processos_mb(os.getpid()))
+            self._parar.wait(self.intervalo)
+
+    def parar(self):
+        self._parar.set()
+        self.join()
+
+
+def _passos_do_servidor(estado):
+    """Tempos entre eventos vistos pelo mock, por processo: sugestão -> página dos autos -> pedido do PDF."""
+    sugestao, autos, pdf = {}, {}, {}
+    for instante, tipo, dados in estado.eventos:
+        if tipo == "sugestao":
+            sugestao.setdefault(str(mock_pje_server.id_processo(dados["numero"])), instante)
+        elif tipo == "autos":
+            autos.setdefault(dados["id"], instante)
+        elif tipo == "pdf":
+            pdf.setdefault(dados["id"], instante)
+    return {
+        "servidor_sugestao_ate_autos": [autos[i] - sugestao[i] for i in autos if i in sugestao],
+        "servidor_autos_ate_pdf": [pdf[i] - autos[i] for i in pdf if i in autos],
+    }
+
+
+def executar_benchmark(processos=20, workers=1, motor="http", latencia=0.05, jitter=0.0, taxa_erro=0.0,
+                       tamanho_pdf=1024 * 1024, capacidade=0, headless=True, enxuto=False,
+                       motor_navegacao="selenium", abas=4, limite_por_host=4):
+    """Executa um benchmark completo e retorna um dicionário com os resultados."""
+    import main_pje
+
+    config = mock_pje_server.ConfigMock(latencia=latencia, jitter=jitter, taxa_erro=taxa_erro,
+                                        tamanho_pdf=tamanho_pdf, capacidade=capacidade)
+    servidor, url_base, _, estado = mock_pje_server.iniciar_servidor_mock(config=config)
+    pje_scraper.URL_ACESSO_PJE_TRF3 = f"{url_base}/pje/acesso-ao-sistema"
+    os.environ["PJE_HEADLESS"] = "1" if headless else "0"
+    os.environ["PJE_NAVEGADOR_ENXUTO"] = "1" if enxuto else "0"
+    if motor_navegacao == "cdp":
+        # Um navegador só; o motor CDP sempre grava o PDF via HTTP
+        workers, motor = 1, "http"
+        print(f"Mock PJe em {url_base} | {processos} processos | motor CDP com {abas} abas "
+              f"(até {limite_por_host} por host){' | perfil enxuto' if enxuto else ''}")
+    else:
+        print(f"Mock PJe em {url_base} | {processos} processos | {workers} workers | motor '{motor}'"
+              f"{' | perfil enxuto' if enxuto else ''}")
+
+    with tempfile.TemporaryDirectory(prefix="benchmark_pje_") as pasta:
+        ingestao_concluida = threading.Event()
+        ingestao_concluida.set()
+        cfg = {
+            "pje_user": "benchmark",
+            "pje_pass": "benchmark",
+            "apsdj_folder_path": pasta,
+            "pasta_debug": os.path.join(pasta, "downloads"),
+            "caminho_sessao": None,
+            "url_pje_home": f"{url_base}/pje1g.trf3.jus.br/pje/home.seam",
+            "num_workers": workers,
+            "motor_download": motor,
+            "cache_autos": True,
+            "impressao_autos": True,
+            "motor_navegacao": motor_navegacao,
+            "abas_cdp": abas,
+            "limite_por_host": limite_por_host,
+            # Sem teto por host (o mock é local): só o AIMD de simultâneos atua
+            "agendador": pje_agendador.AgendadorPJe(abas if motor_navegacao == "cdp" else workers,
+                                                    taxa_padrao=1000.0),
+            "ingestao_concluida": ingestao_concluida,
+        }
+        ledger = pje_ledger.LedgerPJe(os.path.join(pasta, "benchmark.sqlite3"), max_tentativas=3, backoff_base=1.0)
+        ledger.adicionar_processos(gerar_numeros_cnj(processos))
+        caminho_metricas = os.path.join(pasta, "metricas.jsonl")
+        pje_metricas.configurar_metricas(caminho_metricas)
+
+        amostrador = _AmostradorMemoria()
+        amostrador.start()
+        inicio_epoch, inicio = time.time(), time.monotonic()
+        try:
+            main_pje.executar_processos_pje(ledger, cfg)
+        finally:
+            duracao = time.monotonic() - inicio
+            amostrador.parar()
+            servidor.shutdown()
+            pje_metricas.encerrar_metricas()
+            cfg["agendador"].fechar()
+
+        contagem = ledger.contar_por_estado()
+        # Passos medidos pelos spans do scraper, pelo ledger (ledger.*) e pelo servidor (servidor_*)
+        passos = {}
+        for registro in pje_metricas.ler_spans([caminho_metricas]):
+            passos.setdefault(registro["passo"], []).append(registro["segundos"])
+        for passo, valores in ledger.duracoes_por_passo(desde=inicio_epoch).items():
+            passos[f"ledger.{passo}"] = valores
+        ledger.fechar()
+    passos.update(_passos_do_servidor(estado))
+
+    concluidos = contagem.get(pje_ledger.CONCLUIDO, 0)
+    return {
+        "config": {"processos": processos, "workers": workers, "motor": motor, "latencia": latencia,
+                   "jitter": jitter, "taxa_erro": taxa_erro, "tamanho_pdf": tamanho_pdf, "capacidade": capacidade,
+                   "enxuto": enxuto, "motor_navegacao": motor_navegacao,
+                   "abas": abas if motor_navegacao == "cdp" else None},
+        "concluidos": concluidos,
+        "falhos": contagem.get(pje_ledger.FALHOU, 0),
+        "duracao_s": round(duracao, 2),
+        "processos_por_hora": round(concluidos / duracao * 3600, 1) if duracao else 0.0,
+        "pico_memoria_mb": round(amostrador.pico_mb, 1),
+        # No motor CDP a "unidade de trabalho" é a aba
+        "memoria_por_worker_mb": round(amostrador.pico_mb / max(1, abas if motor_navegacao == "cdp" else workers),
+                                       1),
+        "bytes_transferidos": sum(estado.bytes_por_tipo.values()),
+        "bytes_por_tipo": dict(estado.bytes_por_tipo),
+        "passos": {passo: {"n": len(valores), "p50": round(pje_metricas.percentil(valores, 50), 3),
+                           "p95": round(pje_metricas.percentil(valores, 95), 3)}
+                   for passo, valores in sorted(passos.items()) if valores},
+        "eventos_servidor": dict(estado.contadores),
+    }
+
+
+def executar_convergencia(capacidade=4, limite_max=16, duracao=60.0, latencia=0.05, tamanho_pdf=64 * 1024):
+    """Simula o fluxo só com HTTP (home -> Acesso Rápido -> autos -> PDF) em `limite_max` threads contra o mock com
+    `capacidade` limitada e mede como o limite de simultâneos do agendador evolui.
+
+    Converge se, na segunda metade, o limite médio (ponderado pelo tempo) fica entre 40% e 150% da capacidade:
+    o AIMD oscila em dente de serra em volta dela, sondando com +1 e recuando à metade a cada 503/lentidão.
+    """
+    import requests
+
+    config = mock_pje_server.ConfigMock(latencia=latencia, tamanho_pdf=tamanho_pdf, capacidade=capacidade,
+                                        peso_recursos=0)
+    servidor, url_base, _, estado = mock_pje_server.iniciar_servidor_mock(config=config)
+    sessao = requests.Session()
+    sessao.post(f"{url_base}/sso.cloud.pje.jus.br/login-actions/authenticate",
+                data={"username": "benchmark", "password": "benchmark"})
+    cookies = [{"name": c.name, "value": c.value, "domain": c.domain, "path": c.path} for c in sessao.cookies]
+    agendador = pje_agendador.AgendadorPJe(limite_max, taxa_padrao=1000.0, intervalo_reducao=2.0)
+    url_home = f"{url_base}/pje1g.trf3.jus.br/pje/home.seam"
+    numeros = iter(pje_scraper.format_process_number_for_pje_input(n) for n in gerar_numeros_cnj(1_000_000))
+    lock = threading.Lock()
+    resultados = []  # (monotonic do fim, sucesso)
+    inicio = time.monotonic()
+    print(f"Convergência: mock com capacidade {capacidade}, até {limite_max} simultâneos, {duracao:.0f} s...")
+
+    def _processo(http, downloader, numero):
+        with pje_metricas.span("processo.reset_home"):
+            resposta = http.get(url_home, timeout=30)
+            if resposta.status_code >= 500:
+                agendador.registrar_resposta_http(url_home, resposta.status_code, resposta.headers.get("Retry-After"))
+                return False
+        with pje_metricas.span("acesso.passo4_aba_autos"):
+            sugestao = http.get(f"{url_base}/pje1g.trf3.jus.br/pje/seam/resource/pesquisaRapida",
+                                params={"numero": numero}, timeout=30)
+            if sugestao.status_code >= 500:
+                agendador.registrar_resposta_http(sugestao.url, sugestao.status_code,
+                                                  sugestao.headers.get("Retry-After"))
+                return False
+            url_autos = url_base + sugestao.json()["url"]
+            autos = http.get(url_autos, timeout=30)
+            if autos.status_code >= 500:
+                agendador.registrar_resposta_http(url_autos, autos.status_code, autos.headers.get("Retry-After"))
+                return False
+        id_processo = mock_pje_server.id_processo(numero)
+        return downloader.baixar_pdf(f"{url_base}/pje-downloads.trf3.jus.br/download/{id_processo}.pdf",
+                                     numero.replace("-", "").replace(".", ""), url_autos) is not None
+
+    def _thread(pasta):
+        http = pje_sessao.criar_sessao_http(cookies)
+        downloader = pje_downloader.DownloaderPJe(pasta, cookies, agendador=agendador)
+        while time.monotonic() - inicio < duracao:
+            agendador.ocupar_vaga()
+            try:
+                with lock:
+                    numero = next(numeros)
+                inicio_processo = time.monotonic()
+                try:
+                    sucesso = _processo(http, downloader, numero)
+                except requests.RequestException:
+                    sucesso = False
+                pje_metricas.registrar_span("processo.total", time.monotonic() - inicio_processo,
+                                            pje_metricas.OK if sucesso else pje_metricas.FALHA)
+                with lock:
+                    resultados.append((time.monotonic(), sucesso))
+            finally:
+                agendador.liberar_vaga()
+
+    with tempfile.TemporaryDirectory(prefix="convergencia_pje_") as pasta:
+        threads = [threading.Thread(target=_thread, args=(pasta,), daemon=True) for _ in range(limite_max)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    servidor.shutdown()
+    agendador.fechar()
+
+    metade = inicio + duracao / 2
+    historico = [(inicio, float(limite_max))] + agendador.historico
+    # Média do limite na segunda metade, ponderada pelo tempo em que cada valor vigorou
+    pontos = [(t, limite) for t, limite in historico if t >= metade]
+    anterior = max((h for h in historico if h[0] < metade), key=lambda h: h[0])
+    pontos = [(metade, anterior[1])] + pontos + [(inicio + duracao, None)]
+    limite_medio = sum(int(l) * (pontos[i + 1][0] - t) for i, (t, l) in enumerate(pontos[:-1])) / (duracao / 2)
+    erros_503 = [ts for ts, tipo, _ in estado.eventos if tipo == "erro_503"]
+    epoch_metade = time.time() - (time.monotonic() - metade)
+    taxa_503 = (sum(1 for ts in erros_503 if ts < epoch_metade), sum(1 for ts in erros_503 if ts >= epoch_metade))
+    concluidos = [(ts, ok) for ts, ok in resultados if ok]
+    resultado = {
+        "capacidade": capacidade,
+        "limite_max": limite_max,
+        "limite_final": int(agendador.limite),
+        "limite_medio_segunda_metade": round(limite_medio, 2),
+        "erros_503_primeira_metade": taxa_503[0],
+        "erros_503_segunda_metade": taxa_503[1],
+        "processos_por_hora": round(len(concluidos) / duracao * 3600, 1),
+        "sinais": dict(agendador.sinais),
+        "historico_limite": [(round(t - inicio, 1), int(l)) for t, l in agendador.historico],
+    }
+    resultado["convergiu"] = 0.4 * capacidade <= limite_medio <= 1.5 * capacidade
+    return resultado
+
+
+def comparar_com_base(resultado, base, tolerancia=0.15):
+    """Lista as regressões em relação a uma execução anterior (vazão menor, p95 ou memória maiores)."""
+    regressoes = []
+    if resultado["processos_por_hora"] < base["processos_por_hora"] * (1 - tolerancia):
+        regressoes.append(f"processos/hora: {base['processos_por_hora']} -> {resultado['processos_por_hora']}")
+    if resultado["pico_memoria_mb"] > base["pico_memoria_mb"] * (1 + tolerancia):
+        regressoes.append(f"pico de memória (MB): {base['pico_memoria_mb']} -> {resultado['pico_memoria_mb']}")
+    for passo, atual in resultado["passos"].items():
+        anterior = base.get("passos", {}).get(passo)
+        if anterior and atual["p95"] > anterior["p95"] * (1 + tolerancia):
+            regressoes.append(f"p95 de '{passo}' (s): {anterior['p95']} -> {atual['p95']}")
+    return regressoes
+
+
+def comparar_perfis(padrao, enxuto):
+    """Tabela perfil padrão x enxuto: tempo de carga das páginas, bytes transferidos e memória por worker."""
+    def _p50(resultado, passo):
+        return resultado["passos"].get(passo, {}).get("p50")
+
+    linhas = [("processos/hora", padrao["processos_por_hora"], enxuto["processos_por_hora"]),
+              ("bytes transferidos (MB)", round(padrao["bytes_transferidos"] / 1024 / 1024, 2),
+               round(enxuto["bytes_transferidos"] / 1024 / 1024, 2)),
+              ("memória por worker (MB)", padrao["memoria_por_worker_mb"], enxuto["memoria_por_worker_mb"])]
+    for passo in ("login.total", "processo.reset_home", "acesso.passo4_aba_autos", "processo.total"):
+        linhas.append((f"p50 {passo} (s)", _p50(padrao, passo), _p50(enxuto, passo)))
+    print("\n========== Perfil padrão x perfil enxuto ==========")
+    print(f"{'métrica':<34}{'padrão':>12}{'enxuto':>12}{'variação':>10}")
+    for nome, valor_padrao, valor_enxuto in linhas:
+        variacao = (f"{(valor_enxuto - valor_padrao) / valor_padrao * 100:+.0f}%"
+                    if valor_padrao and valor_enxuto is not None else "-")
+        print(f"{nome:<34}{str(valor_padrao):>12}{str(valor_enxuto):>12}{variacao:>10}")
+
+
+def comparar_motores(selenium, cdp):
+    """Tabela pool Selenium (N navegadores) x motor CDP (K abas em um navegador): vazão e memória."""
+    linhas = [("processos/hora", selenium["processos_por_hora"], cdp["processos_por_hora"]),
+              ("pico de memória (MB)", selenium["pico_memoria_mb"], cdp["pico_memoria_mb"]),
+              ("memória por worker/aba (MB)", selenium["memoria_por_worker_mb"], cdp["memoria_por_worker_mb"]),
+              ("concluídos", selenium["concluidos"], cdp["concluidos"])]
+    for passo in ("processo.total", "acesso.passo4_aba_autos", "acesso.passo7_download_http"):
+        linhas.append((f"p50 {passo} (s)", selenium["passos"].get(passo, {}).get("p50"),
+                       cdp["passos"].get(passo, {}).get("p50")))
+    print(f"\n===== Selenium ({selenium['config']['workers']} workers) x CDP ({cdp['config']['abas']} abas) =====")
+    print(f"{'métrica':<34}{'selenium':>12}{'cdp':>12}{'variação':>10}")
+    for nome, valor_selenium, valor_cdp in linhas:
+        variacao = (f"{(valor_cdp - valor_selenium) / valor_selenium * 100:+.0f}%"
+                    if valor_selenium and valor_cdp is not None else "-")
+        print(f"{nome:<34}{str(valor_selenium):>12}{str(valor_cdp):>12}{variacao:>10}")
+
+
+def imprimir_resultado(resultado):
+    print("\n================ Benchmark PJe ================")
+    print(f"Concluídos: {resultado['concluidos']} | Falhos: {resultado['falhos']} | "
+          f"Duração: {resultado['duracao_s']} s")
+    print(f"Vazão: {resultado['processos_por_hora']} processos/hora")
+    print(f"Pico de memória (Python + chromedriver + Chrome): {resultado['pico_memoria_mb']} MB "
+          f"({resultado['memoria_por_worker_mb']} MB por worker)")
+    print(f"Bytes servidos pelo mock: {resultado['bytes_transferidos']} {resultado['bytes_por_tipo']}")
+    print(f"{'passo':<32}{'n':>6}{'p50 (s)':>10}{'p95 (s)':>10}")
+    for passo, estatisticas in resultado["passos"].items():
+        print(f"{passo:<32}{estatisticas['n']:>6}{estatisticas['p50']:>10}{estatisticas['p95']:>10}")
+    print(f"Eventos no servidor: {resultado['eventos_servidor']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark do fluxo PJe contra o servidor simulado.")
+    parser.add_argument("--processos", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--motor", choices=["http", "navegador"], default="http")
+    parser.add_argument("--latencia", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--taxa-erro", type=float, default=0.0)
+    parser.add_argument("--tamanho-pdf", type=int, default=1024 * 1024)
+    parser.add_argument("--capacidade", type=int, default=0)
+    parser.add_argument("--com-janela", action="store_true", help="abre o Chrome com janela (padrão: headless)")
+    parser.add_argument("--enxuto", action="store_true", help="usa o perfil enxuto do Chrome (PJE_NAVEGADOR_ENXUTO)")
+    parser.add_argument("--comparar-perfis", action="store_true",
+                        help="roda com o perfil padrão e com o enxuto e mostra a diferença")
+    parser.add_argument("--motor-navegacao", choices=["selenium", "cdp"], default="selenium")
+    parser.add_argument("--abas", type=int, default=4, help="abas simultâneas no motor CDP")
+    parser.add_argument("--limite-por-host", type=int, default=4)
+    parser.add_argument("--comparar-motores", action="store_true",
+                        help="roda o pool Selenium e o motor CDP e mostra a diferença")
+    parser.add_argument("--convergencia", action="store_true",
+                        help="sem navegador: verifica se o agendador converge para a --capacidade do mock")
+    parser.add_argument("--duracao", type=float, default=60.0, help="duração da simulação de convergência (s)")
+    parser.add_argument("--saida", help="grava o resultado em JSON")
+    parser.add_argument("--base", help="JSON de uma execução anterior para detectar regressões")
+    parser.add_argument("--tolerancia", type=float, default=0.15)
+    args = parser.parse_args(argv)
+
+    if args.convergencia:
+        resultado = executar_convergencia(args.capacidade or 4, max(args.workers, 16), args.duracao, args.latencia)
+        historico = resultado.pop("historico_limite")
+        print(json.dumps(resultado, ensure_ascii=False, indent=2))
+        print("Limite de simultâneos (s: limite): " + ", ".join(f"{t}: {l}" for t, l in historico))
+        if args.saida:
+            with open(args.saida, "w", encoding="utf-8") as f:
+                json.dump(dict(resultado, historico_limite=historico), f, ensure_ascii=False, indent=2)
+        return 0 if resultado["convergiu"] else 1
+
+    parametros = (args.processos, args.workers, args.motor, args.latencia, args.jitter, args.taxa_erro,
+                  args.tamanho_pdf, args.capacidade)
+    motor_cdp = {"abas": args.abas, "limite_por_host": args.limite_por_host}
+    if args.comparar_perfis:
+        padrao = executar_benchmark(*parametros, headless=True, enxuto=False,
+                                    motor_navegacao=args.motor_navegacao, **motor_cdp)
+        imprimir_resultado(padrao)
+    if args.comparar_motores:
+        selenium = executar_benchmark(*parametros, headless=not args.com_janela, enxuto=args.enxuto)
+        imprimir_resultado(selenium)
+    resultado = executar_benchmark(*parametros, headless=not args.com_janela,
+                                   enxuto=args.enxuto or args.comparar_perfis,
+                                   motor_navegacao="cdp" if args.comparar_motores else args.motor_navegacao,
+                                   **motor_cdp)
+    imprimir_resultado(resultado)
+    if args.comparar_perfis:
+        comparar_perfis(padrao, resultado)
+    if args.comparar_motores:
+        comparar_motores(selenium, resultado)
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, ensure_ascii=False, indent=2)
+        print(f"Resultado gravado em {args.saida}")
+    if args.base:
+        with open(args.base, "r", encoding="utf-8") as f:
+            regressoes = comparar_com_base(resultado, json.load(f), args.tolerancia)
+        if regressoes:
+            print("REGRESSÕES em relação à base:")
+            for regressao in regressoes:
+                print(f"  - {regressao}")
+            return 1
+        print("Sem regressões em relação à base.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,106 +1,436 @@
 # main_pje.py
 import os
 import time
-import pandas as pd
+import shutil
+import threading
+import traceback
 from datetime import datetime
+from urllib.parse import urlparse
 from selenium import webdriver
 from selenium.common.exceptions import WebDriverException
 import pje_scraper
+import pje_sessao
+import pje_downloader
+import pje_abas
+import pje_ledger
+import pje_planilha
+import pje_cnj
+import pje_metricas
+import pje_delta
+import pje_agendador
 from dotenv import load_dotenv
 
 # Carrega as variáveis do arquivo .env para o ambiente
 load_dotenv()
 
-# --- Variáveis Globais ---
-driver_pje_global = None
-processos_pje_processados_set = set()
-
-
-def carregar_log_pje(caminho_log):
-    """Carrega os números de processos já processados do arquivo de log."""
-    if os.path.exists(caminho_log):
-        with open(caminho_log, 'r') as f:
-            for line in f:
-                processos_pje_processados_set.add(line.strip())
-    print(f"{len(processos_pje_processados_set)} processos PJe já constam como processados no log.")
-
-
-def registrar_processo_concluido_pje(numero_processo, caminho_log):
-    """Registra um número de processo como concluído no arquivo de log."""
-    with open(caminho_log, 'a') as f:
-        f.write(f"{numero_processo}\n")
-    processos_pje_processados_set.add(numero_processo)
-    print(f"  [Log PJe] Processo '{numero_processo}' marcado como concluído (página do PDF aberta).")
-
-
 def ler_planilha_pje(caminho_planilha):
     """Lê a planilha, procura pela coluna de processos e retorna uma lista de números de processos válidos."""
+    return [numero for lote in iterar_planilha_pje(caminho_planilha) for numero in lote]
+
+
+def iterar_planilha_pje(caminho_planilha):
+    """Gera lotes de números de processos válidos, lendo a planilha em streaming (xlsx, xls, csv ou parquet)."""
     try:
         print(f"Lendo planilha PJe: {caminho_planilha}")
-        if not os.path.exists(caminho_planilha):
-            raise FileNotFoundError(f"Arquivo não encontrado: {caminho_planilha}")
-
-        # Lê a planilha, usando a primeira linha como cabeçalho
-        df = pd.read_excel(caminho_planilha, dtype=str, header=0)
-
-        if df.empty:
-            print("AVISO: A planilha PJe está vazia.")
-            return []
-
-        # Procura a coluna que contém "processo" no nome (ignorando maiúsculas/minúsculas)
-        coluna_processo = None
-        for col in df.columns:
-            if "processo" in str(col).lower():
-                coluna_processo = col
-                print(f"    Coluna de processos encontrada: '{coluna_processo}'")
-                break
-
-        if coluna_processo is None:
-            print("ERRO: Nenhuma coluna com 'processo' no nome foi encontrada na planilha.")
-            print(
-                "       Verifique se a primeira linha da sua planilha contém o cabeçalho 'Número do Processo' ou similar.")
-            return []
-
-        numeros_processos_pje = []
-        for valor in df[coluna_processo].dropna():
-            num_str = str(valor).strip()
-            numeros_apenas = ''.join(filter(str.isdigit, num_str))
-            if 15 <= len(numeros_apenas) <= 20:
-                numeros_processos_pje.append(numeros_apenas)
-            elif num_str:
-                print(f"    Valor inválido ou não reconhecido na coluna de processos: '{num_str}'")
-
-        return numeros_processos_pje
+        yield from pje_planilha.iterar_lotes_processos(caminho_planilha, coluna=os.getenv("PJE_COLUNA_PROCESSO"))
+    except LookupError:
+        print("ERRO: Nenhuma coluna com 'processo' no nome foi encontrada na planilha.")
+        print(
+            "       Verifique se a primeira linha da sua planilha contém o cabeçalho 'Número do Processo' ou similar.")
     except Exception as e:
         print(f"ERRO ao ler a planilha PJe: {e}")
-        return []
 
 
-def inicializar_driver_pje(pasta_download):
-    """Inicializa e retorna o WebDriver para o PJe."""
-    global driver_pje_global
-    if driver_pje_global is None:
-        print("--- Inicializando WebDriver para PJe ---")
-        if not os.path.exists(pasta_download):
-            os.makedirs(pasta_download)
-            print(f"Pasta de download/debug criada em: {pasta_download}")
+def _chaves_log_legado(numeros):
+    """Converte os números do log legado (gravados crus) nas chaves do ledger: a forma CNJ normalizada quando
+    PJE_VALIDAR_CNJ=1, o próprio valor nos demais casos."""
+    if os.getenv("PJE_VALIDAR_CNJ", "1") != "1":
+        return numeros
+    lote_cnj = pje_cnj.normalizar_lote(numeros)
+    return lote_cnj.validos + [valor for valor, _ in lote_cnj.invalidos]
+
+
+def _ingerir_planilha_pje(caminho_planilha, ledger, ingestao_concluida):
+    """Produtor: lê a planilha em lotes e enfileira cada lote no ledger assim que é lido."""
+    validar_cnj = os.getenv("PJE_VALIDAR_CNJ", "1") == "1"
+    try:
+        total_lidos = total_novos = 0
+        rejeitados = []
+        for lote in iterar_planilha_pje(caminho_planilha):
+            if validar_cnj:
+                # Números com dígito verificador/tribunal inválidos nem chegam ao navegador; os demais entram
+                # na fila já na forma normalizada de 20 dígitos
+                lote_cnj = pje_cnj.normalizar_lote(lote)
+                rejeitados.extend(lote_cnj.invalidos)
+                valores_invalidos = {valor for valor, _ in lote_cnj.invalidos}
+                crus = [numero for numero in lote if numero not in valores_invalidos]
+                # Ledgers de execuções anteriores podem ter o número cru como chave
+                ledger.renomear_processos(zip(crus, lote_cnj.validos))
+                lote = lote_cnj.validos
+            total_lidos += len(lote)
+            total_novos += ledger.adicionar_processos(lote)
+        if rejeitados:
+            print(pje_cnj.relatorio_invalidos(rejeitados))
+        print(f"Planilha lida: {total_lidos} processos válidos, {total_novos} novos no ledger.")
+    finally:
+        ledger.fechar()
+        ingestao_concluida.set()
+
+
+def criar_driver_pje(pasta_download, pasta_perfil=None):
+    """Cria uma nova sessão independente do WebDriver para o PJe (retorna None em caso de falha).
+
+    Com PJE_NAVEGADOR_ENXUTO=1 o Chrome sobe headless, com perfil próprio em `pasta_perfil` (recriado a cada
+    início, para não herdar cookies nem cache) e com imagens, fontes, mídia e analytics bloqueados via CDP.
+    """
+    os.makedirs(pasta_download, exist_ok=True)
+    enxuto = os.getenv("PJE_NAVEGADOR_ENXUTO", "0") == "1"
+    if enxuto and pasta_perfil:
+        shutil.rmtree(pasta_perfil, ignore_errors=True)
+        os.makedirs(pasta_perfil, exist_ok=True)
+    chrome_options_pje = pje_scraper.configurar_chrome_options_pje(
+        pasta_download, headless=os.getenv("PJE_HEADLESS", "0") == "1", enxuto=enxuto,
+        user_data_dir=pasta_perfil if enxuto else None)
+    try:
+        driver = webdriver.Chrome(options=chrome_options_pje)
+    except WebDriverException as e:
+        print(f"ERRO ao inicializar o WebDriver para PJe: {e}")
+        return None
+    if enxuto:
+        padroes = list(pje_scraper.PADROES_BLOQUEADOS_PJE)
+        if os.getenv("PJE_BLOQUEAR_CSS", "0") == "1":
+            padroes += pje_scraper.PADROES_BLOQUEADOS_CSS
+        pje_scraper.aplicar_bloqueio_recursos(driver, padroes)
+    return driver
+
+
+def pasta_perfil_worker_pje(apsdj_folder_path, worker):
+    """Pasta do perfil (user-data-dir) do Chrome de um worker no modo enxuto."""
+    return os.path.join(apsdj_folder_path, "pje_trf3_perfis_chrome", worker)
+
+
+def fazer_login_pje(driver, pje_user, pje_pass, pasta_debug, caminho_sessao, url_pje_home, agendador=None):
+    """Faz login no PJe reaproveitando a sessão salva em disco, se houver (caminho_sessao=None desativa o cache)."""
+    if agendador is not None:
+        agendador.aguardar_host(pje_scraper.URL_ACESSO_PJE_TRF3)
+    if not caminho_sessao:
+        return pje_scraper.login_pje_trf3(driver, pje_user, pje_pass, pasta_debug=pasta_debug)
+    return pje_sessao.login_pje_trf3_com_sessao(driver, pje_user, pje_pass, pasta_debug, caminho_sessao, url_pje_home,
+                                               chave_secreta=os.getenv("PJE_SESSAO_CHAVE"))
+
+
+def criar_downloader_pje(driver, motor_download, pasta_download, agendador=None):
+    """Retorna o DownloaderPJe (motor 'http') com os cookies da sessão logada, ou None no motor 'navegador'."""
+    if motor_download != "http":
+        return None
+    return pje_downloader.DownloaderPJe.a_partir_do_driver(driver, pasta_download, agendador=agendador)
+
+
+def criar_agendador_pje(cfg, ledger):
+    """Agendador adaptativo (pje_agendador) com os limites do .env; o teto de simultâneos é o de workers/abas."""
+    taxas = pje_agendador.ler_taxas_por_host(os.getenv(
+        "PJE_TAXA_POR_HOST", "trf3.jus.br=1,pje1g.trf3.jus.br=2,pje-downloads.trf3.jus.br=2"))
+    limite_max = cfg["abas_cdp"] if cfg["motor_navegacao"] == "cdp" else cfg["num_workers"]
+    pausa_legada = float(os.getenv("PJE_PAUSA_ENTRE_PROCESSOS", "0"))
+    if pausa_legada > 0:
+        # Compatibilidade: a pausa fixa por worker vira o teto de processos/s no host do painel
+        host_painel = urlparse(cfg["url_pje_home"]).hostname
+        taxas[host_painel] = min(taxas.get(host_painel, float("inf")), max(1, limite_max) / pausa_legada)
+        print(f"AVISO: PJE_PAUSA_ENTRE_PROCESSOS foi substituída pelo agendador adaptativo; usando-a como teto de "
+              f"{taxas[host_painel]:.2f} processos/s em {host_painel}.")
+    inicio_do_dia = time.mktime(time.localtime()[:3] + (0, 0, 0, 0, 0, -1))
+    return pje_agendador.AgendadorPJe(
+        limite_max, limite_min=int(os.getenv("PJE_SIMULTANEOS_MIN", "1")), taxas_por_host=taxas,
+        janela=os.getenv("PJE_JANELA_HORARIO") or None, cota_diaria=int(os.getenv("PJE_COTA_DIARIA", "0")) or None,
+        contar_feitos_hoje=lambda: ledger.contar_tentativas_desde(inicio_do_dia))
+
+
+def criar_gerenciador_abas_pje(driver, apsdj_folder_path, nome_worker="1", motor_download="http"):
+    """Cria o gerenciador que limita as abas abertas e registra abas/memória do navegador ao longo do tempo.
+
+    No motor de download 'navegador' as abas de PDF ainda não salvas nunca são fechadas nem o navegador reiniciado.
+    """
+    return pje_abas.GerenciadorAbasPJe(
+        driver,
+        max_abas=int(os.getenv("PJE_MAX_ABAS", "6")),
+        limite_rss_mb=float(os.getenv("PJE_LIMITE_RSS_MB", "3000")),
+        caminho_relatorio=os.path.join(apsdj_folder_path, "pje_trf3_navegador_metricas.csv"),
+        nome_worker=nome_worker,
+        pdfs_em_disco=motor_download == "http")
+
+
+def reiniciar_driver_pje(driver, pje_user, pje_pass, pasta_debug, caminho_sessao, url_pje_home, motor_download,
+                         prefixo="", pasta_perfil=None, agendador=None):
+    """Fecha o navegador que passou do limite de memória e abre outro já logado (via sessão salva, se houver).
+
+    Retorna (driver, downloader) ou (None, None) se não foi possível restaurar a sessão.
+    """
+    print(f"{prefixo}[Abas] Memória do navegador acima do limite. Reiniciando o navegador...")
+    try:
+        driver.quit()
+    except Exception as e_quit:
+        print(f"{prefixo}AVISO: Erro ao fechar o navegador antigo: {e_quit}")
+    novo_driver = criar_driver_pje(pasta_debug, pasta_perfil)
+    if novo_driver is None:
+        return None, None
+    if not fazer_login_pje(novo_driver, pje_user, pje_pass, pasta_debug, caminho_sessao, url_pje_home, agendador):
+        novo_driver.quit()
+        return None, None
+    print(f"{prefixo}[Abas] Navegador reiniciado e sessão restaurada.")
+    return novo_driver, criar_downloader_pje(novo_driver, motor_download, pasta_debug, agendador)
+
+
+def processar_processo_pje(driver, num_proc_planilha, resetar_home, cfg, ledger, worker, prefixo="",
+                           downloader=None):
+    """Abre (ou baixa, com `downloader`) o PDF de um processo, resetando antes para home.seam se pedido.
+
+    O resultado vai para o ledger: concluído no sucesso (no motor HTTP, só com o PDF gravado em disco) ou
+    falha reagendada com backoff. As durações de cada etapa ficam registradas junto com o processo.
+    """
+    duracoes = {}
+    pje_metricas.definir_contexto(processo=num_proc_planilha, worker=worker)
+    inicio_processo = time.monotonic()
+    cache_autos = ledger if cfg["cache_autos"] else None
+    # Com a URL dos autos em cache o painel nem é usado: o reset só acontece se o atalho falhar
+    em_cache = cache_autos is not None and ledger.obter_url_autos(num_proc_planilha) is not None
+    if resetar_home and not em_cache:
+        print(f"{prefixo}--- Navegando para {cfg['url_pje_home']} para resetar antes do processo "
+              f"'{num_proc_planilha}' ---")
+        try:
+            with pje_metricas.span("processo.reset_home"):
+                driver.get(cfg["url_pje_home"])
+                pje_scraper.aguardar_pagina_pronta(driver)
+            print(f"{prefixo}--- Reset para home.seam concluído ---")
+        except Exception as e_gohome:
+            print(f"{prefixo}AVISO: Erro ao tentar navegar para home.seam para reset: {e_gohome}")
+        duracoes["reset_home"] = time.monotonic() - inicio_processo
+
+    inicio_acesso = time.monotonic()
+    pdf_pagina_aberta = pje_scraper.access_process_via_quick_search_and_download(
+        driver, num_proc_planilha, pasta_debug=cfg["pasta_debug"], downloader=downloader, cache_autos=cache_autos,
+        url_home=cfg["url_pje_home"] if resetar_home and em_cache else None
+    )
+    duracoes["acesso_processo"] = time.monotonic() - inicio_acesso
+    duracoes["total"] = time.monotonic() - inicio_processo
+    pje_metricas.registrar_span("processo.total", duracoes["total"],
+                                pje_metricas.OK if pdf_pagina_aberta else pje_metricas.FALHA)
+    print(f"{prefixo}Tempo total do processo '{num_proc_planilha}': {duracoes['total']:.1f} s")
+
+    if pdf_pagina_aberta:
+        if downloader is not None:
+            print(f"{prefixo}SUCESSO NO DOWNLOAD PJe: PDF de '{num_proc_planilha}' gravado em disco.")
+        else:
+            print(f"{prefixo}SUCESSO NA ABERTURA PJe: Página do PDF para '{num_proc_planilha}' foi aberta para "
+                  f"interação manual.")
+        if not ledger.concluir(num_proc_planilha, worker, duracoes):
+            print(f"  [Ledger PJe] AVISO: a reserva de '{num_proc_planilha}' expirou e passou para outro worker.")
         else:
-            print(f"Pasta de download/debug: {pasta_download}")
+            print(f"  [Ledger PJe] Processo '{num_proc_planilha}' marcado como concluído.")
+        if cfg["impressao_autos"] and downloader is not None:
+            # Referência para o modo de ressincronização (PJE_RESSINCRONIZAR=1)
+            with pje_metricas.span("processo.impressao_autos"):
+                pje_delta.registrar_impressao(ledger, downloader.sessao, num_proc_planilha)
+    else:
+        print(f"{prefixo}FALHA NA ABERTURA PJe: Não foi possível abrir a página do PDF para '{num_proc_planilha}'.")
+        estado = ledger.falhar(num_proc_planilha, worker, "falha ao abrir/baixar o PDF", duracoes)
+        if estado is None:
+            print(f"  [Ledger PJe] AVISO: a reserva de '{num_proc_planilha}' expirou e passou para outro worker.")
+        elif estado == pje_ledger.FALHOU:
+            print(f"  [Ledger PJe] Processo '{num_proc_planilha}' esgotou as tentativas e foi marcado como falho.")
+        else:
+            print(f"  [Ledger PJe] Processo '{num_proc_planilha}' reagendado para nova tentativa.")
+    pje_metricas.definir_contexto(worker=worker)
+    return pdf_pagina_aberta
+
+
+def _worker_pje(id_worker, ledger, cfg):
+    """Laço de um worker: abre sua própria sessão do navegador, faz login e reserva processos no ledger.
+
+    Um erro inesperado encerra só este worker; o processo em andamento volta para o ledger como falha
+    (com backoff) e os demais workers continuam.
+    """
+    worker = f"worker-{id_worker}"
+    pje_metricas.definir_contexto(worker=worker)
+    prefixo = f"[Worker {id_worker}] " if cfg["num_workers"] > 1 else ""
+    pasta_perfil = pasta_perfil_worker_pje(cfg["apsdj_folder_path"], worker)
+    driver = criar_driver_pje(cfg["pasta_debug"], pasta_perfil)
+    if driver is None:
+        print(f"{prefixo}Falha ao inicializar o navegador. Worker encerrado.")
+        return
+    print(f"{prefixo}Navegador iniciado.")
 
-        chrome_options_pje = pje_scraper.configurar_chrome_options_pje(pasta_download)
+    agendador = cfg["agendador"]
+    if not fazer_login_pje(driver, cfg["pje_user"], cfg["pje_pass"], cfg["pasta_debug"], cfg["caminho_sessao"],
+                           cfg["url_pje_home"], agendador):
+        print(f"{prefixo}Falha no login do PJe. Worker encerrado.")
+        driver.quit()
+        return
+    downloader = criar_downloader_pje(driver, cfg["motor_download"], cfg["pasta_debug"], agendador)
+    gerenciador_abas = criar_gerenciador_abas_pje(driver, cfg["apsdj_folder_path"], str(id_worker),
+                                                  cfg["motor_download"])
+    janela_painel = driver.current_window_handle
+
+    num_proc_planilha = None
+    primeiro = True
+    try:
+        while True:
+            # Janela de horário, cota diária e limite adaptativo de simultâneos (substituem a pausa fixa)
+            agendador.ocupar_vaga()
+            reserva = ledger.reservar(worker)
+            if reserva is None:
+                agendador.liberar_vaga(processou=False)
+                espera = ledger.segundos_ate_proximo_disponivel()
+                if espera is None and not cfg["ingestao_concluida"].is_set():
+                    # A planilha ainda está sendo lida: em instantes chegam mais processos
+                    time.sleep(0.5)
+                    continue
+                if espera is None:
+                    break
+                # Só restam processos em backoff ou reservados por outros workers: aguarda e tenta de novo
+                time.sleep(min(max(espera, 1.0), 30.0))
+                continue
+            num_proc_planilha, tentativa = reserva
+            print(f"\n{prefixo}===== INICIANDO ABERTURA PJe: Processo '{num_proc_planilha}' "
+                  f"(tentativa {tentativa}) =====")
+            try:
+                agendador.aguardar_host(cfg["url_pje_home"])
+                # Heartbeat: o lease é renovado enquanto o processo estiver em andamento, por mais que demore
+                with ledger.manter_reserva(num_proc_planilha, worker):
+                    processar_processo_pje(driver, num_proc_planilha, not primeiro, cfg, ledger, worker,
+                                           prefixo=prefixo, downloader=downloader)
+            finally:
+                agendador.liberar_vaga()
+            primeiro = False
+            processo_concluido, num_proc_planilha = num_proc_planilha, None
+
+            gerenciador_abas.apos_processo(janela_painel, numero_processo=processo_concluido)
+            if gerenciador_abas.precisa_reiniciar():
+                driver, downloader = reiniciar_driver_pje(driver, cfg["pje_user"], cfg["pje_pass"],
+                                                          cfg["pasta_debug"], cfg["caminho_sessao"],
+                                                          cfg["url_pje_home"], cfg["motor_download"], prefixo=prefixo,
+                                                          pasta_perfil=pasta_perfil, agendador=agendador)
+                if driver is None:
+                    print(f"{prefixo}Não foi possível reiniciar o navegador. Worker encerrado.")
+                    return
+                gerenciador_abas.trocar_driver(driver)
+                janela_painel = driver.current_window_handle
+                primeiro = True
+    except Exception as e_worker:
+        print(f"{prefixo}ERRO CRÍTICO no worker: {type(e_worker).__name__} - {e_worker}")
+        traceback.print_exc()
+        if num_proc_planilha is not None:
+            # Devolve o processo em andamento ao ledger para que outro worker o tente
+            ledger.falhar(num_proc_planilha, worker, f"{type(e_worker).__name__}: {e_worker}")
+            print(f"{prefixo}Processo '{num_proc_planilha}' devolvido ao ledger.")
+        try:
+            driver.quit()
+        except Exception:
+            pass
+        return
+    finally:
+        ledger.fechar()
+    if downloader is not None:
+        # Motor 'http': os PDFs já estão em disco, não há nada a fazer neste navegador
         try:
-            driver_pje_global = webdriver.Chrome(options=chrome_options_pje)
-            print("Navegador para PJe iniciado.")
-        except WebDriverException as e:
-            print(f"ERRO ao inicializar o WebDriver para PJe: {e}");
-            driver_pje_global = None;
+            driver.quit()
+        except Exception as e_quit:
+            print(f"{prefixo}AVISO: Erro ao fechar o navegador: {e_quit}")
+    print(f"{prefixo}Não há mais processos disponíveis. Worker finalizado.")
+
+
+def executar_pool_workers_pje(ledger, cfg):
+    """Executa N workers independentes (um WebDriver logado por worker) sobre o ledger e aguarda todos.
+
+    Com um único worker, roda na própria thread principal.
+    """
+    num_workers = max(1, cfg["num_workers"])
+    if num_workers == 1:
+        _worker_pje(1, ledger, cfg)
+        return
+    print(f"Iniciando pool com {num_workers} workers PJe.")
+    threads = []
+    for id_worker in range(1, num_workers + 1):
+        t = threading.Thread(target=_worker_pje, name=f"worker-pje-{id_worker}", args=(id_worker, ledger, cfg),
+                             daemon=True)
+        t.start()
+        threads.append(t)
+    for t in threads:
+        t.join()
+
+
+def criar_sessao_verificacao_pje(cfg):
+    """requests.Session logada para o modo de ressincronização (None se não conseguir logar).
+
+    Reaproveita a sessão salva em disco, se ainda válida; senão faz login em um navegador só para capturar os cookies.
+    """
+    if cfg["caminho_sessao"]:
+        dados = pje_sessao.carregar_sessao_pje(cfg["caminho_sessao"], os.getenv("PJE_SESSAO_CHAVE") or cfg["pje_pass"])
+        if dados and pje_sessao.sessao_ainda_valida(dados, cfg["url_pje_home"]):
+            return pje_sessao.criar_sessao_http(dados["cookies"], dados.get("user_agent"))
+    driver = criar_driver_pje(cfg["pasta_debug"], pasta_perfil_worker_pje(cfg["apsdj_folder_path"], "delta"))
+    if driver is None:
+        return None
+    try:
+        if not fazer_login_pje(driver, cfg["pje_user"], cfg["pje_pass"], cfg["pasta_debug"], cfg["caminho_sessao"],
+                               cfg["url_pje_home"]):
             return None
-    return driver_pje_global
+        return pje_sessao.criar_sessao_http(pje_sessao.capturar_cookies_driver(driver),
+                                            driver.execute_script("return navigator.userAgent;"))
+    finally:
+        driver.quit()
+
+
+def ressincronizar_pje(ledger, cfg):
+    """Modo delta (PJE_RESSINCRONIZAR=1). Se a sessão vencer no meio da verificação, loga de novo uma vez."""
+    for _ in range(2):
+        sessao_verificacao = criar_sessao_verificacao_pje(cfg)
+        if sessao_verificacao is None:
+            print("ERRO: Não foi possível logar para verificar alterações nos autos. Ressincronização ignorada.")
+            return
+        try:
+            pje_delta.ressincronizar(ledger, sessao_verificacao, threads=int(os.getenv("PJE_THREADS_DELTA", "8")),
+                                     reabrir_desconhecidos=os.getenv("PJE_DELTA_REABRIR_DESCONHECIDOS", "0") == "1")
+            return
+        except pje_delta.SessaoExpirada as e:
+            print(f"AVISO: {e}")
+            if cfg["caminho_sessao"] and os.path.exists(cfg["caminho_sessao"]):
+                # A sessão salva não vale mais: o novo login precisa passar pelo navegador
+                os.remove(cfg["caminho_sessao"])
+    print("ERRO: A sessão do PJe expirou de novo durante a verificação. Ressincronização ignorada.")
+
+
+def executar_abas_cdp_pje(ledger, cfg):
+    """Motor 'cdp': um único navegador logado, com várias abas dirigidas em paralelo via DevTools (pje_cdp)."""
+    import pje_cdp  # requer o pacote opcional 'websockets'
+    pje_metricas.definir_contexto(worker="cdp")
+    driver = criar_driver_pje(cfg["pasta_debug"], pasta_perfil_worker_pje(cfg["apsdj_folder_path"], "cdp"))
+    if driver is None:
+        print("Falha ao inicializar o navegador do motor CDP.")
+        return
+    try:
+        if not fazer_login_pje(driver, cfg["pje_user"], cfg["pje_pass"], cfg["pasta_debug"], cfg["caminho_sessao"],
+                               cfg["url_pje_home"], cfg["agendador"]):
+            print("Falha no login do PJe. Motor CDP encerrado.")
+            return
+        downloader = pje_downloader.DownloaderPJe.a_partir_do_driver(driver, cfg["pasta_debug"],
+                                                                    agendador=cfg["agendador"])
+        pje_cdp.executar_abas_cdp(driver, ledger, cfg, downloader, num_abas=cfg["abas_cdp"],
+                                  limite_por_host=cfg["limite_por_host"])
+    finally:
+        ledger.fechar()
+        driver.quit()
+
+
+def executar_processos_pje(ledger, cfg):
+    """Escolhe o motor de navegação: 'selenium' (pool de workers, um navegador cada) ou 'cdp' (abas assíncronas)."""
+    if cfg.get("motor_navegacao", "selenium") == "cdp":
+        executar_abas_cdp_pje(ledger, cfg)
+    else:
+        executar_pool_workers_pje(ledger, cfg)
 
 
 def executar_downloads_pje():
     """Função principal para orquestrar o login e a abertura dos PDFs."""
-    global driver_pje_global
     print("====================================================")
     print("Iniciando Sistema de Abertura de PDFs PJe TRF3 (via Acesso Rápido)")
     print(f"Data e Hora Início: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
@@ -110,7 +440,6 @@ def executar_downloads_pje():
     pje_pass = os.getenv("PJE_PASS")
     apsdj_folder_path = os.getenv("APSDJ_FOLDER_PATH")
     planilha_filename = os.getenv("PLANILHA_FILENAME")
-    url_pje_home = os.getenv("URL_PJE_TRF3_HOME", "https://pje1g.trf3.jus.br/pje/home.seam")
 
     if not all([pje_user, pje_pass, apsdj_folder_path, planilha_filename]):
         print("ERRO CRÍTICO: Variáveis de ambiente não definidas no arquivo .env.");
@@ -119,64 +448,116 @@ def executar_downloads_pje():
     caminho_planilha = os.path.join(apsdj_folder_path, planilha_filename)
     pasta_debug_e_download = os.path.join(apsdj_folder_path, "ProcessosBaixadosPJE_TRF3")
     caminho_log = os.path.join(apsdj_folder_path, "pje_trf3_processos_baixados_log.txt")
-
-    numeros_processos_pje_planilha = ler_planilha_pje(caminho_planilha)
-    if not numeros_processos_pje_planilha:
-        print("Nenhum número de processo válido encontrado na planilha PJe. Encerrando.");
-        return
-
-    carregar_log_pje(caminho_log)
-    processos_pje_a_processar = [p for p in numeros_processos_pje_planilha if p not in processos_pje_processados_set]
-
-    if not processos_pje_a_processar:
-        print("Todos os processos PJe da planilha já foram processados. Encerrando.");
-        return
-
-    print(f"Encontrados {len(processos_pje_a_processar)} processos PJe para processar.")
-    print(f"Primeiros processos da lista: {processos_pje_a_processar[:5]}")
-
-    driver_pje_global = inicializar_driver_pje(pasta_debug_e_download)
-    if not driver_pje_global: print("Falha ao inicializar o navegador para o PJe. Encerrando."); return
-
-    if not pje_scraper.login_pje_trf3(driver_pje_global, pje_user, pje_pass, pasta_debug=pasta_debug_e_download):
-        print("Falha no login do PJe. Encerrando.");
-        if driver_pje_global: driver_pje_global.quit(); return
-
-    total_processos_pje = len(processos_pje_a_processar)
-    for i, num_proc_planilha in enumerate(processos_pje_a_processar):
-        print(f"\n===== INICIANDO ABERTURA PJe {i + 1}/{total_processos_pje}: Processo '{num_proc_planilha}' =====")
-
-        if i > 0:
-            print(f"--- Navegando para {url_pje_home} para resetar antes do processo {i + 1}/{total_processos_pje} ---")
-            try:
-                driver_pje_global.get(url_pje_home)
-                time.sleep(5)
-                print("--- Reset para home.seam concluído ---")
-            except Exception as e_gohome:
-                print(f"AVISO: Erro ao tentar navegar para home.seam para reset: {e_gohome}")
-
-        pdf_pagina_aberta = pje_scraper.access_process_via_quick_search_and_download(
-            driver_pje_global, num_proc_planilha, pasta_debug=pasta_debug_e_download
-        )
-
-        if pdf_pagina_aberta:
-            print(
-                f"SUCESSO NA ABERTURA PJe: Página do PDF para '{num_proc_planilha}' foi aberta para interação manual.")
-            registrar_processo_concluido_pje(num_proc_planilha, caminho_log)
+    caminho_ledger = os.path.join(apsdj_folder_path, "pje_trf3_processos.sqlite3")
+    caminho_metricas = os.path.join(apsdj_folder_path, "pje_trf3_metricas.jsonl")
+    caminho_sessao = None
+    if os.getenv("PJE_CACHE_SESSAO", "1") == "1":
+        caminho_sessao = os.path.join(apsdj_folder_path, "pje_trf3_sessao.bin")
+
+    cfg = {
+        "pje_user": pje_user,
+        "pje_pass": pje_pass,
+        "apsdj_folder_path": apsdj_folder_path,
+        "pasta_debug": pasta_debug_e_download,
+        "caminho_sessao": caminho_sessao,
+        "url_pje_home": os.getenv("URL_PJE_TRF3_HOME", "https://pje1g.trf3.jus.br/pje/home.seam"),
+        "num_workers": int(os.getenv("PJE_NUM_WORKERS", "1")),
+        # 'navegador': deixa a aba do PDF aberta para salvar manualmente; 'http': grava o PDF direto em disco
+        "motor_download": os.getenv("PJE_MOTOR_DOWNLOAD", "navegador").lower(),
+        # Guarda número CNJ -> URL dos autos/PDF no ledger para pular o Acesso Rápido nas próximas vezes
+        "cache_autos": os.getenv("PJE_CACHE_AUTOS", "1") == "1",
+        # Após cada download, guarda a impressão dos autos (documentos, tamanho/ETag do PDF) para o modo delta
+        "impressao_autos": os.getenv("PJE_IMPRESSAO_AUTOS", "1") == "1",
+        # 'selenium': um WebDriver por worker; 'cdp': um navegador com PJE_ABAS_CDP abas via DevTools (asyncio)
+        "motor_navegacao": os.getenv("PJE_MOTOR_NAVEGACAO", "selenium").lower(),
+        "abas_cdp": int(os.getenv("PJE_ABAS_CDP", "4")),
+        # Máximo de navegações/downloads simultâneos por host no motor 'cdp'
+        "limite_por_host": int(os.getenv("PJE_LIMITE_POR_HOST", "4")),
+    }
+
+    if cfg["motor_navegacao"] == "cdp" and cfg["motor_download"] != "http":
+        print("AVISO: O motor de navegação 'cdp' sempre grava os PDFs em disco (motor de download 'http').")
+        cfg["motor_download"] = "http"
+    if os.getenv("PJE_NAVEGADOR_ENXUTO", "0") == "1" and cfg["motor_download"] != "http":
+        print("AVISO: PJE_NAVEGADOR_ENXUTO=1 roda o Chrome sem janela; as abas dos PDFs não ficarão visíveis. "
+              "Use PJE_MOTOR_DOWNLOAD=http para gravar os PDFs em disco.")
+
+    incompletos = pje_downloader.listar_downloads_incompletos(pasta_debug_e_download)
+    if incompletos:
+        print(f"AVISO: {len(incompletos)} downloads incompletos em {pasta_debug_e_download} "
+              f"(os .part são retomados no motor 'http'): {[os.path.basename(c) for c in incompletos[:5]]}")
+
+    ledger = pje_ledger.LedgerPJe(
+        caminho_ledger, max_tentativas=int(os.getenv("PJE_MAX_TENTATIVAS", "5")),
+        validade_urls_autos=float(os.getenv("PJE_VALIDADE_CACHE_AUTOS_DIAS", "30")) * 86400)
+    cfg["agendador"] = criar_agendador_pje(cfg, ledger)
+    importados = ledger.importar_log_txt(caminho_log, normalizar=_chaves_log_legado)
+    if importados:
+        print(f"{importados} processos importados do log legado {caminho_log}.")
+    if os.getenv("PJE_REPROCESSAR_FALHOS", "0") == "1":
+        print(f"{ledger.reabrir_falhos()} processos que haviam esgotado as tentativas voltaram para a fila.")
+
+    # A planilha é lida em segundo plano; os workers começam assim que o primeiro lote chega ao ledger
+    ingestao_concluida = threading.Event()
+    cfg["ingestao_concluida"] = ingestao_concluida
+    threading.Thread(target=_ingerir_planilha_pje, name="ingestao-planilha-pje",
+                     args=(caminho_planilha, ledger, ingestao_concluida), daemon=True).start()
+    while ledger.segundos_ate_proximo_disponivel() is None and not ingestao_concluida.is_set():
+        time.sleep(0.2)
+
+    if os.getenv("PJE_METRICAS", "1") == "1":
+        # Spans de tempo por passo (resumo: python pje_metricas.py <caminho_metricas>)
+        pje_metricas.configurar_metricas(caminho_metricas, os.path.splitext(caminho_metricas)[0] + ".prom")
+        print(f"Métricas de tempo por passo em {caminho_metricas}")
+
+    if os.getenv("PJE_RESSINCRONIZAR", "0") == "1":
+        # Modo delta: os concluídos cujos autos mudaram desde o último download voltam para a fila
+        ressincronizar_pje(ledger, cfg)
+
+    contagem = ledger.contar_por_estado()
+    # Processos que esgotaram as tentativas em execuções anteriores só voltam com PJE_REPROCESSAR_FALHOS=1
+    a_processar = contagem.get(pje_ledger.PENDENTE, 0) + contagem.get(pje_ledger.RESERVADO, 0)
+    if not a_processar:
+        if not contagem:
+            print("Nenhum número de processo válido encontrado na planilha PJe. Encerrando.");
         else:
-            print(f"FALHA NA ABERTURA PJe: Não foi possível abrir a página do PDF para '{num_proc_planilha}'.")
-
-        pausa_entre_processos = 10
-        if i < total_processos_pje - 1:
-            print(f"Pausa de {pausa_entre_processos} segundos antes do próximo processo PJe...")
-            time.sleep(pausa_entre_processos)
+            print("Todos os processos PJe da planilha já foram processados. Encerrando.");
+        ledger.fechar()
+        cfg["agendador"].fechar()
+        pje_metricas.encerrar_metricas()
+        return
+    print(f"Situação do ledger {caminho_ledger}: {contagem}")
+
+    observador_sentencas = None
+    if os.getenv("PJE_EXTRAIR_SENTENCAS", "0") == "1":
+        # Extrai as sentenças dos PDFs em paralelo aos downloads (busca: python pje_sentencas.py --buscar "...")
+        import pje_sentencas
+        processos_sentencas = int(os.getenv("PJE_PROCESSOS_SENTENCAS", "0")) or None
+        observador_sentencas = pje_sentencas.iniciar_observador_sentencas(
+            pasta_debug_e_download, os.path.join(apsdj_folder_path, "SentencasPJE_TRF3"),
+            os.path.join(apsdj_folder_path, "pje_trf3_sentencas.sqlite3"), processos_sentencas)
+    try:
+        executar_processos_pje(ledger, cfg)
+    finally:
+        cfg["agendador"].fechar()
+        if observador_sentencas is not None:
+            thread_sentencas, parar_sentencas = observador_sentencas
+            print("Aguardando a extração das sentenças dos últimos PDFs...")
+            parar_sentencas.set()
+            thread_sentencas.join()
+        pje_metricas.encerrar_metricas()
 
     print("\n----------------------------------------------------")
     print("Todos os processos da planilha PJe foram tentados.")
+    print(f"Situação final do ledger: {ledger.contar_por_estado()}")
+    ledger.fechar()
     print(f"Data e Hora Fim: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print("====================================================")
-    print("IMPORTANTE: O navegador permanecerá aberto com as abas dos PDFs.")
-    print("Você pode fechar esta janela do console. O navegador continuará aberto.")
+    if cfg["motor_download"] == "http":
+        print(f"PDFs gravados em {pasta_debug_e_download}.")
+    else:
+        print("IMPORTANTE: O navegador permanecerá aberto com as abas dos PDFs.")
+        print("Você pode fechar esta janela do console. O navegador continuará aberto.")
     print("Script PJe finalizado.")
 
 
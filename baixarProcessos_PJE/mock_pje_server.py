@@ -0,0 +1,375 @@
+# mock_pje_server.py
+# Servidor local que imita o fluxo do PJe TRF3 usado pelo pje_scraper, para testes e benchmarks.
+#
+# Todos os hosts do fluxo ficam no mesmo servidor, com o nome do host real no início do caminho
+# (ex.: http://127.0.0.1:8765/pje1g.trf3.jus.br/pje/home.seam). Assim os XPaths e as checagens de URL do
+# scraper (url_contains("sso.cloud.pje.jus.br"), "Detalhe/listAutosDigitais.seam", etc.) valem sem alteração.
+#
+# Uso: python mock_pje_server.py [--porta 8765] [--latencia 0.2] [--taxa-erro 0.05] [--tamanho-pdf 5000000]
+import os
+import re
+import sys
+import json
+import time
+import random
+import hashlib
+import secrets
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, quote
+
+_RE_CNJ = re.compile(r"^\d{7}-\d{2}\.\d{4}\.\d\.\d{2}\.\d{4}$")
+_RE_RANGE = re.compile(r"bytes=(\d+)-(\d*)")
+
+# Recursos estáticos incluídos em cada página, como no PJe real (imagens, fontes, CSS e analytics), para medir
+# o efeito do bloqueio de recursos do modo enxuto
+_RECURSOS_PAGINA = (
+    '<link rel="stylesheet" href="/pje1g.trf3.jus.br/pje/css/pje.css">'
+    + "".join(f'<link rel="icon" href="/pje1g.trf3.jus.br/pje/img/favicon-{i}.png">' for i in range(3))
+    + "".join(f'<link rel="preload" as="font" crossorigin href="/pje1g.trf3.jus.br/pje/fonts/fonte-{i}.woff2">'
+              for i in range(2))
+    + '<script async src="/www.google-analytics.com/analytics.js"></script>'
+)
+_IMAGENS_PAGINA = "".join(f'<img src="/pje1g.trf3.jus.br/pje/img/figura-{i}.png" width="40">' for i in range(4))
+_TIPOS_RECURSO = {".css": "text/css", ".png": "image/png", ".woff2": "font/woff2", ".js": "application/javascript"}
+
+_PAGINA_ACESSO = """<!DOCTYPE html><html><head><meta charset="utf-8"><title>PJe - TRF3</title></head><body>
+<div id="banner-cookies" style="position:fixed;bottom:0;left:0;right:0;background:#eee;padding:20px">
+  Este site usa cookies.
+  <button data-role="all" onclick="document.getElementById('banner-cookies').style.display='none'">
+    <span>Aceitar todos os cookies</span></button>
+</div>
+<h1>Acesso ao sistema PJe</h1>
+<ul><li><a href="/pje1g.trf3.jus.br/pje/login.seam">Sistema PJe - 1º Grau</a></li>
+<li><a href="/pje2g.trf3.jus.br/pje/login.seam">Sistema PJe - 2º Grau</a></li></ul>
+</body></html>"""
+
+_PAGINA_SSO = """<!DOCTYPE html><html><head><meta charset="utf-8"><title>SSO PJe</title></head><body>
+<form method="post" action="/sso.cloud.pje.jus.br/auth/realms/pje/login-actions/authenticate">
+  <input id="username" name="username" type="text">
+  <input id="password" name="password" type="password">
+  <input id="kc-login" name="login" type="submit" value="ENTRAR">
+</form></body></html>"""
+
+_PAGINA_HOME = """<!DOCTYPE html><html><head><meta charset="utf-8"><title>PJe - Painel</title></head><body>
+<a href="#" title="Abrir menu" class="botao-menu"
+   onclick="document.getElementById('menu').style.display='block'; return false;">&#9776;</a>
+<nav id="menu" style="display:none">
+  <input type="text" placeholder="Acesso rápido" id="acesso-rapido">
+  <div class="resultado-busca" id="resultado-busca"></div>
+</nav>
+<script>
+document.getElementById('acesso-rapido').addEventListener('input', function (e) {
+  var numero = e.target.value;
+  fetch('/pje1g.trf3.jus.br/pje/seam/resource/pesquisaRapida?numero=' + encodeURIComponent(numero))
+    .then(function (r) { return r.ok ? r.json() : null; })
+    .then(function (dados) {
+      var div = document.getElementById('resultado-busca');
+      if (!dados || !dados.url) { div.innerHTML = '<span>Nenhum processo encontrado</span>'; return; }
+      div.innerHTML = '<a href="#" onclick="pesquisaRapida(); window.open(\\'' + dados.url + '\\'); return false;">'
+        + 'Abrir processo ' + numero + '</a>';
+    });
+});
+function pesquisaRapida() {}
+</script></body></html>"""
+
+_PAGINA_ACESSO_NEGADO = """<!DOCTYPE html><html><head><meta charset="utf-8"><title>PJe - Erro</title></head><body>
+<h1>Acesso negado</h1><p>O link acessado não é mais válido.</p>
+</body></html>"""
+
+_PAGINA_AUTOS = """<!DOCTYPE html><html><head><meta charset="utf-8"><title>Autos digitais</title></head><body>
+<h1>Autos do processo {numero}</h1>
+<a href="#" title="Download autos do processo"
+   onclick="document.getElementById('opcoes-download').style.display='block'; return false;">Download</a>
+<div class="dropdown-menu" id="opcoes-download" style="display:none">
+  <input type="button" value="Download" onclick="window.open('{url_pdf}')">
+</div>
+<table id="documentos">{documentos}</table>
+</body></html>"""
+
+
+class ConfigMock:
+    """Parâmetros do servidor simulado (podem ser alterados em tempo de execução, ex.: pelo benchmark)."""
+
+    def __init__(self, latencia=0.0, jitter=0.0, taxa_erro=0.0, tamanho_pdf=1024 * 1024, documentos_por_processo=5,
+                 capacidade=0, latencia_por_excesso=0.5, peso_recursos=30 * 1024):
+        self.latencia = latencia
+        self.jitter = jitter
+        self.taxa_erro = taxa_erro
+        self.tamanho_pdf = tamanho_pdf
+        self.documentos_por_processo = documentos_por_processo
+        # Modelo de sobrecarga: acima de `capacidade` requisições simultâneas (0 = ilimitado), cada requisição
+        # excedente soma `latencia_por_excesso` segundos e há chance de 503 proporcional ao excesso.
+        self.capacidade = capacidade
+        self.latencia_por_excesso = latencia_por_excesso
+        # Tamanho (bytes) de cada imagem/fonte/script estático das páginas (0 = páginas sem recursos)
+        self.peso_recursos = peso_recursos
+        # Incrementar invalida todas as URLs de autos já emitidas (simula o vencimento do parâmetro `ca`)
+        self.geracao_urls = 0
+        # {idProcesso: n}: documentos juntados depois (os autos e o PDF do processo mudam)
+        self.documentos_adicionais = {}
+
+
+class EstadoMock:
+    """Sessões emitidas, requisições em andamento e linha do tempo de eventos (para o benchmark)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sessoes = set()
+        self.em_andamento = 0
+        self.eventos = []
+        self.contadores = {}
+        self.bytes_por_tipo = {}
+
+    def registrar(self, tipo, **dados):
+        with self.lock:
+            self.eventos.append((time.time(), tipo, dados))
+            self.contadores[tipo] = self.contadores.get(tipo, 0) + 1
+
+    def contar_bytes(self, content_type, tamanho):
+        tipo = content_type.split(";")[0].split("/")[-1]
+        with self.lock:
+            self.bytes_por_tipo[tipo] = self.bytes_por_tipo.get(tipo, 0) + tamanho
+
+
+def id_processo(numero_formatado):
+    return int(hashlib.sha1(numero_formatado.encode()).hexdigest()[:8], 16)
+
+
+def _pdf_sintetico(id_proc, tamanho):
+    """PDF mínimo válido (%PDF- ... startxref ... %%EOF) com preenchimento até `tamanho` bytes."""
+    cabecalho = (b"%PDF-1.4\n1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj\n"
+                 b"2 0 obj<</Type/Pages/Kids[]/Count 0>>endobj\n")
+    rodape = b"\nxref\n0 3\ntrailer<</Size 3/Root 1 0 R>>\nstartxref\n9\n%%EOF\n"
+    comentario = f"% processo {id_proc}\n".encode()
+    preenchimento = max(0, tamanho - len(cabecalho) - len(comentario) - len(rodape))
+    return cabecalho + comentario + b"%" * preenchimento + rodape
+
+
+class _ManipuladorMock(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    servidor_config: ConfigMock = None
+    servidor_estado: EstadoMock = None
+
+    def log_message(self, formato, *args):
+        pass
+
+    # --- utilitários ---
+
+    def _cookie_sessao(self):
+        cookies = self.headers.get("Cookie", "")
+        match = re.search(r"MOCK_PJE_SESSAO=([0-9a-f]+)", cookies)
+        return match.group(1) if match and match.group(1) in self.servidor_estado.sessoes else None
+
+    def _responder(self, status, corpo=b"", content_type="text/html; charset=utf-8", headers=None):
+        if isinstance(corpo, str):
+            corpo = corpo.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(corpo)))
+        for nome, valor in (headers or {}).items():
+            self.send_header(nome, valor)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(corpo)
+            self.servidor_estado.contar_bytes(content_type, len(corpo))
+
+    def _chave_acesso(self, id_proc):
+        """Parâmetro `ca` das URLs dos autos; muda quando `geracao_urls` é incrementada (URLs antigas vencem)."""
+        return hashlib.md5(f"{id_proc}-{self.servidor_config.geracao_urls}".encode()).hexdigest()
+
+    def _responder_pagina(self, html):
+        if self.servidor_config.peso_recursos:
+            html = html.replace("</head>", _RECURSOS_PAGINA + "</head>").replace("</body>", _IMAGENS_PAGINA + "</body>")
+        self._responder(200, html)
+
+    def _enviar_recurso(self, caminho):
+        extensao = os.path.splitext(caminho)[1]
+        peso = self.servidor_config.peso_recursos
+        if extensao == ".css":
+            prefixo = b"body{font-family:sans-serif}/*"
+            corpo = prefixo + b"-" * max(0, peso - len(prefixo) - 2) + b"*/"
+        elif extensao == ".js":
+            corpo = b"/*" + b"-" * max(0, peso - 4) + b"*/"
+        else:
+            corpo = b"\0" * peso
+        self._responder(200, corpo, _TIPOS_RECURSO[extensao], {"Cache-Control": "no-store"})
+
+    def _redirecionar(self, destino, headers=None):
+        self._responder(302, b"", headers=dict(headers or {}, Location=destino))
+
+    def _simular_carga(self):
+        """Aplica latência, sobrecarga e erros injetados. Retorna False se a requisição já foi respondida com erro."""
+        config, estado = self.servidor_config, self.servidor_estado
+        with estado.lock:
+            estado.em_andamento += 1
+            excesso = max(0, estado.em_andamento - config.capacidade) if config.capacidade else 0
+        atraso = config.latencia + random.uniform(0, config.jitter) + excesso * config.latencia_por_excesso
+        if atraso:
+            time.sleep(atraso)
+        if excesso and random.random() < min(0.9, excesso / max(1, config.capacidade)):
+            estado.registrar("erro_503", caminho=self.path)
+            self._responder(503, "Serviço sobrecarregado", headers={"Retry-After": "1"})
+            return False
+        if config.taxa_erro and random.random() < config.taxa_erro:
+            estado.registrar("erro_500", caminho=self.path)
+            self._responder(500, "Erro interno simulado")
+            return False
+        return True
+
+    # --- roteamento ---
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_GET(self):
+        try:
+            if not self._simular_carga():
+                return
+            self._rotear_get()
+        finally:
+            with self.servidor_estado.lock:
+                self.servidor_estado.em_andamento -= 1
+
+    def do_POST(self):
+        try:
+            if not self._simular_carga():
+                return
+            tamanho = int(self.headers.get("Content-Length", "0"))
+            campos = parse_qs(self.rfile.read(tamanho).decode("utf-8"))
+            if urlparse(self.path).path.endswith("/login-actions/authenticate"):
+                if campos.get("username") and campos.get("password"):
+                    sessao = secrets.token_hex(16)
+                    with self.servidor_estado.lock:
+                        self.servidor_estado.sessoes.add(sessao)
+                    self.servidor_estado.registrar("login", usuario=campos["username"][0])
+                    self._redirecionar("/pje1g.trf3.jus.br/pje/home.seam",
+                                       {"Set-Cookie": f"MOCK_PJE_SESSAO={sessao}; Path=/; HttpOnly"})
+                else:
+                    self._responder_pagina(_PAGINA_SSO)
+                return
+            self._responder(404, "Não encontrado")
+        finally:
+            with self.servidor_estado.lock:
+                self.servidor_estado.em_andamento -= 1
+
+    def _rotear_get(self):
+        url = urlparse(self.path)
+        caminho, query = url.path, parse_qs(url.query)
+        estado = self.servidor_estado
+
+        if os.path.splitext(caminho)[1] in _TIPOS_RECURSO:
+            self._enviar_recurso(caminho)
+        elif caminho == "/pje/acesso-ao-sistema":
+            self._responder_pagina(_PAGINA_ACESSO)
+        elif caminho == "/pje1g.trf3.jus.br/pje/login.seam":
+            self._redirecionar("/pje1g.trf3.jus.br/pje/home.seam" if self._cookie_sessao()
+                               else "/sso.cloud.pje.jus.br/auth/realms/pje/protocol/openid-connect/auth")
+        elif caminho.startswith("/sso.cloud.pje.jus.br/"):
+            self._responder_pagina(_PAGINA_SSO)
+        elif caminho == "/pje1g.trf3.jus.br/pje/home.seam":
+            if not self._cookie_sessao():
+                self._redirecionar("/sso.cloud.pje.jus.br/auth/realms/pje/protocol/openid-connect/auth")
+                return
+            estado.registrar("home")
+            self._responder_pagina(_PAGINA_HOME)
+        elif caminho == "/pje1g.trf3.jus.br/pje/seam/resource/pesquisaRapida":
+            numero = query.get("numero", [""])[0]
+            if not self._cookie_sessao() or not _RE_CNJ.match(numero):
+                self._responder(200, json.dumps({}), "application/json")
+                return
+            id_proc = id_processo(numero)
+            estado.registrar("sugestao", numero=numero)
+            url_autos = (f"/pje1g.trf3.jus.br/pje/Processo/ConsultaProcesso/Detalhe/listAutosDigitais.seam"
+                         f"?idProcesso={id_proc}&ca={self._chave_acesso(id_proc)}"
+                         f"&numero={quote(numero)}")
+            self._responder(200, json.dumps({"url": url_autos}), "application/json")
+        elif caminho == "/pje1g.trf3.jus.br/pje/Processo/ConsultaProcesso/Detalhe/listAutosDigitais.seam":
+            if not self._cookie_sessao():
+                self._redirecionar("/sso.cloud.pje.jus.br/auth/realms/pje/protocol/openid-connect/auth")
+                return
+            id_proc = query.get("idProcesso", ["0"])[0]
+            numero = query.get("numero", [""])[0]
+            if not id_proc.isdigit() or query.get("ca", [""])[0] != self._chave_acesso(id_proc):
+                estado.registrar("autos_negado", id=id_proc)
+                self._responder_pagina(_PAGINA_ACESSO_NEGADO)
+                return
+            estado.registrar("autos", id=id_proc, numero=numero)
+            documentos = "".join(
+                f'<tr><td><a href="#" data-id="{int(id_proc) * 100 + i}" '
+                f'onclick="return false;">idProcessoDocumento={int(id_proc) * 100 + i}</a></td></tr>'
+                for i in range(self.servidor_config.documentos_por_processo
+                               + self.servidor_config.documentos_adicionais.get(id_proc, 0)))
+            self._responder_pagina(_PAGINA_AUTOS.format(
+                numero=numero, documentos=documentos,
+                url_pdf=f"/pje-downloads.trf3.jus.br/download/{id_proc}.pdf"))
+        elif caminho.startswith("/pje-downloads.trf3.jus.br/download/") and caminho.endswith(".pdf"):
+            if not self._cookie_sessao():
+                self._responder(403, "Sessão inválida")
+                return
+            self._enviar_pdf(caminho.rsplit("/", 1)[1][:-4])
+        else:
+            self._responder(404, "Não encontrado")
+
+    def _enviar_pdf(self, id_proc):
+        conteudo = _pdf_sintetico(id_proc, self.servidor_config.tamanho_pdf
+                                  + 1024 * self.servidor_config.documentos_adicionais.get(id_proc, 0))
+        headers = {"Accept-Ranges": "bytes", "ETag": f'"{id_proc}-{len(conteudo)}"'}
+        match = _RE_RANGE.match(self.headers.get("Range", ""))
+        if_range = self.headers.get("If-Range")
+        if match and if_range and if_range != headers["ETag"]:
+            match = None  # If-Range: o PDF mudou desde o parcial do cliente, vai o arquivo inteiro
+        if match:
+            inicio = int(match.group(1))
+            if inicio >= len(conteudo):
+                self._responder(416, b"", "application/pdf", dict(headers, **{"Content-Range": f"bytes */{len(conteudo)}"}))
+                return
+            fim = int(match.group(2)) if match.group(2) else len(conteudo) - 1
+            headers["Content-Range"] = f"bytes {inicio}-{fim}/{len(conteudo)}"
+            self.servidor_estado.registrar("pdf", id=id_proc, parcial=True)
+            self._responder(206, conteudo[inicio:fim + 1], "application/pdf", headers)
+            return
+        self.servidor_estado.registrar("pdf_head" if self.command == "HEAD" else "pdf", id=id_proc, parcial=False)
+        self._responder(200, conteudo, "application/pdf", headers)
+
+
+def iniciar_servidor_mock(porta=0, config=None, host="127.0.0.1"):
+    """Sobe o servidor em uma thread. Retorna (servidor, url_base, config, estado); pare com servidor.shutdown()."""
+    config = config or ConfigMock()
+    estado = EstadoMock()
+    manipulador = type("ManipuladorMockPJe", (_ManipuladorMock,),
+                       {"servidor_config": config, "servidor_estado": estado})
+    servidor = ThreadingHTTPServer((host, porta), manipulador)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, name="mock-pje", daemon=True).start()
+    return servidor, f"http://{host}:{servidor.server_port}", config, estado
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servidor PJe simulado para testes e benchmarks.")
+    parser.add_argument("--porta", type=int, default=8765)
+    parser.add_argument("--latencia", type=float, default=0.0, help="latência base por requisição (s)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="latência aleatória adicional máxima (s)")
+    parser.add_argument("--taxa-erro", type=float, default=0.0, help="probabilidade de HTTP 500 por requisição")
+    parser.add_argument("--tamanho-pdf", type=int, default=1024 * 1024, help="tamanho do PDF dos autos (bytes)")
+    parser.add_argument("--capacidade", type=int, default=0,
+                        help="requisições simultâneas antes de degradar (0 = ilimitado)")
+    parser.add_argument("--peso-recursos", type=int, default=30 * 1024,
+                        help="tamanho de cada imagem/fonte/script das páginas (bytes; 0 = sem recursos)")
+    args = parser.parse_args(argv)
+    config = ConfigMock(latencia=args.latencia, jitter=args.jitter, taxa_erro=args.taxa_erro,
+                        tamanho_pdf=args.tamanho_pdf, capacidade=args.capacidade, peso_recursos=args.peso_recursos)
+    servidor, url_base, _, _ = iniciar_servidor_mock(args.porta, config)
+    print(f"Mock PJe no ar em {url_base}")
+    print(f"  URL_PJE_TRF3_ACESSO={url_base}/pje/acesso-ao-sistema")
+    print(f"  URL_PJE_TRF3_HOME={url_base}/pje1g.trf3.jus.br/pje/home.seam")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        servidor.shutdown()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
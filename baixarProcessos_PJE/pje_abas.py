@@ -0,0 +1,159 @@
+# pje_abas.py
+import os
+import time
+import threading
+
+from selenium.common.exceptions import WebDriverException
+
+# Abas do visualizador de PDF (as únicas que valem a pena manter abertas no motor 'navegador')
+_MARCADOR_ABA_PDF = "pje-downloads"
+_relatorio_lock = threading.Lock()
+
+
+def rss_arvore_processos_mb(pid_raiz):
+    """Soma o RSS (MB) de `pid_raiz` e de todos os seus descendentes (chromedriver -> chrome -> renderers)."""
+    try:
+        import psutil
+    except ImportError:
+        return _rss_arvore_proc(pid_raiz)
+    try:
+        raiz = psutil.Process(pid_raiz)
+        processos = [raiz] + raiz.children(recursive=True)
+    except psutil.Error:
+        return 0.0
+    total = 0
+    for p in processos:
+        try:
+            total += p.memory_info().rss
+        except psutil.Error:
+            pass
+    return total / 1024 / 1024
+
+
+def _rss_arvore_proc(pid_raiz):
+    """Fallback sem psutil, lendo /proc (Linux). Em outros sistemas retorna 0."""
+    if not os.path.isdir("/proc"):
+        return 0.0
+    filhos = {}
+    rss_kb = {}
+    for nome in os.listdir("/proc"):
+        if not nome.isdigit():
+            continue
+        try:
+            with open(f"/proc/{nome}/status") as f:
+                campos = dict(linha.split(":", 1) for linha in f if ":" in linha)
+        except OSError:
+            continue
+        pid = int(nome)
+        filhos.setdefault(int(campos.get("PPid", "0").strip()), []).append(pid)
+        rss_kb[pid] = int(campos.get("VmRSS", "0 kB").split()[0])
+    total_kb = 0
+    pendentes = [pid_raiz]
+    while pendentes:
+        pid = pendentes.pop()
+        total_kb += rss_kb.get(pid, 0)
+        pendentes.extend(filhos.get(pid, []))
+    return total_kb / 1024
+
+
+class GerenciadorAbasPJe:
+    """Mantém o número de abas do navegador limitado e acompanha a memória do Chrome.
+
+    Depois de cada processo, fecha as abas cujo resultado já foi capturado (a aba dos autos), mantém no
+    máximo `max_abas` abas abertas (o painel + as abas de PDF mais recentes) e indica quando o navegador
+    deve ser reiniciado por ter passado de `limite_rss_mb`.
+
+    Com `pdfs_em_disco=False` (motor de download 'navegador') as abas de PDF são o próprio resultado, ainda
+    não salvo: elas nunca são fechadas e o navegador nunca é reiniciado; só a aba dos autos é descartada.
+    """
+
+    def __init__(self, driver, max_abas=6, limite_rss_mb=3000, caminho_relatorio=None, nome_worker="1",
+                 pdfs_em_disco=True):
+        self.max_abas = max(1, max_abas)
+        self.limite_rss_mb = limite_rss_mb
+        self.caminho_relatorio = caminho_relatorio
+        self.nome_worker = nome_worker
+        self.pdfs_em_disco = pdfs_em_disco
+        self._avisou_memoria = False
+        self.trocar_driver(driver)
+
+    def trocar_driver(self, driver):
+        """Passa a gerenciar um novo driver (após reinício do navegador)."""
+        self.driver = driver
+        self._ordem_abas = []
+        self.ultimo_rss_mb = None
+
+    def medir_rss_mb(self):
+        try:
+            return rss_arvore_processos_mb(self.driver.service.process.pid)
+        except (AttributeError, WebDriverException):
+            return 0.0
+
+    def apos_processo(self, janela_painel, numero_processo=""):
+        """Fecha abas desnecessárias, aplica o limite de abas e grava uma amostra de abas/memória."""
+        driver = self.driver
+        try:
+            handles = driver.window_handles
+        except WebDriverException as e:
+            print(f"    AVISO [Abas]: não foi possível listar as abas: {e}")
+            return
+        self._ordem_abas = [h for h in self._ordem_abas if h in handles]
+        novas = [h for h in handles if h not in self._ordem_abas and h != janela_painel]
+        for handle in novas:
+            try:
+                driver.switch_to.window(handle)
+                manter = _MARCADOR_ABA_PDF in driver.current_url
+                if not manter:
+                    driver.close()
+            except WebDriverException:
+                manter = False
+            if manter:
+                self._ordem_abas.append(handle)
+
+        # No motor 'navegador' fechar uma aba de PDF perderia o arquivo (o processo já consta como concluído)
+        excedentes = len(self._ordem_abas) - (self.max_abas - 1) if self.pdfs_em_disco else 0
+        for handle in self._ordem_abas[:max(0, excedentes)]:
+            try:
+                driver.switch_to.window(handle)
+                driver.close()
+            except WebDriverException:
+                pass
+        if excedentes > 0:
+            self._ordem_abas = self._ordem_abas[excedentes:]
+            print(f"    [Abas] {excedentes} aba(s) de PDF mais antiga(s) fechada(s) (limite: {self.max_abas}).")
+        try:
+            driver.switch_to.window(janela_painel)
+        except WebDriverException as e:
+            print(f"    AVISO [Abas]: erro ao voltar para o painel: {e}")
+        self.registrar_amostra(numero_processo)
+
+    def registrar_amostra(self, numero_processo=""):
+        """Acrescenta ao relatório CSV: horário, worker, processo, número de abas e RSS do navegador (MB)."""
+        try:
+            num_abas = len(self.driver.window_handles)
+        except WebDriverException:
+            num_abas = -1
+        rss_mb = self.medir_rss_mb()
+        self.ultimo_rss_mb = rss_mb
+        if not self.caminho_relatorio:
+            return
+        with _relatorio_lock:
+            novo = not os.path.exists(self.caminho_relatorio)
+            with open(self.caminho_relatorio, "a", encoding="utf-8") as f:
+                if novo:
+                    f.write("timestamp,worker,processo,abas,rss_mb\n")
+                f.write(f"{time.strftime('%Y-%m-%d %H:%M:%S')},{self.nome_worker},{numero_processo},"
+                        f"{num_abas},{rss_mb:.1f}\n")
+
+    def precisa_reiniciar(self):
+        """True quando o navegador passou do limite de memória configurado."""
+        rss_mb = self.ultimo_rss_mb if self.ultimo_rss_mb is not None else self.medir_rss_mb()
+        acima = bool(self.limite_rss_mb) and rss_mb > self.limite_rss_mb
+        if acima and not self.pdfs_em_disco:
+            if not self._avisou_memoria:
+                self._avisou_memoria = True
+                print(f"    AVISO [Abas]: navegador com {rss_mb:.0f} MB (limite: {self.limite_rss_mb:.0f} MB), mas as "
+                      f"abas de PDF ainda não foram salvas; o navegador não será reiniciado. "
+                      f"Use PJE_MOTOR_DOWNLOAD=http para gravar os PDFs em disco.")
+            return False
+        return acima
@@ -0,0 +1,242 @@
+# pje_agendador.py
+# Agendador adaptativo que substitui a pausa fixa entre processos:
+#   - balde de tokens por host (acesso trf3.jus.br, pje1g, pje-downloads), com pausa ao receber Retry-After;
+#   - limite de processos simultâneos ajustado por AIMD: cresce +1 por "rodada" sem sinais de sobrecarga e cai
+#     à metade com timeouts, 5xx/429 ou latência muito acima da referência;
+#   - janela de horário e cota diária de processos.
+# Os sinais vêm dos spans do pje_metricas (timeouts nos passos, latência das páginas) e do pje_downloader (HTTP).
+import time
+import threading
+from collections import deque
+from urllib.parse import urlparse
+
+import pje_metricas
+
+# Tipos de exceção (tag "erro" dos spans) que indicam servidor lento ou sobrecarregado
+_ERROS_SOBRECARGA = frozenset({"TimeoutException", "TimeoutError", "TempoEsgotadoCDP", "ReadTimeout",
+                               "ConnectTimeout"})
+# Passos cuja duração depende quase só do tempo de resposta do PJe (e não do tamanho do PDF)
+_PASSOS_LATENCIA = frozenset({"processo.reset_home", "acesso.passo0_home_pronta", "acesso.passo4_aba_autos",
+                              "acesso.cache_autos_direto"})
+_AMOSTRAS_REFERENCIA = 50
+_LATENCIA_MINIMA_SOBRECARGA = 1.0
+
+
+class BaldeTokens:
+    """Balde de tokens: `taxa` requisições por segundo, com rajadas de até `capacidade`."""
+
+    def __init__(self, taxa, capacidade=1.0):
+        self.taxa = taxa
+        self.capacidade = max(1.0, capacidade)
+        self.tokens = self.capacidade
+        self.atualizado_em = time.monotonic()
+        self.suspenso_ate = 0.0
+
+    def reservar(self):
+        """Consome um token e retorna quantos segundos o chamador deve esperar antes de usá-lo.
+
+        O saldo pode ficar negativo: chamadas simultâneas recebem esperas escalonadas em vez de disputar o token.
+        """
+        agora = time.monotonic()
+        self.tokens = min(self.capacidade, self.tokens + (agora - self.atualizado_em) * self.taxa)
+        self.atualizado_em = agora
+        self.tokens -= 1
+        espera = -self.tokens / self.taxa if self.tokens < 0 else 0.0
+        return max(espera, self.suspenso_ate - agora)
+
+    def suspender(self, segundos):
+        self.suspenso_ate = max(self.suspenso_ate, time.monotonic() + segundos)
+
+
+def _ler_janela(janela):
+    """'19:00-07:00' -> (minuto inicial, minuto final); a janela pode atravessar a meia-noite."""
+    inicio, fim = (parte.strip() for parte in janela.split("-"))
+    minutos = [int(h) * 60 + int(m) for h, m in (inicio.split(":"), fim.split(":"))]
+    return minutos[0], minutos[1]
+
+
+class AgendadorPJe:
+    """Decide quando cada worker (thread do pool Selenium ou aba do motor CDP) pode começar o próximo processo.
+
+    `taxas_por_host`: {host ou sufixo de host: requisições/s}; hosts não listados usam `taxa_padrao`.
+    `contar_feitos_hoje`: função que devolve quantos processos já foram tentados hoje (ex.: pelo ledger),
+    para a cota diária sobreviver a reinícios.
+    """
+
+    def __init__(self, limite_max, limite_inicial=None, limite_min=1, taxas_por_host=None, taxa_padrao=2.0,
+                 janela=None, cota_diaria=None, contar_feitos_hoje=None, fator_latencia=3.0,
+                 intervalo_reducao=5.0, reducao=0.5):
+        self.limite_max = max(1, limite_max)
+        self.limite_min = max(1, min(limite_min, self.limite_max))
+        self.limite = float(min(self.limite_max, limite_inicial or self.limite_max))
+        self.taxas_por_host = dict(taxas_por_host or {})
+        self.taxa_padrao = taxa_padrao
+        self.janela = _ler_janela(janela) if janela else None
+        self.cota_diaria = cota_diaria
+        self.fator_latencia = fator_latencia
+        self.intervalo_reducao = intervalo_reducao
+        self.reducao = reducao
+        self._condicao = threading.Condition()
+        self._em_andamento = 0
+        self._baldes = {}
+        self._latencias = {}
+        self._ultima_reducao = 0.0
+        self._dia = time.strftime("%Y-%m-%d")
+        self._feitos_hoje = contar_feitos_hoje() if contar_feitos_hoje else 0
+        self._aviso_espera = None
+        self.historico = []  # (monotonic, limite) a cada mudança, para gráficos e para o teste de convergência
+        self.sinais = {"sobrecarga_http": 0, "timeout": 0, "latencia": 0}
+        pje_metricas.adicionar_ouvinte(self._ao_registrar_span)
+
+    def fechar(self):
+        pje_metricas.remover_ouvinte(self._ao_registrar_span)
+
+    # --- Janela e cota ---
+
+    def _segundos_fora_da_janela(self):
+        if self.janela is None:
+            return 0.0
+        agora = time.localtime()
+        minuto = agora.tm_hour * 60 + agora.tm_min
+        inicio, fim = self.janela
+        dentro = inicio <= minuto < fim if inicio <= fim else minuto >= inicio or minuto < fim
+        return 0.0 if dentro else ((inicio - minuto) % 1440) * 60.0 - agora.tm_sec
+
+    def _segundos_ate_nova_cota(self):
+        dia = time.strftime("%Y-%m-%d")
+        if dia != self._dia:
+            self._dia, self._feitos_hoje = dia, 0
+        if not self.cota_diaria or self._feitos_hoje + self._em_andamento < self.cota_diaria:
+            return 0.0
+        agora = time.localtime()
+        return 86400.0 - (agora.tm_hour * 3600 + agora.tm_min * 60 + agora.tm_sec)
+
+    def segundos_ate_liberar(self):
+        """0 se a janela de horário e a cota diária permitem começar um processo agora; senão, a espera."""
+        with self._condicao:
+            espera = max(self._segundos_fora_da_janela(), self._segundos_ate_nova_cota())
+        if espera and self._aviso_espera is None:
+            self._aviso_espera = espera
+            print(f"[Agendador] Fora da janela de horário ou cota diária esgotada. Retomando em "
+                  f"{espera / 60:.0f} min.")
+        elif not espera:
+            self._aviso_espera = None
+        return espera
+
+    # --- Limite de simultâneos (AIMD) ---
+
+    def tentar_ocupar_vaga(self):
+        """Ocupa uma vaga sem bloquear (para o motor assíncrono). Retorna False se o limite atual já foi atingido."""
+        with self._condicao:
+            if self._em_andamento >= max(self.limite_min, int(self.limite)):
+                return False
+            if self.cota_diaria and self._feitos_hoje + self._em_andamento >= self.cota_diaria:
+                return False
+            self._em_andamento += 1
+            return True
+
+    def ocupar_vaga(self):
+        """Bloqueia até a janela/cota permitirem e houver vaga dentro do limite atual."""
+        while True:
+            espera = self.segundos_ate_liberar()
+            if espera:
+                time.sleep(min(espera, 300.0))
+                continue
+            with self._condicao:
+                if self.tentar_ocupar_vaga():
+                    return
+                self._condicao.wait(1.0)
+
+    def liberar_vaga(self, processou=True):
+        """Devolve a vaga; `processou=False` quando não havia processo disponível (não conta na cota)."""
+        with self._condicao:
+            self._em_andamento -= 1
+            if processou:
+                self._feitos_hoje += 1
+            self._condicao.notify_all()
+
+    def _reduzir(self, sinal):
+        with self._condicao:
+            self.sinais[sinal] += 1
+            agora = time.monotonic()
+            # No máximo uma redução por intervalo: uma rajada de timeouts da mesma sobrecarga conta uma vez
+            if agora - self._ultima_reducao < self.intervalo_reducao:
+                return
+            self._ultima_reducao = agora
+            novo = max(float(self.limite_min), self.limite * self.reducao)
+            if int(novo) != int(self.limite):
+                print(f"[Agendador] Sinal de sobrecarga ({sinal}): simultâneos {int(self.limite)} -> {int(novo)}.")
+            self.limite = novo
+            self.historico.append((agora, self.limite))
+
+    def _aumentar(self):
+        with self._condicao:
+            # +1 a cada `limite` processos concluídos sem sobrecarga (uma "rodada" completa)
+            novo = min(float(self.limite_max), self.limite + 1.0 / self.limite)
+            if int(novo) != int(self.limite):
+                print(f"[Agendador] PJe respondendo bem: simultâneos {int(self.limite)} -> {int(novo)}.")
+                self.historico.append((time.monotonic(), novo))
+                self._condicao.notify_all()
+            self.limite = novo
+
+    def _ao_registrar_span(self, passo, segundos, resultado, tags):
+        if resultado == pje_metricas.ERRO and tags.get("erro") in _ERROS_SOBRECARGA:
+            self._reduzir("timeout")
+            return
+        if passo in _PASSOS_LATENCIA and resultado == pje_metricas.OK:
+            amostras = self._latencias.setdefault(passo, deque(maxlen=_AMOSTRAS_REFERENCIA))
+            referencia = min(amostras) if amostras else None
+            amostras.append(segundos)
+            if (referencia is not None and segundos > max(_LATENCIA_MINIMA_SOBRECARGA,
+                                                          referencia * self.fator_latencia)):
+                self._reduzir("latencia")
+        elif passo == "processo.total" and resultado == pje_metricas.OK:
+            self._aumentar()
+
+    # --- Baldes por host ---
+
+    def _balde(self, url):
+        host = urlparse(url).hostname or url
+        with self._condicao:
+            balde = self._baldes.get(host)
+            if balde is None:
+                # O sufixo mais específico vence (ex.: 'pje1g.trf3.jus.br' antes de 'trf3.jus.br')
+                sufixos = sorted((s for s in self.taxas_por_host if host == s or host.endswith("." + s)),
+                                 key=len, reverse=True)
+                taxa = self.taxas_por_host[sufixos[0]] if sufixos else self.taxa_padrao
+                balde = self._baldes[host] = BaldeTokens(taxa, capacidade=max(1.0, taxa))
+            return balde
+
+    def reservar_host(self, url):
+        """Reserva um token do host de `url` e retorna a espera em segundos (para o motor assíncrono)."""
+        balde = self._balde(url)
+        with self._condicao:
+            return balde.reservar()
+
+    def aguardar_host(self, url):
+        espera = self.reservar_host(url)
+        if espera > 0:
+            time.sleep(espera)
+
+    def registrar_resposta_http(self, url, status=None, retry_after=None, timeout=False):
+        """Sinal vindo de um cliente HTTP: timeout, 5xx ou 429 (com Retry-After, o host fica pausado)."""
+        if timeout:
+            self._reduzir("timeout")
+            return
+        if status is None or (status < 500 and status != 429):
+            return
+        if retry_after and str(retry_after).isdigit():
+            balde = self._balde(url)
+            with self._condicao:
+                balde.suspender(float(retry_after))
+        self._reduzir("sobrecarga_http")
+
+
+def ler_taxas_por_host(texto):
+    """'pje1g.trf3.jus.br=2,pje-downloads.trf3.jus.br=1' -> {host: taxa}."""
+    taxas = {}
+    for item in (texto or "").split(","):
+        if "=" in item:
+            host, taxa = item.split("=", 1)
+            taxas[host.strip()] = float(taxa)
+    return taxas
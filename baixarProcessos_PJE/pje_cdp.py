@@ -0,0 +1,461 @@
+# pje_cdp.py
+# Motor assíncrono: dirige o Chrome já logado pelo Selenium direto pelo DevTools Protocol (CDP), com asyncio,
+# rodando o fluxo Acesso Rápido -> autos -> download em várias abas ao mesmo tempo, em um único navegador.
+# Requer o pacote opcional 'websockets'. Os PDFs são gravados pelo pje_downloader (motor de download 'http').
+import json
+import time
+import asyncio
+import urllib.request
+from urllib.parse import urlparse
+
+import pje_delta
+import pje_metricas
+import pje_scraper
+
+TIMEOUTS_PJE = pje_scraper.TIMEOUTS_PJE
+
+# window.open é substituído na aba para capturar a URL que o PJe abriria numa janela nova (autos, PDF)
+_JS_INTERCEPTAR_JANELA = (
+    "(() => { window.__pjeUrlsAbertas = [];"
+    " window.open = function (url) { window.__pjeUrlsAbertas.push(new URL(String(url), location.href).href);"
+    " return null; }; return true; })()"
+)
+
+
+class ErroCDP(Exception):
+    """Erro devolvido pelo navegador a um comando CDP, ou elemento/página esperado que não apareceu."""
+
+
+class TempoEsgotadoCDP(ErroCDP):
+    """Página ou elemento não apareceu dentro do tempo máximo (sinal de PJe lento para o agendador)."""
+
+
+def _importar_websockets():
+    try:
+        import websockets
+    except ImportError:
+        raise ErroCDP("O motor 'cdp' requer o pacote opcional 'websockets' (pip install websockets).")
+    return websockets
+
+
+def endereco_depuracao_driver(driver):
+    """host:porta do DevTools do Chrome aberto pelo Selenium (o chromedriver sempre habilita a depuração remota)."""
+    return driver.capabilities["goog:chromeOptions"]["debuggerAddress"]
+
+
+def _url_websocket_navegador(endereco_depuracao):
+    with urllib.request.urlopen(f"http://{endereco_depuracao}/json/version", timeout=10) as resposta:
+        return json.loads(resposta.read())["webSocketDebuggerUrl"]
+
+
+def _js_elemento(xpath):
+    return (f"document.evaluate({json.dumps(xpath)}, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null)"
+            f".singleNodeValue")
+
+
+def _js_visivel(xpath):
+    return (f"(() => {{ const e = {_js_elemento(xpath)};"
+            f" return !!e && !!(e.offsetWidth || e.offsetHeight || e.getClientRects().length)"
+            f" && getComputedStyle(e).visibility !== 'hidden'; }})()")
+
+
+def _js_clicar(xpath):
+    return f"(() => {{ const e = {_js_elemento(xpath)}; if (!e) return false; e.click(); return true; }})()"
+
+
+class ConexaoCDP:
+    """Uma única conexão WebSocket com o navegador, multiplexando as sessões de todas as abas (flatten)."""
+
+    def __init__(self, ws):
+        self._ws = ws
+        self._proximo_id = 0
+        self._pendentes = {}
+        self._ouvintes = []
+        self._leitor = asyncio.create_task(self._ler())
+
+    @classmethod
+    async def conectar(cls, endereco_depuracao):
+        websockets = _importar_websockets()
+        url_ws = await asyncio.to_thread(_url_websocket_navegador, endereco_depuracao)
+        conexao = cls(await websockets.connect(url_ws, max_size=None, ping_interval=None))
+        # Necessário para receber Target.targetCreated das janelas abertas pelas páginas
+        await conexao.enviar("Target.setDiscoverTargets", {"discover": True})
+        return conexao
+
+    async def _ler(self):
+        try:
+            async for bruto in self._ws:
+                mensagem = json.loads(bruto)
+                if "id" in mensagem:
+                    futuro = self._pendentes.pop(mensagem["id"], None)
+                    if futuro is None or futuro.done():
+                        continue
+                    if "error" in mensagem:
+                        futuro.set_exception(ErroCDP(mensagem["error"].get("message", str(mensagem["error"]))))
+                    else:
+                        futuro.set_result(mensagem.get("result", {}))
+                    continue
+                for ouvinte in list(self._ouvintes):
+                    metodo, sessao, predicado, futuro = ouvinte
+                    if futuro.done():
+                        self._ouvintes.remove(ouvinte)
+                    elif (mensagem.get("method") == metodo and (sessao is None or mensagem.get("sessionId") == sessao)
+                          and predicado(mensagem.get("params", {}))):
+                        futuro.set_result(mensagem.get("params", {}))
+                        self._ouvintes.remove(ouvinte)
+        finally:
+            for futuro in list(self._pendentes.values()) + [o[3] for o in self._ouvintes]:
+                if not futuro.done():
+                    futuro.set_exception(ConnectionError("Conexão CDP com o navegador encerrada."))
+
+    async def enviar(self, metodo, params=None, sessao=None, timeout=30.0):
+        self._proximo_id += 1
+        id_mensagem = self._proximo_id
+        futuro = asyncio.get_running_loop().create_future()
+        self._pendentes[id_mensagem] = futuro
+        mensagem = {"id": id_mensagem, "method": metodo, "params": params or {}}
+        if sessao:
+            mensagem["sessionId"] = sessao
+        await self._ws.send(json.dumps(mensagem))
+        try:
+            return await asyncio.wait_for(futuro, timeout)
+        finally:
+            self._pendentes.pop(id_mensagem, None)
+
+    def esperar_evento(self, metodo, predicado=None, sessao=None):
+        """Registra a espera de um evento. Chame ANTES da ação que o dispara e aguarde o future retornado."""
+        futuro = asyncio.get_running_loop().create_future()
+        self._ouvintes.append((metodo, sessao, predicado or (lambda params: True), futuro))
+        return futuro
+
+    @property
+    def encerrada(self):
+        """True quando a conexão com o navegador caiu (nenhuma aba consegue continuar)."""
+        return self._leitor.done()
+
+    async def fechar(self):
+        await self._ws.close()
+        self._leitor.cancel()
+
+
+class AbaCDP:
+    """Uma aba do navegador controlada por uma sessão CDP própria."""
+
+    def __init__(self, conexao, id_alvo, sessao):
+        self.conexao = conexao
+        self.id_alvo = id_alvo
+        self.sessao = sessao
+
+    @classmethod
+    async def abrir(cls, conexao, padroes_bloqueados=None):
+        id_alvo = (await conexao.enviar("Target.createTarget", {"url": "about:blank"}))["targetId"]
+        sessao = (await conexao.enviar("Target.attachToTarget", {"targetId": id_alvo, "flatten": True}))["sessionId"]
+        aba = cls(conexao, id_alvo, sessao)
+        await aba.enviar("Page.enable")
+        if padroes_bloqueados:
+            await aba.enviar("Network.enable")
+            await aba.enviar("Network.setBlockedURLs", {"urls": list(padroes_bloqueados)})
+        return aba
+
+    async def enviar(self, metodo, params=None, timeout=30.0):
+        return await self.conexao.enviar(metodo, params, self.sessao, timeout)
+
+    async def avaliar(self, expressao, timeout=30.0):
+        resultado = await self.enviar("Runtime.evaluate", {"expression": expressao, "returnByValue": True,
+                                                           "awaitPromise": True}, timeout)
+        if "exceptionDetails" in resultado:
+            raise ErroCDP(resultado["exceptionDetails"].get("text", "erro de JavaScript"))
+        return resultado.get("result", {}).get("value")
+
+    async def esperar(self, expressao, timeout, descricao="condição", intervalo=0.1):
+        """Reavalia `expressao` até ela ser verdadeira, como o WebDriverWait (ErroCDP ao atingir o teto)."""
+        limite = time.monotonic() + timeout
+        while True:
+            try:
+                valor = await self.avaliar(expressao)
+            except ErroCDP:
+                valor = None  # contexto destruído por uma navegação em andamento
+            if valor:
+                return valor
+            if time.monotonic() >= limite:
+                raise TempoEsgotadoCDP(f"Tempo esgotado ({timeout} s) aguardando {descricao}.")
+            await asyncio.sleep(intervalo)
+
+    async def navegar(self, url, timeout):
+        carregou = self.conexao.esperar_evento("Page.loadEventFired", sessao=self.sessao)
+        try:
+            resultado = await self.enviar("Page.navigate", {"url": url}, timeout)
+            if resultado.get("errorText"):
+                raise ErroCDP(f"Falha ao navegar para {url}: {resultado['errorText']}")
+            await asyncio.wait_for(carregou, timeout)
+        except asyncio.TimeoutError:
+            raise TempoEsgotadoCDP(f"Tempo esgotado ({timeout} s) carregando {url}.")
+        finally:
+            if not carregou.done():
+                carregou.cancel()
+
+    async def clicar(self, xpath):
+        if not await self.avaliar(_js_clicar(xpath)):
+            raise ErroCDP(f"Elemento não encontrado para clicar: {xpath}")
+
+    async def capturar_janela_aberta(self, xpath_clique, timeout):
+        """Clica em `xpath_clique` e retorna a URL que a página abriria numa janela nova.
+
+        window.open é interceptado na própria aba, então nenhuma aba extra é criada. Se a página abrir a
+        janela de outro jeito (ex.: form com target), a aba nova é identificada pelo openerId, tem a URL lida
+        e é fechada.
+        """
+        nova_aba = self.conexao.esperar_evento(
+            "Target.targetCreated", lambda params: params["targetInfo"].get("openerId") == self.id_alvo)
+        try:
+            await self.avaliar(_JS_INTERCEPTAR_JANELA)
+            await self.clicar(xpath_clique)
+            limite = time.monotonic() + timeout
+            while time.monotonic() < limite:
+                try:
+                    urls = await self.avaliar("window.__pjeUrlsAbertas || []")
+                except ErroCDP:
+                    urls = []
+                if urls:
+                    return urls[0]
+                if nova_aba.done():
+                    return await self._url_e_fechar(nova_aba.result()["targetInfo"]["targetId"], limite)
+                await asyncio.sleep(0.1)
+            raise TempoEsgotadoCDP(f"Tempo esgotado ({timeout} s) aguardando a janela aberta por {xpath_clique}.")
+        finally:
+            if not nova_aba.done():
+                nova_aba.cancel()
+
+    async def _url_e_fechar(self, id_alvo, limite):
+        try:
+            while time.monotonic() < limite:
+                info = (await self.conexao.enviar("Target.getTargetInfo", {"targetId": id_alvo}))["targetInfo"]
+                if info.get("url") not in ("", "about:blank"):
+                    return info["url"]
+                await asyncio.sleep(0.1)
+            raise TempoEsgotadoCDP("Tempo esgotado aguardando a URL da janela aberta.")
+        finally:
+            await self.conexao.enviar("Target.closeTarget", {"targetId": id_alvo})
+
+    async def fechar(self):
+        await self.conexao.enviar("Target.closeTarget", {"targetId": self.id_alvo})
+
+
+class LimitadorPorHost:
+    """Limita navegações e downloads simultâneos por host, somando todas as abas."""
+
+    def __init__(self, limite):
+        self.limite = max(1, limite)
+        self._semaforos = {}
+
+    def semaforo(self, url):
+        return self._semaforos.setdefault(urlparse(url).netloc, asyncio.Semaphore(self.limite))
+
+
+async def _baixar_pdf(conexao, downloader, limitador, url_pdf, numero_processo, referer):
+    """Grava o PDF com o DownloaderPJe (bloqueante, em outra thread), com os cookies atuais do navegador."""
+    downloader.atualizar_cookies((await conexao.enviar("Storage.getCookies"))["cookies"])
+    async with limitador.semaforo(url_pdf):
+        return await asyncio.to_thread(downloader.baixar_pdf, url_pdf, numero_processo, referer)
+
+
+async def acessar_processo_cdp(aba, numero_processo, downloader, limitador, url_home, cache_autos=None,
+                               worker="cdp"):
+    """Equivalente assíncrono de pje_scraper.access_process_via_quick_search_and_download (motor 'http').
+
+    Usa os mesmos XPaths, tempos máximos e cache de URLs dos autos; retorna True só se o PDF foi gravado.
+    """
+    numero_formatado = pje_scraper.format_process_number_for_pje_input(numero_processo)
+    passos = pje_metricas.SequenciaPassos("acesso", processo=numero_processo, worker=worker)
+    prefixo = f"[{worker}] "
+    url_autos = None
+    try:
+        # O ledger é sqlite síncrono: as chamadas vão para uma thread para não travar as outras abas
+        entrada_cache = (await asyncio.to_thread(cache_autos.obter_url_autos, numero_processo)
+                         if cache_autos is not None else None)
+        if entrada_cache:
+            url_autos_cache, url_pdf_cache = entrada_cache
+            if url_pdf_cache:
+                passos.passo("cache_pdf_direto")
+                if await _baixar_pdf(aba.conexao, downloader, limitador, url_pdf_cache, numero_processo,
+                                     url_autos_cache):
+                    passos.encerrar()
+                    print(f"{prefixo}SUCESSO: PDF de '{numero_processo}' gravado (URL do PDF em cache).")
+                    return True
+                passos.encerrar(pje_metricas.FALHA)
+                await asyncio.to_thread(cache_autos.invalidar_url_autos, numero_processo, somente_pdf=True)
+            passos.passo("cache_autos_direto")
+            async with limitador.semaforo(url_autos_cache):
+                await aba.navegar(url_autos_cache, TIMEOUTS_PJE["autos_em_cache"])
+            url_atual = await aba.avaliar("location.href")
+            if ("Detalhe/listAutosDigitais.seam" in url_atual
+                    and await aba.avaliar(f"!!{_js_elemento(pje_scraper.XPATH_MENU_DOWNLOAD)}")):
+                url_autos = url_atual
+            else:
+                passos.encerrar(pje_metricas.FALHA)
+                if "sso.cloud.pje.jus.br" not in url_atual:
+                    await asyncio.to_thread(cache_autos.invalidar_url_autos, numero_processo)
+                print(f"{prefixo}URL dos autos em cache não abriu os autos de '{numero_processo}'. "
+                      f"Voltando ao Acesso Rápido...")
+
+        if url_autos is None:
+            passos.passo("passo0_home_pronta")
+            async with limitador.semaforo(url_home):
+                await aba.navegar(url_home, TIMEOUTS_PJE["pagina_pronta"])
+
+            passos.passo("passo1_menu")
+            try:
+                await aba.esperar(_js_visivel(pje_scraper.XPATH_MENU_HAMBURGUER), TIMEOUTS_PJE["menu"], "'Abrir menu'")
+                await aba.clicar(pje_scraper.XPATH_MENU_HAMBURGUER)
+                await aba.esperar(_js_visivel(pje_scraper.XPATH_NAV_MENU), TIMEOUTS_PJE["menu"], "menu visível")
+            except ErroCDP as e_menu:
+                passos.encerrar(pje_metricas.ERRO, e_menu)
+                print(f"{prefixo}AVISO: Problema ao interagir com 'Abrir menu': {e_menu}. Prosseguindo...")
+
+            passos.passo("passo2_acesso_rapido")
+            await aba.esperar(_js_visivel(pje_scraper.XPATH_ACESSO_RAPIDO), TIMEOUTS_PJE["acesso_rapido"],
+                              "campo 'Acesso rápido'")
+            await aba.avaliar(
+                f"(() => {{ const e = {_js_elemento(pje_scraper.XPATH_ACESSO_RAPIDO)};"
+                f" e.value = {json.dumps(numero_formatado)};"
+                f" e.dispatchEvent(new Event('input', {{ bubbles: true }})); return true; }})()")
+
+            passos.passo("passo3_sugestao")
+            await aba.esperar(_js_visivel(pje_scraper.XPATH_SUGESTAO_PROCESSO), TIMEOUTS_PJE["sugestao_processo"],
+                              "sugestão 'Abrir processo'")
+
+            passos.passo("passo4_aba_autos")
+            url_nova = await aba.capturar_janela_aberta(pje_scraper.XPATH_SUGESTAO_PROCESSO,
+                                                        TIMEOUTS_PJE["nova_aba_autos"])
+            async with limitador.semaforo(url_nova):
+                await aba.navegar(url_nova, TIMEOUTS_PJE["pagina_autos"])
+            url_autos = await aba.avaliar("location.href")
+            if "Detalhe/listAutosDigitais.seam" not in url_autos:
+                raise ErroCDP(f"Página dos autos não abriu (URL atual: {url_autos}).")
+            if cache_autos is not None:
+                await asyncio.to_thread(cache_autos.gravar_url_autos, numero_processo, url_autos)
+
+        passos.passo("passo5_menu_download")
+        await aba.esperar(_js_visivel(pje_scraper.XPATH_MENU_DOWNLOAD), TIMEOUTS_PJE["menu_download"],
+                          "botão de download dos autos")
+        await aba.clicar(pje_scraper.XPATH_MENU_DOWNLOAD)
+        await aba.esperar(_js_visivel(pje_scraper.XPATH_BOTAO_DOWNLOAD), TIMEOUTS_PJE["botao_download"],
+                          "botão intermediário 'Download'")
+
+        passos.passo("passo6_aba_pdf")
+        url_pdf = await aba.capturar_janela_aberta(pje_scraper.XPATH_BOTAO_DOWNLOAD, TIMEOUTS_PJE["nova_aba_pdf"])
+
+        passos.passo("passo7_download_http")
+        if await _baixar_pdf(aba.conexao, downloader, limitador, url_pdf, numero_processo, url_autos):
+            passos.encerrar()
+            if cache_autos is not None:
+                await asyncio.to_thread(cache_autos.gravar_url_autos, numero_processo, url_autos, url_pdf)
+            print(f"{prefixo}SUCESSO: PDF de '{numero_processo}' gravado.")
+            return True
+        passos.encerrar(pje_metricas.FALHA)
+        print(f"{prefixo}FALHA: PDF de '{numero_processo}' não foi gravado.")
+        return False
+    except Exception as e:
+        # Como no fluxo Selenium, qualquer erro (CDP, conexão, disco cheio no download...) só falha este processo
+        passos.encerrar(pje_metricas.ERRO, e)
+        print(f"{prefixo}ERRO [CDP] ao acessar '{numero_processo}': {type(e).__name__} - {e}")
+        return False
+
+
+async def _ocupar_vaga(agendador):
+    """Versão assíncrona de AgendadorPJe.ocupar_vaga (não bloqueia o laço de eventos das outras abas)."""
+    while True:
+        espera = agendador.segundos_ate_liberar()
+        if espera:
+            await asyncio.sleep(min(espera, 300.0))
+        elif agendador.tentar_ocupar_vaga():
+            return
+        else:
+            await asyncio.sleep(0.2)
+
+
+async def _trabalhador_aba(id_aba, conexao, ledger, cfg, downloader, limitador, padroes_bloqueados):
+    """Laço de uma aba: reserva processos no ledger e roda o fluxo até a fila esvaziar."""
+    worker = f"aba-{id_aba}"
+    cache_autos = ledger if cfg["cache_autos"] else None
+    agendador = cfg["agendador"]
+    aba = await AbaCDP.abrir(conexao, padroes_bloqueados)
+    numero = None
+    try:
+        while True:
+            await _ocupar_vaga(agendador)
+            # Chamadas ao ledger (sqlite, BEGIN IMMEDIATE pode esperar o lock) rodam fora do laço de eventos
+            reserva = await asyncio.to_thread(ledger.reservar, worker)
+            if reserva is None:
+                agendador.liberar_vaga(processou=False)
+                espera = await asyncio.to_thread(ledger.segundos_ate_proximo_disponivel)
+                if espera is None and not cfg["ingestao_concluida"].is_set():
+                    await asyncio.sleep(0.5)
+                    continue
+                if espera is None:
+                    break
+                await asyncio.sleep(min(max(espera, 1.0), 30.0))
+                continue
+            numero, tentativa = reserva
+            print(f"\n[{worker}] ===== INICIANDO PJe (CDP): Processo '{numero}' (tentativa {tentativa}) =====")
+            inicio = time.monotonic()
+            try:
+                await asyncio.sleep(agendador.reservar_host(cfg["url_pje_home"]))
+                parar_heartbeat = ledger.iniciar_heartbeat(numero, worker)
+                try:
+                    sucesso = await acessar_processo_cdp(aba, numero, downloader, limitador, cfg["url_pje_home"],
+                                                         cache_autos, worker)
+                finally:
+                    await asyncio.to_thread(parar_heartbeat)
+            finally:
+                agendador.liberar_vaga()
+            duracoes = {"acesso_processo": time.monotonic() - inicio, "total": time.monotonic() - inicio}
+            pje_metricas.registrar_span("processo.total", duracoes["total"],
+                                        pje_metricas.OK if sucesso else pje_metricas.FALHA,
+                                        processo=numero, worker=worker)
+            if sucesso:
+                if not await asyncio.to_thread(ledger.concluir, numero, worker, duracoes):
+                    print(f"[{worker}] AVISO: a reserva de '{numero}' expirou e passou para outra aba.")
+                if cfg["impressao_autos"]:
+                    await asyncio.to_thread(pje_delta.registrar_impressao, ledger, downloader.sessao, numero)
+            elif await asyncio.to_thread(ledger.falhar, numero, worker, "falha ao abrir/baixar o PDF (motor cdp)",
+                                         duracoes) is None:
+                print(f"[{worker}] AVISO: a reserva de '{numero}' expirou e passou para outra aba.")
+            numero = None
+            if conexao.encerrada:
+                # Sem conexão com o navegador, insistir só gastaria as tentativas dos próximos processos
+                print(f"[{worker}] Conexão CDP com o navegador encerrada. Aba finalizada.")
+                return
+    except Exception as e_aba:
+        print(f"[{worker}] ERRO CRÍTICO na aba: {type(e_aba).__name__} - {e_aba}")
+        if numero is not None:
+            # Devolve o processo em andamento ao ledger para que outra aba o tente
+            await asyncio.to_thread(ledger.falhar, numero, worker, f"{type(e_aba).__name__}: {e_aba}")
+        return
+    finally:
+        try:
+            await aba.fechar()
+        except Exception:
+            pass  # navegador ou conexão já encerrados
+    print(f"[{worker}] Não há mais processos disponíveis. Aba finalizada.")
+
+
+async def _executar_abas(endereco_depuracao, ledger, cfg, downloader, num_abas, limite_por_host, padroes):
+    conexao = await ConexaoCDP.conectar(endereco_depuracao)
+    try:
+        limitador = LimitadorPorHost(limite_por_host)
+        await asyncio.gather(*(_trabalhador_aba(i, conexao, ledger, cfg, downloader, limitador, padroes)
+                               for i in range(1, num_abas + 1)))
+    finally:
+        await conexao.fechar()
+
+
+def executar_abas_cdp(driver, ledger, cfg, downloader, num_abas=4, limite_por_host=4):
+    """Roda o fluxo em `num_abas` abas do navegador já logado em `driver` e retorna quando a fila esvaziar.
+
+    As abas compartilham o contexto (cookies da sessão) do navegador; `limite_por_host` limita as navegações
+    e downloads simultâneos em cada host do PJe.
+    """
+    print(f"Motor CDP: {num_abas} abas no mesmo navegador, até {limite_por_host} operações simultâneas por host.")
+    asyncio.run(_executar_abas(endereco_depuracao_driver(driver), ledger, cfg, downloader, num_abas,
+                               limite_por_host, pje_scraper.padroes_bloqueados(driver)))
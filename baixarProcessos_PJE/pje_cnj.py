@@ -0,0 +1,249 @@
+# pje_cnj.py
+import re
+import sys
+import time
+from collections import Counter, defaultdict
+from itertools import compress
+from typing import NamedTuple, Optional
+
+# Número único CNJ (Resolução CNJ 65/2008): NNNNNNN-DD.AAAA.J.TR.OOOO
+_RE_CNJ_FORMATADO = re.compile(r"(\d{1,7})-?(\d{2})\.?(\d{4})\.?(\d)\.?(\d{2})\.?(\d{4})")
+_RE_NAO_DIGITO = re.compile(r"[^0-9]+")
+
+_ANO_MINIMO = 1900
+_ANO_MAXIMO = time.localtime().tm_year + 1
+# Abaixo deste tamanho o laço em Python puro é mais rápido que montar os arrays do numpy
+_MIN_LOTE_VETORIZADO = 2048
+
+# Tribunais (TR) aceitos para cada segmento do Judiciário (J)
+_TRIBUNAIS_POR_RAMO = {
+    "1": {0},  # STF
+    "2": {0},  # CNJ
+    "3": {0},  # STJ
+    "4": set(range(1, 7)) | {90},  # Justiça Federal: TRF1 a TRF6 (90 = CJF)
+    "5": set(range(0, 25)),  # Justiça do Trabalho: TST (00) e TRT1 a TRT24
+    "6": set(range(0, 28)),  # Justiça Eleitoral: TSE (00) e TREs
+    "7": set(range(0, 13)),  # Justiça Militar da União: STM (00) e circunscrições
+    "8": set(range(1, 28)),  # Justiça Estadual: TJs
+    "9": {13, 21, 26},  # Justiça Militar Estadual: MG, RS, SP
+}
+# Prefixos "J.TR" válidos (posições 13 a 15 do número sem pontuação), para validação com um único lookup
+_RAMO_TRIBUNAL_VALIDOS = frozenset(f"{ramo}{tr:02d}" for ramo, trs in _TRIBUNAIS_POR_RAMO.items() for tr in trs)
+
+
+class RegistroCNJ(NamedTuple):
+    sequencial: str
+    digito: str
+    ano: str
+    ramo: str
+    tribunal: str
+    origem: str
+
+    @property
+    def numero(self):
+        return f"{self.sequencial}{self.digito}{self.ano}{self.ramo}{self.tribunal}{self.origem}"
+
+    def formatado(self):
+        return f"{self.sequencial}-{self.digito}.{self.ano}.{self.ramo}.{self.tribunal}.{self.origem}"
+
+
+class LoteCNJ(NamedTuple):
+    """Resultado da normalização em lote.
+
+    `validos` guarda cada processo como uma string de 20 dígitos (forma compacta; use `registro()` para os
+    campos) e `invalidos` guarda pares (valor original, motivo da rejeição).
+    """
+    validos: list
+    invalidos: list
+
+
+def registro(numero20: str) -> RegistroCNJ:
+    """Separa os campos de um número CNJ de 20 dígitos já normalizado."""
+    return RegistroCNJ(numero20[0:7], numero20[7:9], numero20[9:13], numero20[13:14], numero20[14:16],
+                       numero20[16:20])
+
+
+def calcular_digito(numero20: str) -> str:
+    """Calcula o dígito verificador (módulo 97, ISO 7064) de um número CNJ de 20 dígitos."""
+    return f"{98 - (int(numero20[0:7] + numero20[9:20]) * 100) % 97:02d}"
+
+
+def _somente_digitos(valor: str) -> Optional[str]:
+    """Extrai os 20 dígitos CNJ de um valor, aceitando número puro (completando zeros à esquerda) ou formatado."""
+    if valor.isdigit():
+        digitos = valor
+    elif len(valor) == 25 and valor[7] == "-" and valor[10] == "." and valor[15] == "." and valor[17] == ".":
+        # Formato canônico NNNNNNN-DD.AAAA.J.TR.OOOO: evita a regex no caso mais comum
+        return valor.replace("-", "").replace(".", "")
+    else:
+        valor = valor.strip()
+        match = _RE_CNJ_FORMATADO.fullmatch(valor)
+        if match:
+            sequencial, digito, ano, ramo, tribunal, origem = match.groups()
+            return f"{sequencial.zfill(7)}{digito}{ano}{ramo}{tribunal}{origem}"
+        digitos = _RE_NAO_DIGITO.sub("", valor)
+    if 15 <= len(digitos) < 20:
+        # Planilhas costumam perder os zeros à esquerda do sequencial
+        digitos = digitos.zfill(20)
+    return digitos
+
+
+def motivo_invalidez(numero20: Optional[str]) -> Optional[str]:
+    """Explica por que um número (já reduzido a dígitos) não é um CNJ válido; None se for válido."""
+    if not numero20 or len(numero20) != 20:
+        return f"quantidade de dígitos inválida ({len(numero20 or '')}, esperado 20)"
+    if not (numero20.isascii() and numero20.isdigit()):
+        return f"caracteres não numéricos em '{numero20}'"
+    ramo, tribunal, ano = numero20[13], int(numero20[14:16]), int(numero20[9:13])
+    if ramo not in _TRIBUNAIS_POR_RAMO:
+        return f"segmento do Judiciário (J) inválido: {ramo}"
+    if tribunal not in _TRIBUNAIS_POR_RAMO[ramo]:
+        return f"tribunal (TR) {tribunal:02d} inexistente no segmento {ramo}"
+    if not _ANO_MINIMO <= ano <= _ANO_MAXIMO:
+        return f"ano {ano} fora do intervalo {_ANO_MINIMO}-{_ANO_MAXIMO}"
+    esperado = calcular_digito(numero20)
+    if numero20[7:9] != esperado:
+        return f"dígito verificador {numero20[7:9]} incorreto (esperado {esperado})"
+    return None
+
+
+def normalizar_lote(valores) -> LoteCNJ:
+    """Normaliza e valida uma sequência de números CNJ (strings formatadas ou não), preservando a ordem.
+
+    Confere quantidade de dígitos, dígito verificador (mod 97), segmento/tribunal e ano. Lotes grandes são
+    validados de forma vetorizada com numpy (quando instalado); o motivo detalhado só é calculado para os
+    rejeitados.
+    """
+    valores = valores if isinstance(valores, list) else list(valores)
+    candidatos = [v if len(v) == 20 and v.isdigit() else _somente_digitos(v) for v in valores]
+    if len(candidatos) >= _MIN_LOTE_VETORIZADO:
+        try:
+            mascara, indices_invalidos = _validar_vetorizado(candidatos)
+        except ImportError:
+            mascara = None
+        if mascara is not None:
+            validos = list(compress(candidatos, mascara))
+            invalidos = [(valores[i], motivo_invalidez(candidatos[i])) for i in indices_invalidos]
+            return LoteCNJ(validos, invalidos)
+
+    validos = []
+    invalidos = []
+    ramos_validos = _RAMO_TRIBUNAL_VALIDOS
+    ano_minimo, ano_maximo = str(_ANO_MINIMO), str(_ANO_MAXIMO)
+    for valor, numero20 in zip(valores, candidatos):
+        if (len(numero20) == 20 and numero20.isdigit() and numero20[13:16] in ramos_validos
+                and ano_minimo <= numero20[9:13] <= ano_maximo
+                and int(numero20[0:7] + numero20[9:20] + numero20[7:9]) % 97 == 1):
+            validos.append(numero20)
+        else:
+            invalidos.append((valor, motivo_invalidez(numero20)))
+    return LoteCNJ(validos, invalidos)
+
+
+def _validar_vetorizado(candidatos, linhas_por_bloco=65536):
+    """Valida os candidatos com numpy, em blocos de memória limitada.
+
+    Retorna (lista de bool com True para os válidos, índices dos inválidos).
+    """
+    import numpy as np
+
+    # O número é válido quando NNNNNNN AAAA J TR OOOO DD (DV movido para o fim) ≡ 1 (mod 97)
+    pesos = np.empty(20, dtype=np.int32)
+    pesos[list(range(0, 7)) + list(range(9, 20)) + [7, 8]] = [pow(10, 19 - k, 97) for k in range(20)]
+    pesos_ano = np.array([1000, 100, 10, 1], dtype=np.int32)
+    tabela_ramos = np.zeros(1000, dtype=bool)
+    tabela_ramos[[int(rt) for rt in _RAMO_TRIBUNAL_VALIDOS]] = True
+
+    mascara = []
+    indices_invalidos = []
+    for inicio in range(0, len(candidatos), linhas_por_bloco):
+        bloco = candidatos[inicio:inicio + linhas_por_bloco]
+        texto = "".join(bloco)
+        tamanho_ok = None
+        if len(texto) != 20 * len(bloco):
+            # Há candidatos com tamanho errado: troca por zeros (serão reprovados) para manter 20 colunas
+            tamanho_ok = np.fromiter(map(len, bloco), dtype=np.int32, count=len(bloco)) == 20
+            texto = "".join(n if ok else "0" * 20 for n, ok in zip(bloco, tamanho_ok.tolist()))
+        digitos = np.frombuffer(texto.encode("ascii", "replace"), dtype=np.uint8).reshape(-1, 20) - 48
+        validos = (digitos <= 9).all(axis=1)
+        if tamanho_ok is not None:
+            validos &= tamanho_ok
+        # Linhas com caracteres não numéricos já estão reprovadas; o corte só evita índices fora da tabela
+        digitos = np.minimum(digitos, 9).astype(np.int32)
+        validos &= (digitos @ pesos) % 97 == 1
+        validos &= tabela_ramos[digitos[:, 13] * 100 + digitos[:, 14] * 10 + digitos[:, 15]]
+        ano = digitos[:, 9:13] @ pesos_ano
+        validos &= (ano >= _ANO_MINIMO) & (ano <= _ANO_MAXIMO)
+        mascara.extend(validos.tolist())
+        indices_invalidos.extend((np.flatnonzero(~validos) + inicio).tolist())
+    return mascara, indices_invalidos
+
+
+def agrupar_por_origem(numeros20, por_tribunal_apenas=False):
+    """Agrupa números normalizados por (ramo.tribunal, origem) -- ou só por ramo.tribunal -- para agendamento."""
+    grupos = defaultdict(list)
+    for numero20 in numeros20:
+        chave = numero20[13:16] if por_tribunal_apenas else (numero20[13:16], numero20[16:20])
+        grupos[chave].append(numero20)
+    return dict(grupos)
+
+
+_CATEGORIAS_MOTIVO = ("quantidade de dígitos inválida", "caracteres não numéricos", "segmento do Judiciário (J) inválido",
+                      "tribunal (TR) inexistente no segmento", "ano fora do intervalo", "dígito verificador incorreto")
+
+
+def _categoria_motivo(motivo):
+    for categoria in _CATEGORIAS_MOTIVO:
+        if motivo.startswith(categoria.split(" ")[0]):
+            return categoria
+    return motivo
+
+
+def relatorio_invalidos(invalidos, max_linhas=20):
+    """Texto com o total por motivo e os primeiros números rejeitados, com a explicação de cada um."""
+    if not invalidos:
+        return "Nenhum número CNJ inválido."
+    por_motivo = Counter(_categoria_motivo(motivo) for _, motivo in invalidos)
+    linhas = [f"{len(invalidos)} números CNJ rejeitados:"]
+    linhas += [f"  {total:>7}  {motivo}" for motivo, total in por_motivo.most_common()]
+    linhas += [f"    '{valor}': {motivo}" for valor, motivo in invalidos[:max_linhas]]
+    if len(invalidos) > max_linhas:
+        linhas.append(f"    ... e mais {len(invalidos) - max_linhas}.")
+    return "\n".join(linhas)
+
+
+def parse_cnj(numero_processo_completo: str) -> Optional[RegistroCNJ]:
+    """Separa os campos de um número CNJ (sem validar o dígito verificador). None se não tiver formato CNJ."""
+    numero20 = _somente_digitos(numero_processo_completo)
+    if numero20 is None or len(numero20) != 20:
+        return None
+    return registro(numero20)
+
+
+def _benchmark(total=1_000_000):
+    """Microbenchmark: normaliza e valida `total` números (75% só dígitos, 25% formatados, 1% com DV errado).
+
+    Reporta o melhor de 3 execuções.
+    """
+    import random
+
+    random.seed(65)
+    amostra = []
+    for i in range(total):
+        base = f"{random.randrange(10 ** 7):07d}00{random.randrange(2000, 2026)}403{random.randrange(10 ** 4):04d}"
+        numero20 = base[:7] + calcular_digito(base) + base[9:]
+        if i % 100 == 99:
+            numero20 = numero20[:7] + f"{(int(numero20[7:9]) + 1) % 100:02d}" + numero20[9:]
+        amostra.append(numero20 if i % 4 else registro(numero20).formatado())
+    duracao = float("inf")
+    for _ in range(3):
+        inicio = time.perf_counter()
+        lote = normalizar_lote(amostra)
+        duracao = min(duracao, time.perf_counter() - inicio)
+    print(f"{total} números em {duracao:.3f} s ({total / duracao:,.0f} números/s): "
+          f"{len(lote.validos)} válidos, {len(lote.invalidos)} inválidos")
+    print(relatorio_invalidos(lote.invalidos, max_linhas=3))
+
+
+if __name__ == "__main__":
+    _benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
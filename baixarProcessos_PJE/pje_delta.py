@@ -0,0 +1,164 @@
+# pje_delta.py
+# Modo de ressincronização: em vez de baixar de novo todos os autos, compara uma impressão digital barata de cada
+# processo concluído (documentos listados na página dos autos e tamanho/ETag do PDF) com a da última versão baixada
+# e só devolve à fila os processos cujos autos mudaram.
+import re
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple, Optional
+
+import pje_metricas
+
+# Cada documento juntado aos autos aparece na lista da página listAutosDigitais.seam com o seu id
+_RE_ID_DOCUMENTO = re.compile(r"idProcessoDocumento=(\d+)")
+_TIMEOUT_VERIFICACAO = 30
+
+# Resultado da verificação de um processo
+INALTERADO = "inalterado"
+ALTERADO = "alterado"
+NOVA_BASE = "nova_base"  # ainda não havia impressão: a atual vira a referência
+DESCONHECIDO = "desconhecido"  # sem URL dos autos em cache ou URL vencida: só o fluxo completo resolve
+
+# Destino dos redirecionamentos do PJe quando a sessão não vale mais
+_MARCADORES_LOGIN = ("sso.cloud.pje.jus.br", "login.seam")
+
+
+class SessaoExpirada(Exception):
+    """O PJe mandou a verificação para o login: nenhum resultado da sessão atual é confiável."""
+
+
+class ImpressaoAutos(NamedTuple):
+    documentos: int
+    ultimo_documento: Optional[str]
+    tamanho_pdf: Optional[int]
+    etag: Optional[str]
+
+
+def calcular_impressao(sessao, url_autos, url_pdf=None, timeout=_TIMEOUT_VERIFICACAO):
+    """Lê a página dos autos (HTML, poucos KB) e, se houver URL do PDF, só os cabeçalhos dele (HEAD).
+
+    Retorna ImpressaoAutos ou None se a página não abriu (URL vencida, erro HTTP). Levanta SessaoExpirada se o
+    PJe redirecionar para o login, para a verificação parar em vez de tratar todos os processos como desconhecidos.
+    """
+    import requests
+
+    try:
+        resposta = sessao.get(url_autos, timeout=timeout)
+    except requests.RequestException as e:
+        print(f"      [Delta] Falha ao abrir os autos: {type(e).__name__} - {e}")
+        return None
+    if any(marcador in resposta.url for marcador in _MARCADORES_LOGIN):
+        raise SessaoExpirada(f"Sessão do PJe expirada (redirecionado para {resposta.url}).")
+    if resposta.status_code != 200 or "listAutosDigitais.seam" not in resposta.url:
+        return None
+    ids = {int(i) for i in _RE_ID_DOCUMENTO.findall(resposta.text)}
+    tamanho_pdf = etag = None
+    if url_pdf:
+        try:
+            cabecalhos = sessao.head(url_pdf, allow_redirects=True, timeout=timeout)
+            if cabecalhos.status_code == 200 and "pdf" in cabecalhos.headers.get("Content-Type", "").lower():
+                tamanho = cabecalhos.headers.get("Content-Length")
+                tamanho_pdf = int(tamanho) if tamanho and tamanho.isdigit() else None
+                etag = cabecalhos.headers.get("ETag")
+        except requests.RequestException:
+            pass  # a URL do PDF costuma vencer antes da dos autos; a lista de documentos basta
+    if not ids and tamanho_pdf is None and etag is None:
+        return None
+    return ImpressaoAutos(len(ids), str(max(ids)) if ids else None, tamanho_pdf, etag)
+
+
+def autos_alterados(anterior, atual):
+    """Compara duas impressões; tamanho e ETag do PDF só contam quando as duas os têm."""
+    if (anterior.documentos, anterior.ultimo_documento) != (atual.documentos, atual.ultimo_documento):
+        return True
+    if anterior.etag and atual.etag and anterior.etag != atual.etag:
+        return True
+    return bool(anterior.tamanho_pdf and atual.tamanho_pdf and anterior.tamanho_pdf != atual.tamanho_pdf)
+
+
+def registrar_impressao(ledger, sessao, numero_processo):
+    """Grava a impressão dos autos recém-baixados (usa as URLs que o cache do ledger guardou no download)."""
+    urls = ledger.obter_url_autos(numero_processo)
+    if urls is None:
+        return None
+    impressao = calcular_impressao(sessao, *urls)
+    if impressao is not None:
+        ledger.gravar_impressao(numero_processo, *impressao)
+    return impressao
+
+
+def verificar_processo(ledger, sessao, numero_processo):
+    """Verifica um processo concluído. Retorna INALTERADO, ALTERADO, NOVA_BASE ou DESCONHECIDO.
+
+    A idade da URL dos autos em cache não importa aqui: o próprio GET da página é o teste de validade, e uma
+    URL que abriu tem a validade renovada no ledger.
+    """
+    urls = ledger.obter_url_autos(numero_processo, ignorar_validade=True)
+    if urls is None:
+        return DESCONHECIDO
+    atual = calcular_impressao(sessao, *urls)
+    if atual is None:
+        return DESCONHECIDO
+    ledger.confirmar_url_autos(numero_processo)
+    anterior = ledger.obter_impressao(numero_processo)
+    if anterior is None:
+        ledger.gravar_impressao(numero_processo, *atual)
+        return NOVA_BASE
+    if autos_alterados(ImpressaoAutos(*anterior), atual):
+        # A impressão nova só é gravada depois que os autos atualizados forem baixados
+        return ALTERADO
+    ledger.marcar_impressao_verificada(numero_processo)
+    return INALTERADO
+
+
+def ressincronizar(ledger, sessao, threads=8, reabrir_desconhecidos=False):
+    """Verifica todos os processos concluídos em paralelo e devolve à fila os que mudaram.
+
+    Processos sem impressão anterior ganham a atual como referência (NOVA_BASE). Os que não puderam ser
+    verificados barato (sem URL dos autos em cache ou URL vencida) continuam concluídos, salvo com
+    `reabrir_desconhecidos`, que os devolve ao fluxo completo do Acesso Rápido. Retorna {resultado: quantidade}.
+
+    Levanta SessaoExpirada, sem reabrir nada, se a sessão vencer durante a verificação.
+    """
+    numeros = ledger.listar_concluidos()
+    print(f"[Delta] Verificando {len(numeros)} processos concluídos com {threads} conexões...")
+    sessao_expirada = threading.Event()
+
+    def _verificar(numero):
+        if sessao_expirada.is_set():
+            return numero, None
+        inicio = time.perf_counter()
+        try:
+            resultado = verificar_processo(ledger, sessao, numero)
+        except SessaoExpirada:
+            sessao_expirada.set()
+            return numero, None
+        except Exception as e:
+            print(f"      [Delta] ERRO ao verificar '{numero}': {type(e).__name__} - {e}")
+            resultado = DESCONHECIDO
+        pje_metricas.registrar_span("delta.verificacao", time.perf_counter() - inicio,
+                                    pje_metricas.FALHA if resultado == DESCONHECIDO else pje_metricas.OK,
+                                    processo=numero, worker="delta", resultado_delta=resultado)
+        return numero, resultado
+
+    inicio = time.monotonic()
+    por_resultado = {}
+    with ThreadPoolExecutor(max_workers=max(1, threads), thread_name_prefix="delta-pje") as executor:
+        for numero, resultado in executor.map(_verificar, numeros):
+            por_resultado.setdefault(resultado, []).append(numero)
+    if sessao_expirada.is_set():
+        raise SessaoExpirada("Sessão do PJe expirada durante a verificação; nenhum processo foi reaberto.")
+
+    for numero in por_resultado.get(ALTERADO, []):
+        # O PDF em cache é o da versão antiga dos autos
+        ledger.invalidar_url_autos(numero, somente_pdf=True)
+    reabrir = por_resultado.get(ALTERADO, []) + (por_resultado.get(DESCONHECIDO, []) if reabrir_desconhecidos else [])
+    reabertos = ledger.reabrir_concluidos(reabrir) if reabrir else 0
+    contagem = {resultado: len(lista) for resultado, lista in por_resultado.items()}
+    print(f"[Delta] Verificação em {time.monotonic() - inicio:.1f} s: {contagem}. "
+          f"{reabertos} processos voltaram para a fila.")
+    if por_resultado.get(DESCONHECIDO) and not reabrir_desconhecidos:
+        print(f"[Delta] {len(por_resultado[DESCONHECIDO])} processos sem URL dos autos válida não puderam ser "
+              f"verificados e continuam concluídos (PJE_DELTA_REABRIR_DESCONHECIDOS=1 os baixa de novo).")
+    return contagem
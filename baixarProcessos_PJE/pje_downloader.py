@@ -0,0 +1,319 @@
+# pje_downloader.py
+import os
+import re
+import threading
+from urllib.parse import urljoin, unquote
+
+import pje_sessao
+
+_TAMANHO_BLOCO = 1024 * 1024
+_TIMEOUT_CONEXAO = 15
+_TIMEOUT_LEITURA = 120
+_MAX_TENTATIVAS_RETOMADA = 5
+_BYTES_FINAIS_PDF = 2048
+_RE_CONTENT_RANGE = re.compile(r"bytes\s+(\d+)-(\d+)/(\d+|\*)")
+# Visualizadores em HTML (pdf.js, iframe/embed/object) apontam para o PDF real em um destes atributos
+_RE_URL_PDF_EMBUTIDO = re.compile(
+    r"""<(?:iframe|embed|object)[^>]+(?:src|data)\s*=\s*["']([^"']+)["']|[?&]file=([^"'&\s]+)""",
+    re.IGNORECASE)
+
+
+class DownloaderPJe:
+    """Baixa os autos direto por HTTP, reaproveitando os cookies autenticados da sessão Selenium.
+
+    O navegador só é usado para o login e para descobrir a URL gerada pelo botão "Download";
+    o PDF é gravado em `pasta_destino` por um cliente HTTP com pool de conexões.
+    """
+
+    def __init__(self, pasta_destino, cookies, user_agent=None, tamanho_pool=10, agendador=None):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.pasta_destino = pasta_destino
+        os.makedirs(pasta_destino, exist_ok=True)
+        self.sessao = pje_sessao.criar_sessao_http(cookies, user_agent)
+        adaptador = HTTPAdapter(pool_connections=tamanho_pool, pool_maxsize=tamanho_pool, max_retries=2)
+        self.sessao.mount("https://", adaptador)
+        self.sessao.mount("http://", adaptador)
+        self._requests = requests
+        # AgendadorPJe opcional: limita a taxa por host e recebe os timeouts/5xx como sinal de sobrecarga
+        self.agendador = agendador
+
+    @classmethod
+    def a_partir_do_driver(cls, driver, pasta_destino, tamanho_pool=10, agendador=None):
+        """Cria o downloader com os cookies e o user-agent atuais do navegador."""
+        return cls(pasta_destino, pje_sessao.capturar_cookies_driver(driver),
+                   driver.execute_script("return navigator.userAgent;"), tamanho_pool, agendador)
+
+    def atualizar_cookies(self, cookies):
+        """Atualiza o cookie jar (ex.: cookies emitidos por pje-downloads ao abrir o visualizador)."""
+        for c in cookies:
+            self.sessao.cookies.set(c["name"], c["value"], domain=c.get("domain", ""), path=c.get("path", "/"),
+                                    secure=c.get("secure", False))
+
+    def atualizar_cookies_do_driver(self, driver):
+        self.atualizar_cookies(pje_sessao.capturar_cookies_driver(driver))
+
+    def caminho_pdf(self, numero_processo):
+        return os.path.join(self.pasta_destino, f"{numero_processo}.pdf")
+
+    def baixar_pdf(self, url, numero_processo, referer=None):
+        """Baixa o PDF de `url` para `<pasta_destino>/<numero_processo>.pdf`.
+
+        Se `url` for um visualizador HTML, segue uma vez a URL do PDF embutido. O download é retomado
+        (HTTP Range) após quedas de conexão e só retorna o caminho depois de conferir tamanho e estrutura do PDF.
+        """
+        # Sem gzip/deflate: os bytes gravados precisam bater com o Content-Length e com as faixas do Range
+        headers = {"Accept-Encoding": "identity"}
+        if referer:
+            headers["Referer"] = referer
+        if self.agendador is not None:
+            self.agendador.aguardar_host(url)
+        try:
+            # Com um .part pendente a primeira requisição já pede só o restante (Range + If-Range)
+            headers_abertura = dict(headers, **self._headers_retomada(self.caminho_pdf(numero_processo) + ".part"))
+            url_pdf, resposta_pdf = self._abrir_pdf(url, headers_abertura)
+            if not url_pdf:
+                print(f"      ERRO [HTTP]: nenhum PDF encontrado a partir de '{url}' para '{numero_processo}'.")
+                return None
+            if resposta_pdf is None and url_pdf != url:
+                headers["Referer"] = url
+            return self._baixar_com_retomada(url_pdf, numero_processo, headers, resposta_pdf)
+        except self._requests.RequestException as e:
+            print(f"      ERRO [HTTP] ao baixar PDF de '{numero_processo}': {type(e).__name__} - {e}")
+            self._sinalizar_agendador(url, e)
+            return None
+
+    def _sinalizar_agendador(self, url, erro):
+        if self.agendador is None:
+            return
+        resposta = getattr(erro, "response", None)
+        if resposta is not None:
+            self.agendador.registrar_resposta_http(resposta.url or url, resposta.status_code,
+                                                   resposta.headers.get("Retry-After"))
+        elif isinstance(erro, self._requests.Timeout):
+            self.agendador.registrar_resposta_http(url, timeout=True)
+
+    def _abrir_pdf(self, url, headers):
+        """Descobre a URL que entrega o PDF em si. Retorna (url_pdf, resposta) ou (None, None).
+
+        Se a própria `url` já é o PDF, a resposta volta aberta para ser gravada sem uma segunda requisição;
+        se for um visualizador HTML, retorna a URL do PDF embutido e resposta None.
+        """
+        resposta = self.sessao.get(url, headers=headers, stream=True, timeout=(_TIMEOUT_CONEXAO, _TIMEOUT_LEITURA))
+        if resposta.status_code == 416 and "Range" in headers:
+            # É o PDF e o .part já tem todos os bytes: a retomada confirma e conclui
+            resposta.close()
+            return resposta.url, None
+        try:
+            resposta.raise_for_status()
+            if _eh_pdf(resposta):
+                return resposta.url, resposta
+            url_embutida = self._url_pdf_embutido(resposta.text, resposta.url)
+        except BaseException:
+            resposta.close()
+            raise
+        resposta.close()
+        return url_embutida, None
+
+    @staticmethod
+    def _url_pdf_embutido(html, url_base):
+        match = _RE_URL_PDF_EMBUTIDO.search(html)
+        if not match:
+            return None
+        return urljoin(url_base, match.group(1) or unquote(match.group(2)))
+
+    @staticmethod
+    def _headers_retomada(caminho_tmp):
+        """Range + If-Range para continuar o `.part`: se o documento mudou, o servidor devolve o arquivo inteiro.
+
+        Um parcial sem validador (ETag/Last-Modified) salvo não pode ser conferido e é descartado.
+        """
+        ja_gravado = os.path.getsize(caminho_tmp) if os.path.exists(caminho_tmp) else 0
+        if not ja_gravado:
+            return {}
+        validador = _ler_validador(caminho_tmp)
+        if not validador:
+            _remover_parcial(caminho_tmp)
+            return {}
+        return {"Range": f"bytes={ja_gravado}-", "If-Range": validador}
+
+    def _baixar_com_retomada(self, url_pdf, numero_processo, headers, resposta_inicial=None):
+        """Grava em `.part` por blocos, retomando com Range após falhas, e renomeia atomicamente ao final.
+
+        `resposta_inicial` (já aberta por `_abrir_pdf`, com o Range do parcial existente, se havia) é aproveitada
+        na primeira tentativa. O ETag/Last-Modified da resposta completa fica ao lado do `.part` e vai no
+        If-Range das retomadas, para nunca emendar bytes de versões diferentes do documento.
+        """
+        destino = self.caminho_pdf(numero_processo)
+        caminho_tmp = destino + ".part"
+        tamanho_esperado = None
+        for tentativa in range(1, _MAX_TENTATIVAS_RETOMADA + 1):
+            headers_req = dict(headers, **self._headers_retomada(caminho_tmp))
+            ja_gravado = os.path.getsize(caminho_tmp) if os.path.exists(caminho_tmp) else 0
+            try:
+                if resposta_inicial is not None:
+                    resposta = resposta_inicial
+                else:
+                    resposta = self.sessao.get(url_pdf, headers=headers_req, stream=True,
+                                               timeout=(_TIMEOUT_CONEXAO, _TIMEOUT_LEITURA))
+                resposta_inicial = None
+                with resposta:
+                    if resposta.status_code == 416 and ja_gravado:
+                        # O servidor diz que não há mais bytes depois de `ja_gravado`: o .part já está completo
+                        tamanho_esperado = _total_content_range(resposta) or ja_gravado
+                        break
+                    resposta.raise_for_status()
+                    if resposta.status_code == 206 and (not ja_gravado
+                                                        or _inicio_content_range(resposta) != ja_gravado):
+                        # Faixa diferente da pedida: descarta o parcial e recomeça sem Range
+                        _remover_parcial(caminho_tmp)
+                        continue
+                    if resposta.status_code == 206:
+                        modo = "ab"
+                        tamanho_esperado = _total_content_range(resposta)
+                        print(f"      Retomando download de '{numero_processo}' a partir de "
+                              f"{ja_gravado / 1024 / 1024:.1f} MB...")
+                    else:
+                        # Servidor ignorou o Range, o documento mudou (If-Range) ou não havia .part: recomeça do zero
+                        modo = "wb"
+                        tamanho_esperado = _int_ou_none(resposta.headers.get("Content-Length"))
+                        _gravar_validador(caminho_tmp, resposta)
+                    with open(caminho_tmp, modo) as f:
+                        for bloco in _iterar_blocos_limitados(resposta):
+                            f.write(bloco)
+                break
+            except (self._requests.ConnectionError, self._requests.Timeout,
+                    self._requests.exceptions.ChunkedEncodingError) as e:
+                print(f"      AVISO [HTTP]: conexão interrompida ({type(e).__name__}) na tentativa "
+                      f"{tentativa}/{_MAX_TENTATIVAS_RETOMADA} para '{numero_processo}'.")
+                self._sinalizar_agendador(url_pdf, e)
+        else:
+            print(f"      ERRO [HTTP]: download de '{numero_processo}' não concluído; parcial mantido em {caminho_tmp}.")
+            return None
+
+        problema = verificar_pdf(caminho_tmp, tamanho_esperado)
+        if problema:
+            print(f"      ERRO [HTTP]: PDF de '{numero_processo}' reprovado na verificação: {problema}.")
+            _remover_parcial(caminho_tmp)
+            return None
+        os.replace(caminho_tmp, destino)
+        _remover_parcial(caminho_tmp)
+        print(f"      PDF salvo via HTTP: {destino} ({os.path.getsize(destino) / 1024 / 1024:.1f} MB)")
+        return destino
+
+
+class LimiteBytesEmVoo:
+    """Teto global de bytes lidos da rede e ainda não gravados em disco, compartilhado por todos os downloads."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.em_voo = 0
+        self._cond = threading.Condition()
+
+    def reservar(self, n):
+        with self._cond:
+            while self.em_voo and self.em_voo + n > self.max_bytes:
+                self._cond.wait()
+            self.em_voo += n
+
+    def liberar(self, n):
+        with self._cond:
+            self.em_voo -= n
+            self._cond.notify_all()
+
+
+LIMITE_BYTES_EM_VOO = LimiteBytesEmVoo(int(os.getenv("PJE_MAX_BYTES_EM_VOO", str(64 * 1024 * 1024))))
+
+
+def _iterar_blocos_limitados(resposta):
+    """Lê a resposta em blocos de tamanho fixo respeitando LIMITE_BYTES_EM_VOO (memória constante por download)."""
+    iterador = resposta.iter_content(chunk_size=_TAMANHO_BLOCO)
+    while True:
+        LIMITE_BYTES_EM_VOO.reservar(_TAMANHO_BLOCO)
+        try:
+            bloco = next(iterador, None)
+            if bloco is None:
+                return
+            yield bloco
+        finally:
+            LIMITE_BYTES_EM_VOO.liberar(_TAMANHO_BLOCO)
+
+
+def _caminho_validador(caminho_tmp):
+    return caminho_tmp + ".validador"
+
+
+def _gravar_validador(caminho_tmp, resposta):
+    """Guarda o ETag forte (ou, na falta dele, o Last-Modified) da resposta que originou o `.part`."""
+    etag = resposta.headers.get("ETag")
+    validador = etag if etag and not etag.startswith("W/") else resposta.headers.get("Last-Modified")
+    if validador:
+        with open(_caminho_validador(caminho_tmp), "w", encoding="utf-8") as f:
+            f.write(validador)
+    elif os.path.exists(_caminho_validador(caminho_tmp)):
+        os.remove(_caminho_validador(caminho_tmp))
+
+
+def _ler_validador(caminho_tmp):
+    try:
+        with open(_caminho_validador(caminho_tmp), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def _remover_parcial(caminho_tmp):
+    """Remove o `.part` e o validador (os que existirem)."""
+    for caminho in (caminho_tmp, _caminho_validador(caminho_tmp)):
+        if os.path.exists(caminho):
+            os.remove(caminho)
+
+
+def _eh_pdf(resposta):
+    content_type = resposta.headers.get("Content-Type", "").lower()
+    return "pdf" in content_type or "octet-stream" in content_type
+
+
+def _int_ou_none(valor):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def _inicio_content_range(resposta):
+    match = _RE_CONTENT_RANGE.match(resposta.headers.get("Content-Range", ""))
+    return int(match.group(1)) if match else None
+
+
+def _total_content_range(resposta):
+    match = _RE_CONTENT_RANGE.match(resposta.headers.get("Content-Range", ""))
+    return _int_ou_none(match.group(3)) if match else None
+
+
+def verificar_pdf(caminho, tamanho_esperado=None):
+    """Confere tamanho e estrutura mínima de um PDF. Retorna None se estiver OK ou a descrição do problema."""
+    tamanho = os.path.getsize(caminho)
+    if tamanho == 0:
+        return "arquivo vazio"
+    if tamanho_esperado is not None and tamanho != tamanho_esperado:
+        return f"tamanho {tamanho} difere do anunciado pelo servidor ({tamanho_esperado})"
+    with open(caminho, "rb") as f:
+        if not f.read(1024).lstrip().startswith(b"%PDF-"):
+            return "cabeçalho %PDF- ausente"
+        f.seek(max(0, tamanho - _BYTES_FINAIS_PDF))
+        final = f.read()
+    if b"%%EOF" not in final:
+        return "marcador %%EOF ausente (arquivo truncado)"
+    if b"startxref" not in final:
+        return "tabela startxref ausente"
+    return None
+
+
+def listar_downloads_incompletos(pasta):
+    """Lista downloads interrompidos na pasta (.crdownload do Chrome e .part deste módulo)."""
+    if not os.path.isdir(pasta):
+        return []
+    return sorted(os.path.join(pasta, nome) for nome in os.listdir(pasta)
+                  if nome.endswith((".crdownload", ".part")))
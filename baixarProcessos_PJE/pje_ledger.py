@@ -0,0 +1,416 @@
+# pje_ledger.py
+import os
+import time
+import random
+import sqlite3
+import threading
+import contextlib
+
+# Estados de um processo no ledger
+PENDENTE = "pendente"
+RESERVADO = "reservado"
+CONCLUIDO = "concluido"
+FALHOU = "falhou"
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS processos (
+    numero TEXT PRIMARY KEY,
+    ordem INTEGER NOT NULL,
+    estado TEXT NOT NULL DEFAULT 'pendente',
+    tentativas INTEGER NOT NULL DEFAULT 0,
+    disponivel_em REAL NOT NULL DEFAULT 0,
+    lease_ate REAL,
+    worker TEXT,
+    ultimo_erro TEXT,
+    atualizado_em REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_processos_fila ON processos(estado, ordem);
+CREATE INDEX IF NOT EXISTS idx_processos_lease ON processos(estado, lease_ate);
+CREATE TABLE IF NOT EXISTS duracoes (
+    numero TEXT NOT NULL,
+    tentativa INTEGER NOT NULL,
+    passo TEXT NOT NULL,
+    segundos REAL NOT NULL,
+    registrado_em REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_duracoes_numero ON duracoes(numero);
+CREATE TABLE IF NOT EXISTS importacoes (
+    caminho TEXT PRIMARY KEY,
+    tamanho INTEGER NOT NULL,
+    mtime REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS urls_autos (
+    numero TEXT PRIMARY KEY,
+    url_autos TEXT NOT NULL,
+    url_pdf TEXT,
+    resolvido_em REAL NOT NULL,
+    usado_em REAL
+);
+CREATE TABLE IF NOT EXISTS impressoes (
+    numero TEXT PRIMARY KEY,
+    documentos INTEGER NOT NULL,
+    ultimo_documento TEXT,
+    tamanho_pdf INTEGER,
+    etag TEXT,
+    registrado_em REAL NOT NULL,
+    verificado_em REAL NOT NULL
+);
+"""
+
+
+class LedgerPJe:
+    """Fila durável de processos em SQLite, compartilhada com segurança por vários workers (threads ou processos).
+
+    Cada processo passa por pendente -> reservado -> concluido/falhou. A reserva tem um lease, renovado pelo
+    worker enquanto trabalha (manter_reserva): se o worker morrer, o processo volta a ficar disponível quando o
+    lease expira. Falhas são reagendadas com backoff exponencial até `max_tentativas`.
+    """
+
+    def __init__(self, caminho_db, max_tentativas=5, backoff_base=30.0, backoff_max=3600.0, lease_segundos=900.0,
+                 validade_urls_autos=30 * 86400.0, jitter_backoff=0.5):
+        self.caminho_db = caminho_db
+        self.max_tentativas = max_tentativas
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.lease_segundos = lease_segundos
+        self.validade_urls_autos = validade_urls_autos
+        self.jitter_backoff = jitter_backoff
+        self._local = threading.local()
+        self._conexao().executescript(_ESQUEMA)
+
+    def _conexao(self):
+        """Uma conexão por thread (conexões sqlite3 não devem ser compartilhadas entre threads)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.caminho_db, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _transacao(self, funcao):
+        """Executa `funcao(conn)` dentro de BEGIN IMMEDIATE ... COMMIT (escrita serializada entre workers)."""
+        conn = self._conexao()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            resultado = funcao(conn)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return resultado
+
+    def fechar(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # --- Carga ---
+
+    def adicionar_processos(self, numeros):
+        """Enfileira processos novos como pendentes, na ordem recebida. Processos já existentes são mantidos."""
+        numeros = list(numeros)
+        agora = time.time()
+
+        def _inserir(conn):
+            proxima_ordem = conn.execute("SELECT COALESCE(MAX(ordem), -1) + 1 FROM processos").fetchone()[0]
+            antes = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO processos (numero, ordem, atualizado_em) VALUES (?, ?, ?)",
+                ((numero, proxima_ordem + i, agora) for i, numero in enumerate(numeros)))
+            return conn.total_changes - antes
+
+        return self._transacao(_inserir)
+
+    def renomear_processos(self, pares):
+        """Troca a chave de processos já enfileirados (ex.: número cru da planilha -> forma CNJ normalizada).
+
+        `pares` são tuplas (numero_antigo, numero_novo). Se o número novo já existir, a linha antiga é descartada.
+        """
+        pares = [(antigo, novo) for antigo, novo in pares if antigo != novo]
+        if not pares:
+            return 0
+
+        def _renomear(conn):
+            antes = conn.total_changes
+            for tabela in ("processos", "urls_autos", "impressoes"):
+                conn.executemany(f"UPDATE OR IGNORE {tabela} SET numero = ? WHERE numero = ?",
+                                 ((novo, antigo) for antigo, novo in pares))
+                conn.executemany(f"DELETE FROM {tabela} WHERE numero = ?", ((antigo,) for antigo, _ in pares))
+            conn.executemany("UPDATE duracoes SET numero = ? WHERE numero = ?",
+                             ((novo, antigo) for antigo, novo in pares))
+            return conn.total_changes - antes
+
+        return self._transacao(_renomear)
+
+    def importar_log_txt(self, caminho_log, normalizar=None):
+        """Importa o log legado (um número por linha) como concluídos. Reimporta só se o arquivo mudou.
+
+        `normalizar`, se informado, recebe a lista de números lidos e devolve as chaves usadas no ledger.
+        """
+        if not os.path.exists(caminho_log):
+            return 0
+        stat = os.stat(caminho_log)
+        with open(caminho_log, "r") as f:
+            numeros = [linha.strip() for linha in f if linha.strip()]
+        if normalizar:
+            numeros = normalizar(numeros)
+        agora = time.time()
+
+        def _importar(conn):
+            ja_importado = conn.execute("SELECT 1 FROM importacoes WHERE caminho = ? AND tamanho = ? AND mtime = ?",
+                                        (caminho_log, stat.st_size, stat.st_mtime)).fetchone()
+            if ja_importado:
+                return 0
+            proxima_ordem = conn.execute("SELECT COALESCE(MAX(ordem), -1) + 1 FROM processos").fetchone()[0]
+            antes = conn.total_changes
+            conn.executemany(
+                "INSERT INTO processos (numero, ordem, estado, atualizado_em) VALUES (?, ?, 'concluido', ?) "
+                "ON CONFLICT(numero) DO UPDATE SET estado = 'concluido', lease_ate = NULL "
+                "WHERE estado != 'concluido'",
+                ((numero, proxima_ordem + i, agora) for i, numero in enumerate(numeros)))
+            conn.execute("INSERT OR REPLACE INTO importacoes (caminho, tamanho, mtime) VALUES (?, ?, ?)",
+                         (caminho_log, stat.st_size, stat.st_mtime))
+            return conn.total_changes - antes - 1
+
+        return self._transacao(_importar)
+
+    def reabrir_falhos(self):
+        """Devolve à fila os processos que esgotaram as tentativas, zerando o contador."""
+        agora = time.time()
+        cursor = self._conexao().execute(
+            "UPDATE processos SET estado = 'pendente', tentativas = 0, disponivel_em = 0, atualizado_em = ? "
+            "WHERE estado = 'falhou'", (agora,))
+        return cursor.rowcount
+
+    # --- Ciclo de vida de um processo ---
+
+    def reservar(self, worker):
+        """Reserva o próximo processo disponível para `worker`. Retorna (numero, tentativa) ou None.
+
+        Reservas com lease expirado (worker que morreu) têm prioridade sobre os pendentes.
+        """
+        agora = time.time()
+
+        def _reservar(conn):
+            linha = conn.execute(
+                "SELECT numero FROM processos WHERE estado = 'reservado' AND lease_ate < ? LIMIT 1",
+                (agora,)).fetchone()
+            if linha is None:
+                linha = conn.execute(
+                    "SELECT numero FROM processos WHERE estado = 'pendente' AND disponivel_em <= ? "
+                    "ORDER BY ordem LIMIT 1", (agora,)).fetchone()
+            if linha is None:
+                return None
+            conn.execute(
+                "UPDATE processos SET estado = 'reservado', tentativas = tentativas + 1, lease_ate = ?, worker = ?, "
+                "atualizado_em = ? WHERE numero = ?",
+                (agora + self.lease_segundos, worker, agora, linha[0]))
+            tentativa = conn.execute("SELECT tentativas FROM processos WHERE numero = ?", (linha[0],)).fetchone()[0]
+            return linha[0], tentativa
+
+        return self._transacao(_reservar)
+
+    def renovar_lease(self, numero, worker):
+        """Estende o lease de um processo ainda reservado por `worker`. Retorna False se a reserva foi perdida."""
+        agora = time.time()
+        cursor = self._conexao().execute(
+            "UPDATE processos SET lease_ate = ?, atualizado_em = ? WHERE numero = ? AND estado = 'reservado' "
+            "AND worker = ?", (agora + self.lease_segundos, agora, numero, worker))
+        return cursor.rowcount == 1
+
+    def iniciar_heartbeat(self, numero, worker, intervalo=None):
+        """Renova o lease de `numero` em uma thread própria até a função retornada ser chamada.
+
+        Um processo lento (esperas longas do PJe, PDF grande com retentativas) não perde a reserva para outro
+        worker enquanto este ainda trabalha nele. A função de parada espera a thread terminar.
+        """
+        parar = threading.Event()
+        intervalo = intervalo or self.lease_segundos / 3
+
+        def _renovar():
+            try:
+                while not parar.wait(intervalo) and self.renovar_lease(numero, worker):
+                    pass
+            finally:
+                self.fechar()
+
+        thread = threading.Thread(target=_renovar, name=f"lease-{worker}", daemon=True)
+        thread.start()
+
+        def _parar():
+            parar.set()
+            thread.join()
+
+        return _parar
+
+    @contextlib.contextmanager
+    def manter_reserva(self, numero, worker, intervalo=None):
+        """Heartbeat do lease de `numero` enquanto o bloco `with` executa (ver iniciar_heartbeat)."""
+        parar = self.iniciar_heartbeat(numero, worker, intervalo)
+        try:
+            yield
+        finally:
+            parar()
+
+    def concluir(self, numero, worker, duracoes=None):
+        """Marca o processo como concluído e grava as durações por passo ({passo: segundos}).
+
+        Retorna False (sem alterar nada) se o processo não está mais reservado por `worker` (lease perdido).
+        """
+        agora = time.time()
+
+        def _concluir(conn):
+            cursor = conn.execute(
+                "UPDATE processos SET estado = 'concluido', lease_ate = NULL, ultimo_erro = NULL, "
+                "atualizado_em = ? WHERE numero = ? AND estado = 'reservado' AND worker = ?", (agora, numero, worker))
+            if cursor.rowcount != 1:
+                return False
+            self._gravar_duracoes(conn, numero, duracoes, agora)
+            return True
+
+        return self._transacao(_concluir)
+
+    def falhar(self, numero, worker, erro, duracoes=None):
+        """Registra a falha: reagenda com backoff exponencial ou marca como falhou após `max_tentativas`.
+
+        Retorna o novo estado do processo, ou None se ele não está mais reservado por `worker` (lease perdido).
+        """
+        agora = time.time()
+
+        def _falhar(conn):
+            linha = conn.execute("SELECT tentativas FROM processos WHERE numero = ? AND estado = 'reservado' "
+                                 "AND worker = ?", (numero, worker)).fetchone()
+            if linha is None:
+                return None
+            tentativas = linha[0]
+            if tentativas >= self.max_tentativas:
+                estado, disponivel_em = FALHOU, agora
+            else:
+                estado = PENDENTE
+                # Jitter: processos que falharam juntos (ex.: PJe fora do ar) não voltam todos no mesmo instante
+                atraso = min(self.backoff_max, self.backoff_base * 2 ** (tentativas - 1))
+                disponivel_em = agora + atraso * (1.0 - self.jitter_backoff * random.random())
+            conn.execute(
+                "UPDATE processos SET estado = ?, disponivel_em = ?, lease_ate = NULL, ultimo_erro = ?, "
+                "atualizado_em = ? WHERE numero = ?", (estado, disponivel_em, str(erro)[:500], agora, numero))
+            self._gravar_duracoes(conn, numero, duracoes, agora)
+            return estado
+
+        return self._transacao(_falhar)
+
+    @staticmethod
+    def _gravar_duracoes(conn, numero, duracoes, agora):
+        if not duracoes:
+            return
+        conn.executemany(
+            "INSERT INTO duracoes (numero, tentativa, passo, segundos, registrado_em) "
+            "SELECT ?, tentativas, ?, ?, ? FROM processos WHERE numero = ?",
+            ((numero, passo, segundos, agora, numero) for passo, segundos in duracoes.items()))
+
+    # --- Cache número CNJ -> URL dos autos ---
+
+    def obter_url_autos(self, numero, ignorar_validade=False):
+        """(url_autos, url_pdf) resolvidos antes para o processo, ou None se não há entrada válida.
+
+        Entradas mais antigas que `validade_urls_autos` são tratadas como vencidas, salvo com `ignorar_validade`
+        (quem vai abrir a URL de qualquer forma e confirmar com `confirmar_url_autos` se ela ainda funciona).
+        """
+        agora = time.time()
+        conn = self._conexao()
+        desde = float("-inf") if ignorar_validade else agora - self.validade_urls_autos
+        linha = conn.execute("SELECT url_autos, url_pdf FROM urls_autos WHERE numero = ? AND resolvido_em >= ?",
+                             (numero, desde)).fetchone()
+        if linha is None:
+            return None
+        conn.execute("UPDATE urls_autos SET usado_em = ? WHERE numero = ?", (agora, numero))
+        return linha[0], linha[1]
+
+    def gravar_url_autos(self, numero, url_autos, url_pdf=None):
+        """Guarda a URL dos autos (e a do PDF, se conhecida). Sem `url_pdf`, mantém a já salva para os mesmos autos."""
+        self._conexao().execute(
+            "INSERT INTO urls_autos (numero, url_autos, url_pdf, resolvido_em) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(numero) DO UPDATE SET url_autos = excluded.url_autos, "
+            "url_pdf = COALESCE(excluded.url_pdf, CASE WHEN url_autos = excluded.url_autos THEN url_pdf END), "
+            "resolvido_em = excluded.resolvido_em", (numero, url_autos, url_pdf, time.time()))
+
+    def confirmar_url_autos(self, numero):
+        """Renova a validade da entrada: a URL dos autos acabou de abrir com sucesso."""
+        self._conexao().execute("UPDATE urls_autos SET resolvido_em = ? WHERE numero = ?", (time.time(), numero))
+
+    def invalidar_url_autos(self, numero, somente_pdf=False):
+        """Descarta a entrada que não funcionou mais (ou só a URL do PDF, com `somente_pdf`)."""
+        if somente_pdf:
+            self._conexao().execute("UPDATE urls_autos SET url_pdf = NULL WHERE numero = ?", (numero,))
+        else:
+            self._conexao().execute("DELETE FROM urls_autos WHERE numero = ?", (numero,))
+
+    # --- Impressão digital dos autos (modo de ressincronização) ---
+
+    def obter_impressao(self, numero):
+        """(documentos, ultimo_documento, tamanho_pdf, etag) dos autos na última versão baixada, ou None."""
+        return self._conexao().execute(
+            "SELECT documentos, ultimo_documento, tamanho_pdf, etag FROM impressoes WHERE numero = ?",
+            (numero,)).fetchone()
+
+    def gravar_impressao(self, numero, documentos, ultimo_documento=None, tamanho_pdf=None, etag=None):
+        agora = time.time()
+        self._conexao().execute(
+            "INSERT OR REPLACE INTO impressoes (numero, documentos, ultimo_documento, tamanho_pdf, etag, registrado_em,"
+            " verificado_em) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (numero, documentos, ultimo_documento, tamanho_pdf, etag, agora, agora))
+
+    def marcar_impressao_verificada(self, numero):
+        self._conexao().execute("UPDATE impressoes SET verificado_em = ? WHERE numero = ?", (time.time(), numero))
+
+    def listar_concluidos(self):
+        return [linha[0] for linha in self._conexao().execute(
+            "SELECT numero FROM processos WHERE estado = 'concluido' ORDER BY ordem")]
+
+    def reabrir_concluidos(self, numeros):
+        """Devolve à fila processos já concluídos (autos alterados), zerando o contador de tentativas."""
+        agora = time.time()
+
+        def _reabrir(conn):
+            antes = conn.total_changes
+            conn.executemany(
+                "UPDATE processos SET estado = 'pendente', tentativas = 0, disponivel_em = 0, atualizado_em = ? "
+                "WHERE numero = ? AND estado = 'concluido'", ((agora, numero) for numero in numeros))
+            return conn.total_changes - antes
+
+        return self._transacao(_reabrir)
+
+    # --- Consultas ---
+
+    def estado(self, numero):
+        linha = self._conexao().execute("SELECT estado FROM processos WHERE numero = ?", (numero,)).fetchone()
+        return linha[0] if linha else None
+
+    def contar_por_estado(self):
+        linhas = self._conexao().execute("SELECT estado, COUNT(*) FROM processos GROUP BY estado").fetchall()
+        return {estado: total for estado, total in linhas}
+
+    def duracoes_por_passo(self, desde=0.0):
+        """Durações registradas a partir de `desde` (epoch), agrupadas por passo: {passo: [segundos, ...]}."""
+        linhas = self._conexao().execute(
+            "SELECT passo, segundos FROM duracoes WHERE registrado_em >= ? ORDER BY registrado_em", (desde,))
+        resultado = {}
+        for passo, segundos in linhas:
+            resultado.setdefault(passo, []).append(segundos)
+        return resultado
+
+    def contar_tentativas_desde(self, desde):
+        """Processos tentados (concluídos ou com falha) a partir de `desde` (epoch); base da cota diária."""
+        return self._conexao().execute("SELECT COUNT(*) FROM duracoes WHERE passo = 'total' AND registrado_em >= ?",
+                                       (desde,)).fetchone()[0]
+
+    def segundos_ate_proximo_disponivel(self):
+        """Tempo até algum processo pendente/reservado ficar disponível; None se não resta trabalho."""
+        agora = time.time()
+        linha = self._conexao().execute(
+            "SELECT MIN(CASE WHEN estado = 'pendente' THEN disponivel_em ELSE lease_ate END) FROM processos "
+            "WHERE estado IN ('pendente', 'reservado')").fetchone()
+        if linha[0] is None:
+            return None
+        return max(0.0, linha[0] - agora)
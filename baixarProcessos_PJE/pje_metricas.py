@@ -0,0 +1,253 @@
+# pje_metricas.py
+import os
+import json
+import math
+import time
+import argparse
+import threading
+from contextlib import contextmanager
+
+# Resultado de um span
+OK = "ok"
+ERRO = "erro"  # exceção ou timeout dentro do passo
+FALHA = "falha"  # o passo terminou sem exceção, mas sem o resultado esperado
+
+# Limites (em segundos) dos buckets do histograma Prometheus
+_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+_INTERVALO_PROMETHEUS = 10.0
+
+_contexto = threading.local()
+_exportador = None
+_ouvintes = []
+
+
+def definir_contexto(processo=None, worker=None):
+    """Define o processo e o worker da thread atual; todos os spans seguintes recebem essas tags."""
+    _contexto.processo = processo
+    _contexto.worker = worker
+
+
+def _tags_contexto():
+    return {"processo": getattr(_contexto, "processo", None), "worker": getattr(_contexto, "worker", None)}
+
+
+class ExportadorMetricasPJe:
+    """Grava cada span como uma linha JSON e mantém um histograma por passo/resultado em formato Prometheus.
+
+    O arquivo JSONL é acumulado entre execuções (cada uma com seu `execucao`); o .prom é reescrito de forma
+    atômica a cada `intervalo_prometheus` segundos e no encerramento, para o node_exporter (textfile collector).
+    """
+
+    def __init__(self, caminho_jsonl, caminho_prometheus=None, intervalo_prometheus=_INTERVALO_PROMETHEUS):
+        self.caminho_jsonl = caminho_jsonl
+        self.caminho_prometheus = caminho_prometheus
+        self.intervalo_prometheus = intervalo_prometheus
+        self.execucao = f"{time.strftime('%Y%m%d%H%M%S')}-{os.getpid()}"
+        self._lock = threading.Lock()
+        self._arquivo = open(caminho_jsonl, "a", encoding="utf-8", buffering=1)
+        self._histogramas = {}
+        self._ultima_escrita_prometheus = time.monotonic()
+
+    def registrar(self, passo, segundos, resultado=OK, **tags):
+        linha = {"ts": round(time.time(), 3), "execucao": self.execucao, "passo": passo,
+                 "segundos": round(segundos, 4), "resultado": resultado}
+        linha.update(_tags_contexto())
+        linha.update(tags)
+        with self._lock:
+            self._arquivo.write(json.dumps(linha, ensure_ascii=False) + "\n")
+            histograma = self._histogramas.setdefault((passo, resultado), [[0] * len(_BUCKETS), 0.0, 0])
+            for i, limite in enumerate(_BUCKETS):
+                if segundos <= limite:
+                    histograma[0][i] += 1
+            histograma[1] += segundos
+            histograma[2] += 1
+            escrever = (self.caminho_prometheus
+                        and time.monotonic() - self._ultima_escrita_prometheus >= self.intervalo_prometheus)
+        if escrever:
+            self.escrever_prometheus()
+
+    def escrever_prometheus(self):
+        if not self.caminho_prometheus:
+            return
+        with self._lock:
+            linhas = ["# HELP pje_passo_segundos Duracao de cada passo do fluxo PJe.",
+                      "# TYPE pje_passo_segundos histogram"]
+            for (passo, resultado), (buckets, soma, contagem) in sorted(self._histogramas.items()):
+                rotulos = f'passo="{passo}",resultado="{resultado}"'
+                for limite, acumulado in zip(_BUCKETS, buckets):
+                    linhas.append(f'pje_passo_segundos_bucket{{{rotulos},le="{limite}"}} {acumulado}')
+                linhas.append(f'pje_passo_segundos_bucket{{{rotulos},le="+Inf"}} {contagem}')
+                linhas.append(f"pje_passo_segundos_sum{{{rotulos}}} {soma:.4f}")
+                linhas.append(f"pje_passo_segundos_count{{{rotulos}}} {contagem}")
+            self._ultima_escrita_prometheus = time.monotonic()
+        temporario = f"{self.caminho_prometheus}.tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            f.write("\n".join(linhas) + "\n")
+        os.replace(temporario, self.caminho_prometheus)
+
+    def fechar(self):
+        self.escrever_prometheus()
+        with self._lock:
+            self._arquivo.close()
+
+
+def configurar_metricas(caminho_jsonl, caminho_prometheus=None):
+    """Ativa a exportação de spans para o processo todo. Sem esta chamada os spans são apenas descartados."""
+    global _exportador
+    encerrar_metricas()
+    _exportador = ExportadorMetricasPJe(caminho_jsonl, caminho_prometheus)
+    return _exportador
+
+
+def encerrar_metricas():
+    global _exportador
+    if _exportador is not None:
+        _exportador.fechar()
+        _exportador = None
+
+
+def adicionar_ouvinte(funcao):
+    """Registra `funcao(passo, segundos, resultado, tags)`, chamada a cada span mesmo sem exportador configurado."""
+    _ouvintes.append(funcao)
+
+
+def remover_ouvinte(funcao):
+    if funcao in _ouvintes:
+        _ouvintes.remove(funcao)
+
+
+def registrar_span(passo, segundos, resultado=OK, **tags):
+    if _exportador is not None:
+        _exportador.registrar(passo, segundos, resultado, **tags)
+    for ouvinte in list(_ouvintes):
+        ouvinte(passo, segundos, resultado, tags)
+
+
+class Span:
+    """Span em andamento; `resultado` pode ser trocado para FALHA antes do fim do bloco."""
+
+    def __init__(self, passo, tags):
+        self.passo = passo
+        self.tags = tags
+        self.resultado = OK
+
+
+@contextmanager
+def span(passo, **tags):
+    """Mede o bloco `with` como um passo. Uma exceção marca o span como ERRO e é propagada."""
+    atual = Span(passo, tags)
+    inicio = time.perf_counter()
+    try:
+        yield atual
+    except BaseException as e:
+        atual.resultado = ERRO
+        atual.tags["erro"] = type(e).__name__
+        raise
+    finally:
+        registrar_span(passo, time.perf_counter() - inicio, atual.resultado, **atual.tags)
+
+
+class SequenciaPassos:
+    """Cronometra passos consecutivos de um fluxo linear: cada `passo()` encerra o anterior como OK.
+
+    Pensado para funções longas com try/except em volta de tudo (login, Acesso Rápido): no except basta
+    chamar `encerrar(ERRO, e)` para atribuir a falha ao passo que estava em andamento. `tags` fixas (ex.:
+    processo e worker) substituem as do contexto da thread, para fluxos assíncronos que dividem uma thread.
+    """
+
+    def __init__(self, prefixo, **tags):
+        self.prefixo = prefixo
+        self.tags = tags
+        self._atual = None
+        self._inicio = 0.0
+
+    def passo(self, nome):
+        self.encerrar(OK)
+        self._atual = nome
+        self._inicio = time.perf_counter()
+
+    def encerrar(self, resultado=OK, erro=None):
+        if self._atual is None:
+            return
+        tags = dict(self.tags, erro=type(erro).__name__) if erro is not None else self.tags
+        registrar_span(f"{self.prefixo}.{self._atual}", time.perf_counter() - self._inicio, resultado, **tags)
+        self._atual = None
+
+
+# --- Resumo ---
+
+def percentil(valores, p):
+    """Percentil pelo método nearest-rank."""
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    indice = max(0, min(len(ordenados) - 1, math.ceil(p * len(ordenados) / 100) - 1))
+    return ordenados[indice]
+
+
+def ler_spans(caminhos, desde=None):
+    """Lê os spans de um ou mais arquivos JSONL (linhas corrompidas são ignoradas)."""
+    spans = []
+    for caminho in caminhos:
+        with open(caminho, "r", encoding="utf-8") as f:
+            for linha in f:
+                try:
+                    registro = json.loads(linha)
+                except ValueError:
+                    continue
+                if desde is None or registro.get("ts", 0) >= desde:
+                    spans.append(registro)
+    return spans
+
+
+def resumir_spans(spans):
+    """{passo: {n, erros, p50, p90, p95, p99, max}} com as durações em segundos."""
+    por_passo = {}
+    for registro in spans:
+        por_passo.setdefault(registro["passo"], []).append(registro)
+    resumo = {}
+    for passo, registros in sorted(por_passo.items()):
+        duracoes = [r["segundos"] for r in registros]
+        resumo[passo] = {
+            "n": len(registros),
+            "erros": sum(1 for r in registros if r.get("resultado") != OK),
+            "p50": percentil(duracoes, 50), "p90": percentil(duracoes, 90), "p95": percentil(duracoes, 95),
+            "p99": percentil(duracoes, 99), "max": max(duracoes),
+        }
+    return resumo
+
+
+def processos_mais_lentos(spans, top=10, passo="processo.total"):
+    return sorted((r for r in spans if r["passo"] == passo), key=lambda r: r["segundos"], reverse=True)[:top]
+
+
+def imprimir_resumo(caminhos, top=10, desde=None, prefixo=None):
+    spans = ler_spans(caminhos, desde)
+    if prefixo:
+        spans = [r for r in spans if r["passo"].startswith(prefixo) or r["passo"] == "processo.total"]
+    if not spans:
+        print("Nenhum span encontrado.")
+        return
+    execucoes = {r.get("execucao") for r in spans}
+    print(f"{len(spans)} spans de {len(execucoes)} execução(ões).\n")
+    print(f"{'passo':<34}{'n':>7}{'erros':>7}{'p50':>9}{'p90':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+    for passo, r in resumir_spans(spans).items():
+        print(f"{passo:<34}{r['n']:>7}{r['erros']:>7}{r['p50']:>9.2f}{r['p90']:>9.2f}{r['p95']:>9.2f}"
+              f"{r['p99']:>9.2f}{r['max']:>9.2f}")
+    lentos = processos_mais_lentos(spans, top)
+    if lentos:
+        print(f"\nProcessos mais lentos (top {len(lentos)}):")
+        for r in lentos:
+            quando = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(r["ts"]))
+            print(f"  {r['segundos']:>8.2f} s  {r.get('processo')}  {r.get('resultado'):<6} "
+                  f"worker={r.get('worker')}  {quando}  execução {r.get('execucao')}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Resumo dos spans de tempo do PJe (pje_trf3_metricas.jsonl).")
+    parser.add_argument("arquivos", nargs="+", help="arquivos JSONL de métricas")
+    parser.add_argument("--top", type=int, default=10, help="quantos processos mais lentos listar")
+    parser.add_argument("--dias", type=float, help="considera só os spans dos últimos N dias")
+    parser.add_argument("--prefixo", help="filtra os passos pelo prefixo (ex.: acesso. ou login.)")
+    args = parser.parse_args()
+    imprimir_resumo(args.arquivos, args.top, time.time() - args.dias * 86400 if args.dias else None, args.prefixo)
@@ -0,0 +1,220 @@
+# pje_planilha.py
+import os
+import re
+import sys
+import csv
+import time
+import codecs
+
+TAMANHO_LOTE_PADRAO = 5000
+_MAX_AVISOS_INVALIDOS = 20
+# Remove tudo que não é dígito ASCII, preservando as quebras de linha que separam os valores do lote
+_RE_NAO_DIGITO = re.compile(r"[^0-9\n]+")
+
+
+def _encontrar_coluna(cabecalho, coluna=None):
+    """Retorna o índice da coluna de processos: a indicada em `coluna` ou a primeira com 'processo' no nome."""
+    nomes = [str(c).strip() if c is not None else "" for c in cabecalho]
+    if coluna:
+        for i, nome in enumerate(nomes):
+            if nome.lower() == coluna.strip().lower():
+                return i, nome
+        return None, None
+    for i, nome in enumerate(nomes):
+        if "processo" in nome.lower():
+            return i, nome
+    return None, None
+
+
+def _lotes(iteravel, tamanho_lote):
+    lote = []
+    for valor in iteravel:
+        lote.append(valor)
+        if len(lote) >= tamanho_lote:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def _ler_coluna_xlsx(caminho, coluna, tamanho_lote):
+    """Lê só a coluna de processos de um .xlsx em modo read-only (linha a linha, sem carregar a pasta inteira)."""
+    import openpyxl
+
+    wb = openpyxl.load_workbook(caminho, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[0]
+        cabecalho = next(ws.iter_rows(min_row=1, max_row=1, values_only=True), None)
+        if cabecalho is None:
+            return
+        indice, nome = _encontrar_coluna(cabecalho, coluna)
+        if indice is None:
+            raise LookupError(coluna)
+        print(f"    Coluna de processos encontrada: '{nome}'")
+        valores = (linha[0] for linha in ws.iter_rows(min_row=2, min_col=indice + 1, max_col=indice + 1,
+                                                       values_only=True))
+        yield from _lotes(valores, tamanho_lote)
+    finally:
+        wb.close()
+
+
+def _ler_coluna_xls(caminho, coluna, tamanho_lote):
+    """Formato .xls antigo: não há leitor em streaming, então usa pandas lendo apenas a coluna escolhida."""
+    import pandas as pd
+
+    cabecalho = pd.read_excel(caminho, dtype=str, header=0, nrows=0).columns
+    indice, nome = _encontrar_coluna(cabecalho, coluna)
+    if indice is None:
+        raise LookupError(coluna)
+    print(f"    Coluna de processos encontrada: '{nome}'")
+    serie = pd.read_excel(caminho, dtype=str, header=0, usecols=[indice]).iloc[:, 0]
+    yield from _lotes(serie.tolist(), tamanho_lote)
+
+
+def _ler_coluna_csv(caminho, coluna, tamanho_lote):
+    """Lê um .csv em streaming, detectando o separador (',' ';' ou tab) e a codificação (UTF-8 ou Latin-1).
+
+    A codificação é escolhida pelo início do arquivo; um byte inválido mais adiante vira U+FFFD em vez de
+    interromper a leitura no meio (só os dígitos dos números de processo importam).
+    """
+    with open(caminho, "rb") as f:
+        inicio = f.read(64 * 1024)
+    try:
+        # Decodificador incremental: um caractere multibyte cortado no fim da amostra não conta como erro
+        codecs.getincrementaldecoder("utf-8")().decode(inicio)
+        codificacao = "utf-8-sig"
+    except UnicodeDecodeError:
+        codificacao = "latin-1"
+    with open(caminho, "r", encoding=codificacao, errors="replace", newline="") as arquivo:
+        amostra = arquivo.read(64 * 1024)
+        try:
+            dialeto = csv.Sniffer().sniff(amostra, delimiters=",;\t")
+        except csv.Error:
+            dialeto = csv.excel
+        arquivo.seek(0)
+        leitor = csv.reader(arquivo, dialeto)
+        cabecalho = next(leitor, None)
+        if cabecalho is None:
+            return
+        indice, nome = _encontrar_coluna(cabecalho, coluna)
+        if indice is None:
+            raise LookupError(coluna)
+        print(f"    Coluna de processos encontrada: '{nome}'")
+        yield from _lotes((linha[indice] if indice < len(linha) else None for linha in leitor), tamanho_lote)
+
+
+def _ler_coluna_parquet(caminho, coluna, tamanho_lote):
+    """Lê só a coluna de processos de um .parquet, em lotes (pyarrow)."""
+    import pyarrow.parquet as pq
+
+    arquivo = pq.ParquetFile(caminho)
+    indice, nome = _encontrar_coluna(arquivo.schema_arrow.names, coluna)
+    if indice is None:
+        raise LookupError(coluna)
+    print(f"    Coluna de processos encontrada: '{nome}'")
+    for lote in arquivo.iter_batches(batch_size=tamanho_lote, columns=[nome]):
+        yield lote.column(0).cast("string").to_pylist()
+
+
+_LEITORES = {
+    ".xlsx": _ler_coluna_xlsx,
+    ".xlsm": _ler_coluna_xlsx,
+    ".xls": _ler_coluna_xls,
+    ".csv": _ler_coluna_csv,
+    ".txt": _ler_coluna_csv,
+    ".parquet": _ler_coluna_parquet,
+}
+
+
+def extrair_digitos_lote(valores):
+    """Remove tudo que não é dígito de uma lista de valores com uma única passada de regex sobre o lote inteiro."""
+    texto = "\n".join("" if v is None else str(v).replace("\n", " ") for v in valores)
+    return _RE_NAO_DIGITO.sub("", texto).split("\n")
+
+
+def iterar_lotes_processos(caminho_planilha, coluna=None, tamanho_lote=TAMANHO_LOTE_PADRAO):
+    """Lê a planilha (.xlsx, .xls, .csv ou .parquet) em lotes e gera listas de números de processo limpos.
+
+    Só a coluna de processos é lida. Os números (15 a 20 dígitos) saem sem repetição e na ordem da planilha,
+    lote a lote, para que a fila possa começar a ser alimentada antes do fim da leitura.
+    Lança FileNotFoundError, ValueError (formato não suportado) ou LookupError (coluna não encontrada).
+    """
+    if not os.path.exists(caminho_planilha):
+        raise FileNotFoundError(f"Arquivo não encontrado: {caminho_planilha}")
+    extensao = os.path.splitext(caminho_planilha)[1].lower()
+    leitor = _LEITORES.get(extensao)
+    if leitor is None:
+        raise ValueError(f"Formato de planilha não suportado: '{extensao}'")
+
+    vistos = set()
+    invalidos = 0
+    for lote_bruto in leitor(caminho_planilha, coluna, tamanho_lote):
+        lote = []
+        for original, numeros_apenas in zip(lote_bruto, extrair_digitos_lote(lote_bruto)):
+            if 15 <= len(numeros_apenas) <= 20:
+                if numeros_apenas not in vistos:
+                    vistos.add(numeros_apenas)
+                    lote.append(numeros_apenas)
+            elif original is not None and str(original).strip():
+                invalidos += 1
+                if invalidos <= _MAX_AVISOS_INVALIDOS:
+                    print(f"    Valor inválido ou não reconhecido na coluna de processos: '{str(original).strip()}'")
+        if lote:
+            yield lote
+    if invalidos > _MAX_AVISOS_INVALIDOS:
+        print(f"    ... e mais {invalidos - _MAX_AVISOS_INVALIDOS} valores inválidos na coluna de processos.")
+
+
+def _benchmark(caminho_planilha, coluna=None, comparar_pandas=False):
+    """Mede tempo até o primeiro lote, tempo total e pico de memória (tracemalloc) da leitura em streaming.
+
+    Com `comparar_pandas`, mede também a leitura antiga (import do pandas + planilha inteira em um DataFrame).
+    """
+    import tracemalloc
+
+    if comparar_pandas:
+        tracemalloc.start()
+        inicio = time.perf_counter()
+        import pandas as pd
+        importacao = time.perf_counter() - inicio
+        if caminho_planilha.lower().endswith((".csv", ".txt")):
+            df = pd.read_csv(caminho_planilha, dtype=str, sep=None, engine="python")
+        elif caminho_planilha.lower().endswith(".parquet"):
+            df = pd.read_parquet(caminho_planilha).astype(str)
+        else:
+            df = pd.read_excel(caminho_planilha, dtype=str, header=0)
+        coluna_df = next(c for c in df.columns if (coluna or "processo").lower() in str(c).lower())
+        total = len({''.join(filter(str.isdigit, str(v))) for v in df[coluna_df].dropna()})
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"pandas:    {total} processos únicos | import do pandas {importacao:.2f} s | "
+              f"total {time.perf_counter() - inicio:.2f} s | pico de memória {pico / 1024 / 1024:.1f} MB")
+        del df
+
+    # Primeira passada só cronometrada (o tracemalloc deixa a leitura várias vezes mais lenta)
+    inicio = time.perf_counter()
+    primeiro_lote = None
+    total = 0
+    for lote in iterar_lotes_processos(caminho_planilha, coluna):
+        if primeiro_lote is None:
+            primeiro_lote = time.perf_counter() - inicio
+        total += len(lote)
+    fim = time.perf_counter() - inicio
+    tracemalloc.start()
+    for _ in iterar_lotes_processos(caminho_planilha, coluna):
+        pass
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"Streaming: {total} processos únicos | primeiro lote em {primeiro_lote or 0:.3f} s | "
+          f"total {fim:.2f} s | pico de memória {pico / 1024 / 1024:.1f} MB")
+    print(f"Módulos carregados: pandas={'pandas' in sys.modules}, openpyxl={'openpyxl' in sys.modules}, "
+          f"pyarrow={'pyarrow' in sys.modules}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Uso: python pje_planilha.py <planilha.xlsx|.csv|.parquet> [nome da coluna] [--comparar-pandas]")
+        sys.exit(1)
+    argumentos = [a for a in sys.argv[1:] if a != "--comparar-pandas"]
+    _benchmark(argumentos[0], argumentos[1] if len(argumentos) > 1 else None,
+               comparar_pandas="--comparar-pandas" in sys.argv)
@@ -3,8 +3,10 @@ import os
 import time
 import traceback
 import glob
-import re
+import weakref
 from typing import Optional
+import pje_cnj
+import pje_metricas
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service as ChromeService
 from webdriver_manager.chrome import ChromeDriverManager
@@ -22,9 +24,132 @@ from selenium.common.exceptions import (
     ElementNotInteractableException
 )
 
+# --- Tempo máximo (em segundos) de cada espera do fluxo. Ajuste aqui, em um só lugar. ---
+# As esperas terminam assim que a condição real é atingida; o valor abaixo é apenas o teto.
+TIMEOUTS_PJE = {
+    "pagina_pronta": 30,  # document.readyState == 'complete'
+    "rede_ociosa": 10,  # sem AJAX/recursos pendentes (best-effort, não gera erro)
+    "cookies": 10,
+    "link_pje_1g": 20,
+    "redirecionamento_sso": 30,
+    "campos_sso": 30,
+    "painel_pos_login": 60,
+    "menu": 10,
+    "acesso_rapido": 15,
+    "sugestao_processo": 30,
+    "nova_aba_autos": 90,
+    "pagina_autos": 45,
+    "autos_em_cache": 20,  # URL dos autos em cache: se a página não carregar, volta ao Acesso Rápido
+    "menu_download": 30,
+    "botao_download": 20,
+    "nova_aba_pdf": 90,
+    "pdf_carregado": 60,
+}
 
-def configurar_chrome_options_pje(download_path):
+# Página de entrada do login (pode apontar para o mock_pje_server.py em testes e benchmarks)
+URL_ACESSO_PJE_TRF3 = os.getenv("URL_PJE_TRF3_ACESSO", "https://www.trf3.jus.br/pje/acesso-ao-sistema")
+
+# Recursos que o fluxo não usa, bloqueados via CDP no modo enxuto. Os XPaths dependem só do HTML e dos
+# scripts do PJe, que continuam liberados, assim como o PDF. CSS fica de fora por padrão porque as esperas
+# de visibilidade (menu, dropdown de download) dependem dele.
+PADROES_BLOQUEADOS_PJE = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.svg", "*.ico", "*.webp", "*.bmp",
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+    "*.mp4", "*.webm", "*.mp3",
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*", "*hotjar.com*", "*clarity.ms*",
+    "*vlibras.gov.br*",
+]
+PADROES_BLOQUEADOS_CSS = ["*.css"]
+
+_bloqueios_por_driver = weakref.WeakKeyDictionary()
+
+# Elementos do fluxo Acesso Rápido -> autos -> download (usados também pelo motor assíncrono, pje_cdp)
+XPATH_MENU_HAMBURGUER = "//a[@title='Abrir menu' and contains(@class,'botao-menu')]"
+XPATH_NAV_MENU = "//nav[@id='menu']"
+XPATH_ACESSO_RAPIDO = "//nav[@id='menu']//input[@placeholder='Acesso rápido']"
+XPATH_SUGESTAO_PROCESSO = "//div[contains(@class,'resultado-busca')]//a[contains(@onclick, 'pesquisaRapida')]"
+XPATH_MENU_DOWNLOAD = "//a[@title='Download autos do processo']"
+XPATH_BOTAO_DOWNLOAD = "//div[contains(@class,'dropdown-menu')]//input[@value='Download']"
+
+_JS_ESTADO_PAGINA = (
+    "return [document.readyState,"
+    " (window.jQuery && window.jQuery.active) || 0,"
+    " (window.performance && performance.getEntriesByType) ? performance.getEntriesByType('resource').length : 0,"
+    " document.contentType || ''];"
+)
+
+
+def aguardar_pagina_pronta(driver, timeout=None):
+    """Espera document.readyState == 'complete' na aba atual (lança TimeoutException após o teto)."""
+    timeout = TIMEOUTS_PJE["pagina_pronta"] if timeout is None else timeout
+    WebDriverWait(driver, timeout, poll_frequency=0.1).until(
+        lambda d: d.execute_script("return document.readyState") == "complete")
+
+
+def aguardar_rede_ociosa(driver, timeout=None, janela_estavel=0.5):
+    """Espera a página carregar e ficar sem requisições AJAX pendentes e sem novos recursos por `janela_estavel` s.
+
+    Retorna True se a rede ficou ociosa e False se o teto foi atingido (nesse caso o fluxo segue normalmente).
+    """
+    timeout = TIMEOUTS_PJE["rede_ociosa"] if timeout is None else timeout
+    limite = time.monotonic() + timeout
+    ultimo_total_recursos = None
+    estavel_desde = None
+    while time.monotonic() < limite:
+        try:
+            estado, ajax_ativos, total_recursos, _ = driver.execute_script(_JS_ESTADO_PAGINA)
+        except (JavascriptException, WebDriverException):
+            estado, ajax_ativos, total_recursos = None, 1, None
+        agora = time.monotonic()
+        if estado == "complete" and not ajax_ativos and total_recursos == ultimo_total_recursos:
+            if estavel_desde is None:
+                estavel_desde = agora
+            elif agora - estavel_desde >= janela_estavel:
+                return True
+        else:
+            estavel_desde = None
+        ultimo_total_recursos = total_recursos
+        time.sleep(0.1)
+    return False
+
+
+def aguardar_pdf_carregado(driver, timeout=None):
+    """Espera a aba do visualizador sair de about:blank e terminar de receber o PDF."""
+    timeout = TIMEOUTS_PJE["pdf_carregado"] if timeout is None else timeout
+    limite = time.monotonic() + timeout
+    WebDriverWait(driver, timeout, poll_frequency=0.1).until(
+        lambda d: d.current_url not in ("", "about:blank"))
+    aguardar_pagina_pronta(driver, max(0.1, limite - time.monotonic()))
+    try:
+        content_type = driver.execute_script("return document.contentType || '';")
+    except (JavascriptException, WebDriverException):
+        content_type = ""
+    if content_type == "application/pdf":
+        # Para um PDF servido direto, readyState 'complete' só ocorre após o fim da resposta
+        return True
+    # Visualizador em HTML (ex.: pdf.js/iframe): aguarda o download do documento pelo próprio visualizador
+    return aguardar_rede_ociosa(driver, max(0.1, limite - time.monotonic()))
+
+
+def configurar_chrome_options_pje(download_path, headless=False, enxuto=False, user_data_dir=None):
+    """Opções do Chrome para o PJe.
+
+    `enxuto` liga um perfil mais leve (headless, sem imagens, extensões, sincronização nem tráfego de fundo,
+    cache de disco pequeno); o bloqueio dos demais recursos é aplicado depois, com aplicar_bloqueio_recursos.
+    """
+    headless = headless or enxuto
     chrome_options = webdriver.ChromeOptions()
+    if headless:
+        chrome_options.add_argument("--headless=new")
+        chrome_options.add_argument("--window-size=1920,1080")
+    if user_data_dir:
+        chrome_options.add_argument(f"--user-data-dir={user_data_dir}")
+    if enxuto:
+        for argumento in ("--disable-extensions", "--disable-background-networking", "--disable-component-update",
+                          "--disable-default-apps", "--disable-sync", "--no-first-run", "--mute-audio",
+                          "--disable-features=Translate,MediaRouter,OptimizationHints",
+                          "--disk-cache-size=16777216", "--blink-settings=imagesEnabled=false"):
+            chrome_options.add_argument(argumento)
     chrome_options.add_argument("--no-sandbox")
     chrome_options.add_argument("--disable-dev-shm-usage")
     chrome_options.add_argument("--start-maximized")
@@ -37,13 +162,19 @@ def configurar_chrome_options_pje(download_path):
     # <<<< ADIÇÃO IMPORTANTE AQUI >>>>
     # Esta opção desanexa o navegador do script, permitindo que ele permaneça
     # aberto mesmo após o script terminar.
-    chrome_options.add_experimental_option("detach", True)
+    # (em modo headless não há janela para manter aberta)
+    if not headless:
+        chrome_options.add_experimental_option("detach", True)
 
     prefs = {
         "profile.default_content_settings.popups": 0,
         "credentials_enable_service": False,
         "profile.password_manager_enabled": False
     }
+    if enxuto:
+        # Vale para todas as abas, inclusive as abertas por window.open (autos e visualizador do PDF)
+        prefs["profile.managed_default_content_settings.images"] = 2
+        prefs["profile.default_content_setting_values.notifications"] = 2
     # A pasta de download não é mais crítica, mas mantemos a configuração
     if download_path:
         prefs["download.default_directory"] = download_path
@@ -57,25 +188,60 @@ def configurar_chrome_options_pje(download_path):
     return chrome_options
 
 
+def aplicar_bloqueio_recursos(driver, padroes=None):
+    """Bloqueia, via CDP (Network.setBlockedURLs), os recursos da aba atual que casam com `padroes`.
+
+    O bloqueio vale por aba; as abas abertas depois pelo fluxo recebem o mesmo bloqueio ao ganhar o foco.
+    """
+    padroes = list(PADROES_BLOQUEADOS_PJE if padroes is None else padroes)
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": padroes})
+    except WebDriverException as e:
+        print(f"AVISO: Não foi possível bloquear recursos via CDP: {e}")
+        return False
+    _bloqueios_por_driver[driver] = padroes
+    return True
+
+
+def padroes_bloqueados(driver):
+    """Padrões bloqueados no navegador de `driver` (lista vazia se o bloqueio não foi aplicado)."""
+    return list(_bloqueios_por_driver.get(driver, []))
+
+
+def _reaplicar_bloqueio_na_aba(driver):
+    padroes = _bloqueios_por_driver.get(driver)
+    if padroes:
+        aplicar_bloqueio_recursos(driver, padroes)
+
+
 def login_pje_trf3(driver, usuario, senha, pasta_debug):
-    url_inicial_trf3_pje = "https://www.trf3.jus.br/pje/acesso-ao-sistema"
-    print(f"Navegando para a página inicial de acesso ao PJe TRF3: {url_inicial_trf3_pje}")
-    driver.get(url_inicial_trf3_pje);
-    time.sleep(3)
+    url_inicial_trf3_pje = URL_ACESSO_PJE_TRF3
+    passos = pje_metricas.SequenciaPassos("login")
+    inicio_login = time.perf_counter()
     try:
+        passos.passo("pagina_acesso")
+        print(f"Navegando para a página inicial de acesso ao PJe TRF3: {url_inicial_trf3_pje}")
+        driver.get(url_inicial_trf3_pje)
+        aguardar_pagina_pronta(driver)
+
+        passos.passo("cookies")
         print("Procurando por botão de aceitar cookies...")
         try:
             b_cookies_xpath = "//button[@data-role='all' and .//span[contains(text(),'Aceitar todos os cookies')]]"
-            b_cookies = WebDriverWait(driver, 10).until(EC.element_to_be_clickable((By.XPATH, b_cookies_xpath)))
+            b_cookies = WebDriverWait(driver, TIMEOUTS_PJE["cookies"]).until(
+                EC.element_to_be_clickable((By.XPATH, b_cookies_xpath)))
             driver.execute_script("arguments[0].click();", b_cookies);
             print("Botão de cookies clicado.");
-            time.sleep(2)
+            WebDriverWait(driver, TIMEOUTS_PJE["cookies"]).until(EC.invisibility_of_element(b_cookies))
         except:
             print("Botão de aceitar cookies não encontrado/clicável. Prosseguindo...")
 
+        passos.passo("link_pje_1g")
         print("Procurando pelo link 'Sistema PJe - 1º Grau'...")
         link_pje_1g_xpath = "//a[contains(@href, 'pje1g.trf3.jus.br') and contains(normalize-space(), 'Sistema PJe - 1º Grau')]"
-        link_pje_1g_el = WebDriverWait(driver, 20).until(EC.presence_of_element_located((By.XPATH, link_pje_1g_xpath)))
+        link_pje_1g_el = WebDriverWait(driver, TIMEOUTS_PJE["link_pje_1g"]).until(
+            EC.presence_of_element_located((By.XPATH, link_pje_1g_xpath)))
         sso_url = link_pje_1g_el.get_attribute("href")
         print(f"Link 'Sistema PJe - 1º Grau' encontrado. Navegando para href: {sso_url}")
         if sso_url:
@@ -84,26 +250,35 @@ def login_pje_trf3(driver, usuario, senha, pasta_debug):
             print("ERRO: href do link PJe 1G não encontrado."); driver.execute_script("arguments[0].click();",
                                                                                       link_pje_1g_el)
 
-        WebDriverWait(driver, 30).until(EC.url_contains("sso.cloud.pje.jus.br"));
+        passos.passo("redirecionamento_sso")
+        WebDriverWait(driver, TIMEOUTS_PJE["redirecionamento_sso"]).until(EC.url_contains("sso.cloud.pje.jus.br"));
         print(f"Redirecionado para SSO: {driver.current_url}");
-        time.sleep(2)
+        passos.passo("credenciais_sso")
         print("Preenchendo CPF/CNPJ e Senha no SSO...");
-        WebDriverWait(driver, 30).until(EC.visibility_of_element_located((By.ID, "username"))).send_keys(usuario)
+        WebDriverWait(driver, TIMEOUTS_PJE["campos_sso"]).until(
+            EC.visibility_of_element_located((By.ID, "username"))).send_keys(usuario)
         print(f"Usuário (CPF) '{usuario}' inserido.")
-        WebDriverWait(driver, 20).until(EC.visibility_of_element_located((By.ID, "password"))).send_keys(senha)
+        WebDriverWait(driver, TIMEOUTS_PJE["campos_sso"]).until(
+            EC.visibility_of_element_located((By.ID, "password"))).send_keys(senha)
         print("Senha inserida.")
-        btn_sso = WebDriverWait(driver, 20).until(EC.element_to_be_clickable((By.ID, "kc-login")));
+        btn_sso = WebDriverWait(driver, TIMEOUTS_PJE["campos_sso"]).until(
+            EC.element_to_be_clickable((By.ID, "kc-login")));
         driver.execute_script("arguments[0].scrollIntoView(true);", btn_sso);
-        time.sleep(0.5)
         btn_sso.click();
         print("Botão 'ENTRAR' SSO clicado.")
 
+        passos.passo("painel_pos_login")
         print("Aguardando painel PJe (home.seam)...")
-        WebDriverWait(driver, 60).until(
+        WebDriverWait(driver, TIMEOUTS_PJE["painel_pos_login"]).until(
             EC.any_of(EC.url_contains("home.seam"), EC.presence_of_element_located((By.ID, "menu"))))
         print(f"Login PJe TRF3 bem-sucedido! URL: {driver.current_url}");
+        passos.encerrar()
+        pje_metricas.registrar_span("login.total", time.perf_counter() - inicio_login)
         return True
-    except TimeoutException:
+    except TimeoutException as e_timeout:
+        passos.encerrar(pje_metricas.ERRO, e_timeout)
+        pje_metricas.registrar_span("login.total", time.perf_counter() - inicio_login, pje_metricas.ERRO,
+                                    erro="TimeoutException")
         print("ERRO: Timeout durante o processo de login no PJe TRF3.")
         print(f"URL atual no momento do Timeout: {driver.current_url}")
         timestamp = time.strftime('%Y%m%d%H%M%S')
@@ -116,6 +291,9 @@ def login_pje_trf3(driver, usuario, senha, pasta_debug):
             print("Erro ao salvar debug do login.")
         return False
     except Exception as e:
+        passos.encerrar(pje_metricas.ERRO, e)
+        pje_metricas.registrar_span("login.total", time.perf_counter() - inicio_login, pje_metricas.ERRO,
+                                    erro=type(e).__name__)
         print(f"ERRO inesperado login PJe: {e}");
         traceback.print_exc()
         timestamp = time.strftime('%Y%m%d%H%M%S')
@@ -130,18 +308,8 @@ def login_pje_trf3(driver, usuario, senha, pasta_debug):
 
 
 def parse_cnj_number_pje(numero_processo_completo: str) -> Optional[dict]:
-    numeros_apenas = ''.join(filter(str.isdigit, numero_processo_completo))
-    if len(numeros_apenas) == 20:
-        return {"sequencial": numeros_apenas[0:7], "digito": numeros_apenas[7:9], "ano": numeros_apenas[9:13],
-                "ramo": numeros_apenas[13:14], "tribunal": numeros_apenas[14:16], "origem": numeros_apenas[16:20]}
-    else:
-        match_cnj_formatado = re.match(r"(\d{1,7})-?(\d{2})\.?(\d{4})\.?(\d)\.?(\d{2})\.?(\d{4})",
-                                       numero_processo_completo.strip())
-        if match_cnj_formatado:
-            parts = match_cnj_formatado.groups()
-            return {"sequencial": parts[0].zfill(7), "digito": parts[1].zfill(2), "ano": parts[2].zfill(4),
-                    "ramo": parts[3], "tribunal": parts[4].zfill(2), "origem": parts[5].zfill(4)}
-        return None
+    registro = pje_cnj.parse_cnj(numero_processo_completo)
+    return registro._asdict() if registro else None
 
 
 def format_process_number_for_pje_input(numero_processo_completo: str) -> Optional[str]:
@@ -152,7 +320,54 @@ def format_process_number_for_pje_input(numero_processo_completo: str) -> Option
     return numero_processo_completo
 
 
-def access_process_via_quick_search_and_download(driver, numero_processo_planilha, pasta_debug):
+def _fechar_abas(driver, handles):
+    """Fecha as abas indicadas (as que ainda existirem)."""
+    for handle in handles:
+        try:
+            if handle and handle in driver.window_handles:
+                driver.switch_to.window(handle)
+                driver.close()
+        except WebDriverException as e_fechar:
+            print(f"    AVISO: Não foi possível fechar aba {handle}: {e_fechar}")
+
+
+def _abrir_autos_em_cache(driver, url_autos, janela_pje_painel):
+    """Abre `url_autos` numa aba nova e confere se é mesmo a página dos autos (com o botão de download).
+
+    Retorna (handle da aba, URL obtida). Se a página não serviu, fecha a aba, volta ao painel e
+    retorna (None, URL obtida) — a URL indica se a sessão expirou (SSO) ou se a entrada do cache venceu.
+    """
+    driver.switch_to.new_window("tab")
+    janela = driver.current_window_handle
+    _reaplicar_bloqueio_na_aba(driver)
+    try:
+        driver.get(url_autos)
+        # Uma URL vencida cai numa página de erro ou no SSO: basta a página assentar para decidir, sem esperar
+        # o teto inteiro pelo botão de download
+        aguardar_pagina_pronta(driver, TIMEOUTS_PJE["autos_em_cache"])
+        aguardar_rede_ociosa(driver)
+        if ("Detalhe/listAutosDigitais.seam" in driver.current_url
+                and driver.find_elements(By.XPATH, XPATH_MENU_DOWNLOAD)):
+            return janela, driver.current_url
+    except TimeoutException:
+        pass
+    url_obtida = driver.current_url
+    _fechar_abas(driver, [janela])
+    driver.switch_to.window(janela_pje_painel)
+    return None, url_obtida
+
+
+def access_process_via_quick_search_and_download(driver, numero_processo_planilha, pasta_debug, downloader=None,
+                                                 cache_autos=None, url_home=None):
+    """Abre os autos pelo Acesso Rápido e o visualizador do PDF.
+
+    Sem `downloader`, a aba do PDF fica aberta para interação manual. Com um `pje_downloader.DownloaderPJe`,
+    a URL do visualizador é baixada por HTTP, as abas abertas são fechadas e só retorna True se o PDF foi gravado.
+
+    Com `cache_autos` (pje_ledger.LedgerPJe), as URLs dos autos e do PDF resolvidas ficam guardadas e, nas
+    execuções e tentativas seguintes, são abertas direto. Se a entrada não funcionar mais, ela é descartada e
+    o fluxo volta ao Acesso Rápido, navegando antes para `url_home` (quando o painel não foi resetado).
+    """
     print(f"  [PJe] Tentando acessar processo '{numero_processo_planilha}' via Acesso Rápido para abrir PDF...")
     numero_processo_formatado_para_input = format_process_number_for_pje_input(numero_processo_planilha)
     if not numero_processo_formatado_para_input:
@@ -161,85 +376,161 @@ def access_process_via_quick_search_and_download(driver, numero_processo_planilh
 
     janela_pje_painel = driver.current_window_handle
     janela_autos_digitais = None
+    passos = pje_metricas.SequenciaPassos("acesso")
 
     try:
-        pausa_home = 15
-        print(f"    Aguardando a página principal (home.seam) assentar completamente ({pausa_home} segundos)...")
-        time.sleep(pausa_home)
-
-        # PASSO 1: Tentar clicar no botão "Abrir menu" (Hamburguer)
-        print("    Procurando por botão 'Abrir menu'...")
-        menu_hamburguer_xpath = "//a[@title='Abrir menu' and contains(@class,'botao-menu')]"
-        nav_menu_container_xpath = "//nav[@id='menu']"
-        try:
-            menu_hamburguer_botao = WebDriverWait(driver, 10).until(
-                EC.element_to_be_clickable((By.XPATH, menu_hamburguer_xpath)))
-            print(f"    Botão/Link 'Abrir menu' encontrado. Clicando para expandir...")
-            driver.execute_script("arguments[0].click();", menu_hamburguer_botao)
-            WebDriverWait(driver, 10).until(EC.visibility_of_element_located((By.XPATH, nav_menu_container_xpath)))
-            print("    'Abrir menu' clicado e menu principal agora visível.")
-            time.sleep(2)
-        except Exception as e_menu_abrir:
-            print(f"    AVISO: Problema ao interagir com 'Abrir menu': {e_menu_abrir}. Prosseguindo...")
-
-        # PASSO 2: Localizar e preencher o campo "Acesso rápido"
-        acesso_rapido_input_xpath = "//nav[@id='menu']//input[@placeholder='Acesso rápido']"
-        acesso_rapido_input = WebDriverWait(driver, 15).until(
-            EC.visibility_of_element_located((By.XPATH, acesso_rapido_input_xpath)))
-        print(f"    Campo 'Acesso rápido' encontrado e visível.")
-        driver.execute_script(
-            f"arguments[0].value='{numero_processo_formatado_para_input}'; arguments[0].dispatchEvent(new Event('input', {{ bubbles: true }}));",
-            acesso_rapido_input)
-        print(f"    Número '{numero_processo_formatado_para_input}' enviado para 'Acesso Rápido'.");
-        time.sleep(7)
-
-        # PASSO 3: Clicar na Sugestão "Abrir processo"
-        abrir_processo_sugestao_xpath = "//div[contains(@class,'resultado-busca')]//a[contains(@onclick, 'pesquisaRapida')]"
-        abrir_processo_link = WebDriverWait(driver, 30).until(
-            EC.element_to_be_clickable((By.XPATH, abrir_processo_sugestao_xpath)))
-        print("    Sugestão 'Abrir processo' encontrada. Clicando...");
-        handles_antes_clique_autos = set(driver.window_handles)
-        driver.execute_script("arguments[0].click();", abrir_processo_link)
-
-        # PASSO 4: Lidar com a Nova Aba dos Autos Digitais
-        WebDriverWait(driver, 90).until(EC.number_of_windows_to_be(len(handles_antes_clique_autos) + 1))
-        janela_autos_digitais = (set(driver.window_handles) - handles_antes_clique_autos).pop()
-        driver.switch_to.window(janela_autos_digitais)
-        print(f"    Foco na nova aba dos autos: {driver.current_url}")
-        WebDriverWait(driver, 45).until(EC.url_contains("Detalhe/listAutosDigitais.seam"));
-        print("    Página de detalhes/autos carregada.")
+        entrada_cache = cache_autos.obter_url_autos(numero_processo_planilha) if cache_autos is not None else None
+        if entrada_cache:
+            url_autos, url_pdf_cache = entrada_cache
+            if downloader is not None and url_pdf_cache:
+                # Atalho: PDF já resolvido em outra execução, baixado por HTTP sem abrir nenhuma página
+                passos.passo("cache_pdf_direto")
+                print("    URL do PDF em cache. Baixando direto via HTTP...")
+                downloader.atualizar_cookies_do_driver(driver)
+                caminho_pdf = downloader.baixar_pdf(url_pdf_cache, numero_processo_planilha, referer=url_autos)
+                if caminho_pdf:
+                    passos.encerrar()
+                    print(f"    SUCESSO: PDF de '{numero_processo_planilha}' gravado em {caminho_pdf} (URL em cache).")
+                    return True
+                passos.encerrar(pje_metricas.FALHA)
+                cache_autos.invalidar_url_autos(numero_processo_planilha, somente_pdf=True)
+
+            # Atalho: abre a página dos autos direto pela URL em cache, sem menu nem Acesso Rápido
+            passos.passo("cache_autos_direto")
+            print(f"    URL dos autos em cache. Abrindo direto: {url_autos}")
+            janela_autos_digitais, url_obtida = _abrir_autos_em_cache(driver, url_autos, janela_pje_painel)
+            if janela_autos_digitais is None:
+                passos.encerrar(pje_metricas.FALHA)
+                if "sso.cloud.pje.jus.br" not in url_obtida:
+                    cache_autos.invalidar_url_autos(numero_processo_planilha)
+                print("    URL dos autos em cache não abriu os autos. Voltando ao Acesso Rápido...")
+                if url_home:
+                    driver.get(url_home)
+
+        if janela_autos_digitais is None:
+            passos.passo("passo0_home_pronta")
+            print("    Aguardando a página principal (home.seam) assentar (carregamento e AJAX concluídos)...")
+            aguardar_pagina_pronta(driver)
+            aguardar_rede_ociosa(driver)
+
+            # PASSO 1: Tentar clicar no botão "Abrir menu" (Hamburguer)
+            passos.passo("passo1_menu")
+            print("    Procurando por botão 'Abrir menu'...")
+            menu_hamburguer_xpath = XPATH_MENU_HAMBURGUER
+            nav_menu_container_xpath = XPATH_NAV_MENU
+            try:
+                menu_hamburguer_botao = WebDriverWait(driver, TIMEOUTS_PJE["menu"]).until(
+                    EC.element_to_be_clickable((By.XPATH, menu_hamburguer_xpath)))
+                print(f"    Botão/Link 'Abrir menu' encontrado. Clicando para expandir...")
+                driver.execute_script("arguments[0].click();", menu_hamburguer_botao)
+                WebDriverWait(driver, TIMEOUTS_PJE["menu"]).until(
+                    EC.visibility_of_element_located((By.XPATH, nav_menu_container_xpath)))
+                print("    'Abrir menu' clicado e menu principal agora visível.")
+            except Exception as e_menu_abrir:
+                passos.encerrar(pje_metricas.ERRO, e_menu_abrir)
+                print(f"    AVISO: Problema ao interagir com 'Abrir menu': {e_menu_abrir}. Prosseguindo...")
+
+            # PASSO 2: Localizar e preencher o campo "Acesso rápido"
+            passos.passo("passo2_acesso_rapido")
+            acesso_rapido_input_xpath = XPATH_ACESSO_RAPIDO
+            acesso_rapido_input = WebDriverWait(driver, TIMEOUTS_PJE["acesso_rapido"]).until(
+                EC.visibility_of_element_located((By.XPATH, acesso_rapido_input_xpath)))
+            print(f"    Campo 'Acesso rápido' encontrado e visível.")
+            driver.execute_script(
+                f"arguments[0].value='{numero_processo_formatado_para_input}'; arguments[0].dispatchEvent(new Event('input', {{ bubbles: true }}));",
+                acesso_rapido_input)
+            print(f"    Número '{numero_processo_formatado_para_input}' enviado para 'Acesso Rápido'.");
+
+            # PASSO 3: Clicar na Sugestão "Abrir processo" (a espera termina assim que a lista de sugestões aparece)
+            passos.passo("passo3_sugestao")
+            abrir_processo_sugestao_xpath = XPATH_SUGESTAO_PROCESSO
+            abrir_processo_link = WebDriverWait(driver, TIMEOUTS_PJE["sugestao_processo"], poll_frequency=0.2).until(
+                EC.element_to_be_clickable((By.XPATH, abrir_processo_sugestao_xpath)))
+            print("    Sugestão 'Abrir processo' encontrada. Clicando...");
+            handles_antes_clique_autos = set(driver.window_handles)
+            driver.execute_script("arguments[0].click();", abrir_processo_link)
+
+            # PASSO 4: Lidar com a Nova Aba dos Autos Digitais
+            passos.passo("passo4_aba_autos")
+            WebDriverWait(driver, TIMEOUTS_PJE["nova_aba_autos"], poll_frequency=0.2).until(
+                EC.number_of_windows_to_be(len(handles_antes_clique_autos) + 1))
+            janela_autos_digitais = (set(driver.window_handles) - handles_antes_clique_autos).pop()
+            driver.switch_to.window(janela_autos_digitais)
+            _reaplicar_bloqueio_na_aba(driver)
+            print(f"    Foco na nova aba dos autos: {driver.current_url}")
+            WebDriverWait(driver, TIMEOUTS_PJE["pagina_autos"], poll_frequency=0.2).until(
+                EC.url_contains("Detalhe/listAutosDigitais.seam"));
+            url_autos = driver.current_url
+            print("    Página de detalhes/autos carregada.")
+            if cache_autos is not None:
+                cache_autos.gravar_url_autos(numero_processo_planilha, url_autos)
 
         # PASSO 5: Abrir a página do visualizador de PDF
+        passos.passo("passo5_menu_download")
         print("    Tentando abrir a página de download do PDF...")
-        botao_abrir_menu_download_xpath = "//a[@title='Download autos do processo']"
-        el_abrir_opcoes = WebDriverWait(driver, 30).until(
+        botao_abrir_menu_download_xpath = XPATH_MENU_DOWNLOAD
+        el_abrir_opcoes = WebDriverWait(driver, TIMEOUTS_PJE["menu_download"], poll_frequency=0.2).until(
             EC.element_to_be_clickable((By.XPATH, botao_abrir_menu_download_xpath)))
         print(f"      Botão inicial de download encontrado. Clicando...");
         driver.execute_script("arguments[0].click();", el_abrir_opcoes);
-        time.sleep(2.5)
 
-        botao_intermediario_download_xpath = "//div[contains(@class,'dropdown-menu')]//input[@value='Download']"
-        el_intermediario_download = WebDriverWait(driver, 20).until(
+        botao_intermediario_download_xpath = XPATH_BOTAO_DOWNLOAD
+        el_intermediario_download = WebDriverWait(driver, TIMEOUTS_PJE["botao_download"], poll_frequency=0.2).until(
             EC.element_to_be_clickable((By.XPATH, botao_intermediario_download_xpath)))
         print(f"      Botão intermediário 'Download' encontrado. Clicando...");
         handles_antes_clique_pdf_viewer = set(driver.window_handles)
         driver.execute_script("arguments[0].click();", el_intermediario_download)
 
         # PASSO 6: ESPERAR E MUDAR PARA A NOVA ABA/JANELA do visualizador de PDF
+        passos.passo("passo6_aba_pdf")
         print("      Aguardando nova aba/janela do visualizador de PDF (pje-downloads.trf3.jus.br)...")
-        timeout_pdf_viewer_aba = 90
-        WebDriverWait(driver, timeout_pdf_viewer_aba).until(
+        WebDriverWait(driver, TIMEOUTS_PJE["nova_aba_pdf"], poll_frequency=0.2).until(
             EC.number_of_windows_to_be(len(handles_antes_clique_pdf_viewer) + 1))
         janela_pdf_viewer = (set(driver.window_handles) - handles_antes_clique_pdf_viewer).pop()
         driver.switch_to.window(janela_pdf_viewer)
-        print(f"      Foco na NOVA aba do visualizador de PDF: {driver.current_url}")
+
+        if downloader is not None:
+            passos.passo("passo7_download_http")
+            WebDriverWait(driver, TIMEOUTS_PJE["pdf_carregado"], poll_frequency=0.1).until(
+                lambda d: d.current_url not in ("", "about:blank"))
+            url_pdf = driver.current_url
+            # O visualizador não pode continuar carregando o PDF: seria baixado duas vezes (e uma URL de uso
+            # único seria consumida pelo navegador). Para o carregamento e fecha a aba antes do download HTTP.
+            try:
+                driver.execute_script("window.stop();")
+            except WebDriverException:
+                pass
+            downloader.atualizar_cookies_do_driver(driver)
+            _fechar_abas(driver, [janela_pdf_viewer])
+            driver.switch_to.window(janela_autos_digitais or janela_pje_painel)
+            print(f"      URL do PDF descoberta: {url_pdf}. Baixando via HTTP...")
+            caminho_pdf = downloader.baixar_pdf(url_pdf, numero_processo_planilha, referer=url_autos)
+            _fechar_abas(driver, [janela_autos_digitais])
+            if caminho_pdf:
+                passos.encerrar()
+                if cache_autos is not None:
+                    cache_autos.gravar_url_autos(numero_processo_planilha, url_autos, url_pdf)
+                print(f"    SUCESSO: PDF de '{numero_processo_planilha}' gravado em {caminho_pdf}.")
+                return True
+            passos.encerrar(pje_metricas.FALHA)
+            print(f"    FALHA: PDF de '{numero_processo_planilha}' não foi gravado.")
+            return False
+
+        passos.passo("passo7_pdf_carregado")
         print("      Aguardando página do PDF carregar...");
-        time.sleep(15)
+        if not aguardar_pdf_carregado(driver):
+            passos.encerrar(pje_metricas.FALHA)
+            print("      AVISO: visualizador ainda com requisições pendentes ao fim do tempo máximo. Prosseguindo...")
+        passos.encerrar()
+        if cache_autos is not None:
+            cache_autos.gravar_url_autos(numero_processo_planilha, url_autos, driver.current_url)
+        print(f"      Foco na NOVA aba do visualizador de PDF: {driver.current_url}")
 
         print(f"    SUCESSO: Página do PDF para '{numero_processo_planilha}' aberta para interação manual.")
         return True  # Indica que a página do PDF foi aberta com sucesso
 
     except Exception as e:
+        passos.encerrar(pje_metricas.ERRO, e)
         print(
             f"    ERRO [PJe] Inesperado ao tentar acessar/abrir PDF de '{numero_processo_planilha}': {type(e).__name__} - {e}")
         ts = time.strftime('%Y%m%d%H%M%S')
@@ -0,0 +1,350 @@
+# pje_sentencas.py
+# Etapa pós-download: extrai o texto dos PDFs dos autos em um pool de processos, localiza as páginas da sentença,
+# grava um recorte por processo (<numero>.pdf só com as páginas da sentença + <numero>.txt) e mantém um índice
+# de texto completo (SQLite FTS5) incremental sobre todas as sentenças encontradas.
+#
+# Uso: python pje_sentencas.py [--pasta ProcessosBaixadosPJE_TRF3] [--observar] [--processos 8]
+#      python pje_sentencas.py --buscar "julgo procedente AND aposentadoria"
+import os
+import re
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import pje_metricas
+
+# Rodapé que o PJe carimba em cada página dos autos: "Num. 123456 - Pág. 1" (id do documento e página dentro dele)
+_RE_RODAPE_DOCUMENTO = re.compile(r"Num\.\s*(\d+)\s*-\s*P[áa]g\.\s*(\d+)", re.IGNORECASE)
+_RE_TITULO_SENTENCA = re.compile(r"\bS\s?E\s?N\s?T\s?E\s?N\s?[ÇC]\s?A\b(?:\s+TIPO\s+[A-E]\b)?", re.IGNORECASE)
+_RE_DISPOSITIVO = re.compile(
+    r"julgo\s+(?:parcialmente\s+)?(?:im)?procedentes?|julgo\s+extint[oa]|extingo\s+o\s+(?:processo|feito)"
+    r"|homologo\b|P\.\s?R\.\s?I\.|publique-se\.?\s+registre-se", re.IGNORECASE)
+_RE_FUNDAMENTO = re.compile(r"\b(?:ante|diante|pelo|por todo)\s+o\s+exposto\b", re.IGNORECASE)
+# O título precisa estar no começo da primeira página do documento (não em citações no meio do texto)
+_CARACTERES_CABECALHO = 800
+_MIN_CARACTERES_TEXTO = 20
+
+
+def _eh_sentenca(textos):
+    """Decide se um documento (textos das suas páginas) é uma sentença.
+
+    Basta o título "SENTENÇA" no cabeçalho; sem ele, exige dois trechos típicos do dispositivo (ex.: "julgo
+    procedente" e "P.R.I.") e um "ante o exposto", como nas sentenças sem cabeçalho.
+    """
+    if _RE_TITULO_SENTENCA.search(textos[0][:_CARACTERES_CABECALHO]):
+        return True
+    completo = "\n".join(textos)
+    return len(_RE_DISPOSITIVO.findall(completo)) >= 2 and _RE_FUNDAMENTO.search(completo) is not None
+
+
+def _gravar_atomico(caminho, escrever):
+    temporario = f"{caminho}.tmp"
+    escrever(temporario)
+    os.replace(temporario, caminho)
+
+
+def _resultado_vazio(caminho_pdf, erro=None):
+    return {"numero": os.path.splitext(os.path.basename(caminho_pdf))[0], "caminho": caminho_pdf, "tamanho": 0,
+            "mtime_ns": 0, "paginas_total": 0, "paginas": [], "textos": [], "sem_texto": False, "erro": erro,
+            "segundos": 0.0}
+
+
+def extrair_sentenca_pdf(caminho_pdf, pasta_artefatos):
+    """Executada no pool: lê o PDF página a página e grava o recorte da sentença, se houver.
+
+    Só o texto do documento corrente (entre dois rodapés "Pág. 1") fica em memória; documentos que não são
+    sentença são descartados assim que termina. Retorna um dicionário simples (serializável entre processos).
+    """
+    resultado = _resultado_vazio(caminho_pdf)
+    inicio = time.perf_counter()
+    try:
+        from pypdf import PdfReader, PdfWriter
+
+        # O PDF pode ter sido removido ou renomeado entre a varredura da pasta e a vez dele no pool
+        estatisticas = os.stat(caminho_pdf)
+        resultado["tamanho"], resultado["mtime_ns"] = estatisticas.st_size, estatisticas.st_mtime_ns
+        with open(caminho_pdf, "rb") as arquivo:
+            leitor = PdfReader(arquivo)
+            documento = []  # [(indice da página, texto)] do documento corrente
+            com_texto = 0
+
+            def _fechar_documento():
+                if documento and _eh_sentenca([texto for _, texto in documento]):
+                    resultado["paginas"].extend(indice for indice, _ in documento)
+                    resultado["textos"].extend(texto for _, texto in documento)
+                documento.clear()
+
+            for indice, pagina in enumerate(leitor.pages):
+                texto = pagina.extract_text() or ""
+                if len(texto.strip()) >= _MIN_CARACTERES_TEXTO:
+                    com_texto += 1
+                rodape = _RE_RODAPE_DOCUMENTO.search(texto)
+                # Sem rodapé do PJe (PDF montado fora do sistema) cada página é avaliada sozinha
+                if rodape is None or rodape.group(2) == "1":
+                    _fechar_documento()
+                documento.append((indice, texto))
+                resultado["paginas_total"] = indice + 1
+            _fechar_documento()
+            resultado["sem_texto"] = com_texto == 0 and resultado["paginas_total"] > 0
+
+            if resultado["paginas"]:
+                os.makedirs(pasta_artefatos, exist_ok=True)
+                escritor = PdfWriter()
+                for indice in resultado["paginas"]:
+                    escritor.add_page(leitor.pages[indice])
+                _gravar_atomico(os.path.join(pasta_artefatos, f"{resultado['numero']}.pdf"), escritor.write)
+                _gravar_atomico(os.path.join(pasta_artefatos, f"{resultado['numero']}.txt"),
+                                lambda caminho: _escrever_texto(caminho, resultado))
+    except Exception as e:
+        resultado["erro"] = f"{type(e).__name__}: {e}"
+        resultado["paginas"], resultado["textos"] = [], []
+    resultado["segundos"] = time.perf_counter() - inicio
+    return resultado
+
+
+def _escrever_texto(caminho, resultado):
+    with open(caminho, "w", encoding="utf-8") as f:
+        for indice, texto in zip(resultado["paginas"], resultado["textos"]):
+            f.write(f"===== {resultado['numero']} | página {indice + 1} de {resultado['paginas_total']} =====\n")
+            f.write(texto.strip() + "\n\n")
+
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS arquivos (
+    numero TEXT PRIMARY KEY,
+    caminho TEXT NOT NULL,
+    tamanho INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    paginas_total INTEGER NOT NULL,
+    paginas_sentenca TEXT NOT NULL,
+    sem_texto INTEGER NOT NULL DEFAULT 0,
+    erro TEXT,
+    processado_em REAL NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS sentencas_fts USING fts5(
+    numero UNINDEXED, pagina UNINDEXED, texto, tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+
+
+class IndiceSentencas:
+    """Índice SQLite dos PDFs já processados (tamanho + mtime) e do texto das sentenças (FTS5).
+
+    Só a thread que cria o índice grava nele; os processos do pool apenas devolvem resultados.
+    """
+
+    def __init__(self, caminho_db):
+        self.caminho_db = caminho_db
+        self.conn = sqlite3.connect(caminho_db, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_ESQUEMA)
+
+    def assinaturas(self):
+        """{numero: (tamanho, mtime_ns)} de tudo que já foi processado, para comparar com a pasta sem consultas."""
+        return {numero: (tamanho, mtime_ns) for numero, tamanho, mtime_ns in
+                self.conn.execute("SELECT numero, tamanho, mtime_ns FROM arquivos")}
+
+    def gravar(self, resultado):
+        """Substitui o registro e as páginas indexadas de um processo pelo resultado novo."""
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.conn.execute("DELETE FROM sentencas_fts WHERE numero = ?", (resultado["numero"],))
+            self.conn.executemany(
+                "INSERT INTO sentencas_fts (numero, pagina, texto) VALUES (?, ?, ?)",
+                [(resultado["numero"], indice + 1, texto)
+                 for indice, texto in zip(resultado["paginas"], resultado["textos"])])
+            self.conn.execute(
+                "INSERT OR REPLACE INTO arquivos (numero, caminho, tamanho, mtime_ns, paginas_total, paginas_sentenca,"
+                " sem_texto, erro, processado_em) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (resultado["numero"], resultado["caminho"], resultado["tamanho"], resultado["mtime_ns"],
+                 resultado["paginas_total"], json.dumps([i + 1 for i in resultado["paginas"]]),
+                 int(resultado["sem_texto"]), resultado["erro"], time.time()))
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+
+    def buscar(self, consulta, limite=20):
+        """Busca na sintaxe do FTS5 (ex.: 'aposentadoria AND "julgo procedente"'), das mais relevantes às menos.
+
+        Retorna [(numero, pagina, trecho)].
+        """
+        return self.conn.execute(
+            "SELECT numero, pagina, snippet(sentencas_fts, 2, '[', ']', ' ... ', 16) FROM sentencas_fts "
+            "WHERE sentencas_fts MATCH ? ORDER BY rank LIMIT ?", (consulta, limite)).fetchall()
+
+    def resumo(self):
+        return self.conn.execute(
+            "SELECT COUNT(*), SUM(paginas_sentenca != '[]'), SUM(sem_texto), SUM(erro IS NOT NULL) FROM arquivos"
+        ).fetchone()
+
+    def fechar(self):
+        self.conn.close()
+
+
+class PipelineSentencas:
+    """Procura PDFs novos ou alterados em `pasta_pdfs` e os processa em um pool de `processos` processos."""
+
+    def __init__(self, pasta_pdfs, pasta_artefatos, caminho_indice, processos=None):
+        self.pasta_pdfs = pasta_pdfs
+        self.pasta_artefatos = pasta_artefatos
+        self.indice = IndiceSentencas(caminho_indice)
+        self.processos = processos or os.cpu_count() or 1
+        self._assinaturas = self.indice.assinaturas()
+
+    def _pendentes(self):
+        if not os.path.isdir(self.pasta_pdfs):
+            return []
+        pendentes = []
+        with os.scandir(self.pasta_pdfs) as entradas:
+            # Downloads em andamento (.part/.crdownload) não terminam em .pdf, então nunca são lidos pela metade
+            for entrada in entradas:
+                if not entrada.name.lower().endswith(".pdf") or not entrada.is_file():
+                    continue
+                estatisticas = entrada.stat()
+                numero = os.path.splitext(entrada.name)[0]
+                if self._assinaturas.get(numero) != (estatisticas.st_size, estatisticas.st_mtime_ns):
+                    pendentes.append(entrada.path)
+        return sorted(pendentes)
+
+    def _registrar(self, resultado):
+        self.indice.gravar(resultado)
+        self._assinaturas[resultado["numero"]] = (resultado["tamanho"], resultado["mtime_ns"])
+        situacao = (pje_metricas.ERRO if resultado["erro"] else
+                    pje_metricas.OK if resultado["paginas"] else pje_metricas.FALHA)
+        pje_metricas.registrar_span("sentencas.extracao", resultado["segundos"], situacao,
+                                    processo=resultado["numero"], worker="sentencas")
+        if resultado["erro"]:
+            print(f"  [Sentenças] ERRO em '{resultado['numero']}': {resultado['erro']}")
+        elif resultado["paginas"]:
+            print(f"  [Sentenças] '{resultado['numero']}': sentença nas páginas "
+                  f"{[i + 1 for i in resultado['paginas']]} de {resultado['paginas_total']}.")
+        elif resultado["sem_texto"]:
+            print(f"  [Sentenças] '{resultado['numero']}': PDF sem camada de texto (digitalizado), sem OCR.")
+        else:
+            print(f"  [Sentenças] '{resultado['numero']}': nenhuma sentença encontrada "
+                  f"em {resultado['paginas_total']} páginas.")
+
+    def processar_pendentes(self, executor):
+        """Processa tudo o que mudou desde a última passada. Retorna quantos PDFs foram processados."""
+        pendentes = self._pendentes()
+        em_andamento = {}  # futuro -> caminho do PDF
+        # No máximo 2 tarefas por processo em voo: a fila não cresce com milhares de PDFs pendentes
+        for caminho in pendentes:
+            if len(em_andamento) >= self.processos * 2:
+                concluidas, _ = wait(em_andamento, return_when=FIRST_COMPLETED)
+                for futuro in concluidas:
+                    self._registrar_futuro(futuro, em_andamento.pop(futuro))
+            em_andamento[executor.submit(extrair_sentenca_pdf, caminho, self.pasta_artefatos)] = caminho
+        for futuro in wait(em_andamento).done:
+            self._registrar_futuro(futuro, em_andamento[futuro])
+        return len(pendentes)
+
+    def _registrar_futuro(self, futuro, caminho):
+        """Registra o resultado; se a tarefa não devolveu nenhum (processo do pool morto), marca o PDF com erro."""
+        try:
+            resultado = futuro.result()
+        except Exception as e:
+            resultado = _resultado_vazio(caminho, f"{type(e).__name__}: {e}")
+            try:
+                # Com a assinatura atual, o PDF só é tentado de novo se mudar (não derruba o pool a cada passada)
+                estatisticas = os.stat(caminho)
+                resultado["tamanho"], resultado["mtime_ns"] = estatisticas.st_size, estatisticas.st_mtime_ns
+            except OSError:
+                pass
+        self._registrar(resultado)
+
+    def executar(self, parar=None, intervalo=5.0):
+        """Uma passada só (parar=None) ou observa a pasta até `parar` (threading.Event) ser sinalizado.
+
+        Depois do sinal ainda faz uma última passada, para pegar os PDFs gravados no fim dos downloads.
+        """
+        # 'spawn': o processo principal tem várias threads (workers Selenium, conexões sqlite) e um fork
+        # copiaria locks no meio do uso
+        contexto = multiprocessing.get_context("spawn")
+        executor = ProcessPoolExecutor(max_workers=self.processos, mp_context=contexto)
+        try:
+            while True:
+                ultima = parar is None or parar.is_set()
+                try:
+                    processados = self.processar_pendentes(executor)
+                except BrokenProcessPool as e:
+                    # Um processo do pool morreu (ex.: falta de memória num PDF enorme): recria o pool e segue
+                    print(f"[Sentenças] AVISO: pool de processos interrompido ({e}). Recriando...")
+                    executor.shutdown(wait=False)
+                    executor = ProcessPoolExecutor(max_workers=self.processos, mp_context=contexto)
+                    continue
+                if processados:
+                    total, com_sentenca, sem_texto, erros = self.indice.resumo()
+                    print(f"[Sentenças] {processados} PDFs processados | índice: {total} processos, "
+                          f"{com_sentenca or 0} com sentença, {sem_texto or 0} sem texto, {erros or 0} com erro.")
+                if ultima:
+                    break
+                parar.wait(intervalo)
+        finally:
+            executor.shutdown()
+
+    def fechar(self):
+        self.indice.fechar()
+
+
+def iniciar_observador_sentencas(pasta_pdfs, pasta_artefatos, caminho_indice, processos=None):
+    """Observa a pasta em uma thread de segundo plano. Retorna (thread, evento_parar)."""
+    parar = threading.Event()
+
+    def _observar():
+        pipeline = PipelineSentencas(pasta_pdfs, pasta_artefatos, caminho_indice, processos)
+        try:
+            pipeline.executar(parar)
+        finally:
+            pipeline.fechar()
+
+    thread = threading.Thread(target=_observar, name="sentencas-pje", daemon=True)
+    thread.start()
+    return thread, parar
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    pasta_base = os.getenv("APSDJ_FOLDER_PATH", ".")
+    parser = argparse.ArgumentParser(description="Extrai as sentenças dos PDFs baixados e indexa o texto (FTS5).")
+    parser.add_argument("--pasta", default=os.path.join(pasta_base, "ProcessosBaixadosPJE_TRF3"),
+                        help="pasta com os PDFs dos autos")
+    parser.add_argument("--artefatos", default=os.path.join(pasta_base, "SentencasPJE_TRF3"),
+                        help="pasta dos recortes <numero>.pdf/.txt")
+    parser.add_argument("--indice", default=os.path.join(pasta_base, "pje_trf3_sentencas.sqlite3"))
+    parser.add_argument("--processos", type=int, help="processos no pool (padrão: número de núcleos)")
+    parser.add_argument("--observar", action="store_true", help="continua observando a pasta (Ctrl+C encerra)")
+    parser.add_argument("--buscar", help="consulta FTS5 nas sentenças já indexadas")
+    parser.add_argument("--limite", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.buscar:
+        indice = IndiceSentencas(args.indice)
+        try:
+            for numero, pagina, trecho in indice.buscar(args.buscar, args.limite):
+                print(f"{numero}  p. {pagina}: {' '.join(trecho.split())}")
+        except sqlite3.OperationalError as e:
+            print(f"ERRO na consulta: {e}")
+            sys.exit(1)
+        finally:
+            indice.fechar()
+        sys.exit(0)
+
+    pipeline = PipelineSentencas(args.pasta, args.artefatos, args.indice, args.processos)
+    evento_parar = threading.Event() if args.observar else None
+    try:
+        pipeline.executar(evento_parar)
+    except KeyboardInterrupt:
+        print("Interrompido.")
+    finally:
+        pipeline.fechar()
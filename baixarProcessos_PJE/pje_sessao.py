@@ -0,0 +1,183 @@
+# pje_sessao.py
+import os
+import json
+import time
+import base64
+import hashlib
+import threading
+from urllib.parse import urlparse
+
+import pje_metricas
+import pje_scraper
+
+# Um único login completo por vez: se vários workers encontram a sessão expirada ao mesmo tempo,
+# o primeiro faz o login e salva; os demais reaproveitam a sessão recém-gravada.
+_login_pje_lock = threading.Lock()
+
+_MAGIC_SESSAO = b"PJESESS1"
+_ITERACOES_PBKDF2 = 200_000
+_TIMEOUT_VERIFICACAO = 15
+# Campos aceitos por Network.setCookies (o restante retornado por Network.getAllCookies é descartado)
+_CAMPOS_COOKIE_CDP = ("name", "value", "domain", "path", "secure", "httpOnly", "sameSite", "expires")
+
+
+def _fernet(chave_secreta, salt):
+    """Cria o Fernet (cryptography) derivando a chave via PBKDF2. Retorna None se a biblioteca não estiver instalada."""
+    try:
+        from cryptography.fernet import Fernet
+    except ImportError:
+        return None
+    chave = hashlib.pbkdf2_hmac("sha256", chave_secreta.encode("utf-8"), salt, _ITERACOES_PBKDF2)
+    return Fernet(base64.urlsafe_b64encode(chave))
+
+
+def capturar_cookies_driver(driver):
+    """Retorna todos os cookies do navegador (de todos os domínios do fluxo: trf3, pje1g, SSO, pje-downloads)."""
+    try:
+        return driver.execute_cdp_cmd("Network.getAllCookies", {})["cookies"]
+    except Exception:
+        # Fallback para drivers sem CDP: apenas os cookies do domínio atual
+        return driver.get_cookies()
+
+
+def criar_sessao_http(cookies, user_agent=None):
+    """Cria um requests.Session com os cookies autenticados capturados do navegador."""
+    import requests
+
+    sessao = requests.Session()
+    for c in cookies:
+        sessao.cookies.set(c["name"], c["value"], domain=c.get("domain", ""), path=c.get("path", "/"),
+                           secure=c.get("secure", False))
+    if user_agent:
+        sessao.headers["User-Agent"] = user_agent
+    return sessao
+
+
+def salvar_sessao_pje(driver, caminho_sessao, chave_secreta):
+    """Grava cookies e storage da sessão autenticada, criptografados, em `caminho_sessao` (escrita atômica)."""
+    salt = os.urandom(16)
+    fernet = _fernet(chave_secreta, salt)
+    if fernet is None:
+        print("  [Sessão PJe] AVISO: pacote 'cryptography' não instalado. A sessão não será salva em disco.")
+        return False
+    try:
+        storage = driver.execute_script(
+            "return [JSON.stringify(Object.assign({}, window.localStorage)),"
+            " JSON.stringify(Object.assign({}, window.sessionStorage))];")
+        dados = {
+            "criado_em": time.time(),
+            "url": driver.current_url,
+            "user_agent": driver.execute_script("return navigator.userAgent;"),
+            "cookies": capturar_cookies_driver(driver),
+            "local_storage": json.loads(storage[0] or "{}"),
+            "session_storage": json.loads(storage[1] or "{}"),
+        }
+        conteudo = _MAGIC_SESSAO + salt + fernet.encrypt(json.dumps(dados).encode("utf-8"))
+        caminho_tmp = f"{caminho_sessao}.{os.getpid()}.{threading.get_ident()}.tmp"
+        fd = os.open(caminho_tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(conteudo)
+        os.replace(caminho_tmp, caminho_sessao)
+        print(f"  [Sessão PJe] Sessão autenticada salva em: {caminho_sessao}")
+        return True
+    except Exception as e:
+        print(f"  [Sessão PJe] AVISO: não foi possível salvar a sessão: {type(e).__name__} - {e}")
+        return False
+
+
+def carregar_sessao_pje(caminho_sessao, chave_secreta):
+    """Lê e descriptografa a sessão salva. Retorna o dicionário da sessão ou None."""
+    if not os.path.exists(caminho_sessao):
+        return None
+    try:
+        with open(caminho_sessao, "rb") as f:
+            conteudo = f.read()
+        if not conteudo.startswith(_MAGIC_SESSAO):
+            print("  [Sessão PJe] Arquivo de sessão em formato desconhecido. Ignorando.")
+            return None
+        salt = conteudo[len(_MAGIC_SESSAO):len(_MAGIC_SESSAO) + 16]
+        fernet = _fernet(chave_secreta, salt)
+        if fernet is None:
+            return None
+        return json.loads(fernet.decrypt(conteudo[len(_MAGIC_SESSAO) + 16:]))
+    except Exception as e:
+        print(f"  [Sessão PJe] Sessão salva ilegível ({type(e).__name__}). Será feito login completo.")
+        return None
+
+
+def sessao_ainda_valida(dados_sessao, url_pje_home):
+    """Verificação barata: um único GET em home.seam, sem seguir redirecionamentos.
+
+    A sessão é válida se o PJe responder 200 sem mandar para o SSO (sso.cloud.pje.jus.br).
+    """
+    import requests
+
+    try:
+        sessao = criar_sessao_http(dados_sessao["cookies"], dados_sessao.get("user_agent"))
+        resposta = sessao.get(url_pje_home, allow_redirects=False, timeout=_TIMEOUT_VERIFICACAO)
+        resposta.close()
+    except requests.RequestException as e:
+        print(f"  [Sessão PJe] Falha na verificação da sessão salva: {e}")
+        return False
+    if resposta.status_code != 200:
+        print(f"  [Sessão PJe] Sessão salva expirada (HTTP {resposta.status_code} em home.seam).")
+        return False
+    return "sso.cloud.pje.jus.br" not in resposta.url
+
+
+def restaurar_sessao_no_driver(driver, dados_sessao, url_pje_home):
+    """Injeta cookies e storage salvos no navegador e abre home.seam. Retorna True se caiu no painel logado."""
+    cookies = []
+    for c in dados_sessao["cookies"]:
+        cookie = {k: c[k] for k in _CAMPOS_COOKIE_CDP if k in c}
+        if c.get("session") or cookie.get("expires", -1) < 0:
+            cookie.pop("expires", None)
+        cookies.append(cookie)
+    driver.execute_cdp_cmd("Network.setCookies", {"cookies": cookies})
+
+    driver.get(url_pje_home)
+    pje_scraper.aguardar_pagina_pronta(driver)
+    origem_home = "{0.scheme}://{0.netloc}".format(urlparse(url_pje_home))
+    if dados_sessao.get("url", "").startswith(origem_home):
+        driver.execute_script(
+            "for (const [k, v] of Object.entries(arguments[0])) { window.localStorage.setItem(k, v); }"
+            "for (const [k, v] of Object.entries(arguments[1])) { window.sessionStorage.setItem(k, v); }",
+            dados_sessao.get("local_storage", {}), dados_sessao.get("session_storage", {}))
+    url_atual = driver.current_url
+    return "home.seam" in url_atual and "sso.cloud.pje.jus.br" not in url_atual
+
+
+def login_pje_trf3_com_sessao(driver, usuario, senha, pasta_debug, caminho_sessao, url_pje_home, chave_secreta=None):
+    """Reaproveita a sessão salva quando ainda válida; caso contrário faz o login completo e salva a nova sessão."""
+    chave_secreta = chave_secreta or senha
+
+    def _restaurar_sessao_salva():
+        dados = carregar_sessao_pje(caminho_sessao, chave_secreta)
+        if not dados or not sessao_ainda_valida(dados, url_pje_home):
+            return False
+        try:
+            if restaurar_sessao_no_driver(driver, dados, url_pje_home):
+                print(f"  [Sessão PJe] Sessão salva reaproveitada. Login completo dispensado. URL: {driver.current_url}")
+                return True
+        except Exception as e:
+            print(f"  [Sessão PJe] Falha ao restaurar sessão salva no navegador: {type(e).__name__} - {e}")
+        print("  [Sessão PJe] Sessão salva não foi aceita pelo navegador. Será feito login completo.")
+        return False
+
+    def _tentar_sessao_salva():
+        with pje_metricas.span("login.sessao_salva") as span_sessao:
+            if _restaurar_sessao_salva():
+                return True
+            span_sessao.resultado = pje_metricas.FALHA
+            return False
+
+    if _tentar_sessao_salva():
+        return True
+    with _login_pje_lock:
+        # Outro worker pode ter renovado a sessão enquanto este aguardava o lock
+        if _tentar_sessao_salva():
+            return True
+        if not pje_scraper.login_pje_trf3(driver, usuario, senha, pasta_debug=pasta_debug):
+            return False
+        salvar_sessao_pje(driver, caminho_sessao, chave_secreta)
+        return True
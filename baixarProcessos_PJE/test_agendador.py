@@ -0,0 +1,65 @@
+# test_agendador.py
+# Verificação automática do agendador adaptativo (pje_agendador), sem navegador.
+# Uso: python -m unittest test_agendador   (ou python -m pytest test_agendador.py)
+import time
+import unittest
+
+import pje_metricas
+import pje_agendador
+import benchmark_pje
+
+
+class TestAIMD(unittest.TestCase):
+    """Regras do limite de simultâneos, alimentadas com spans sintéticos."""
+
+    def setUp(self):
+        self.agendador = pje_agendador.AgendadorPJe(8, intervalo_reducao=0.0)
+
+    def tearDown(self):
+        self.agendador.fechar()
+
+    def test_timeout_reduz_limite_a_metade(self):
+        pje_metricas.registrar_span("acesso.passo4_aba_autos", 30.0, pje_metricas.ERRO, erro="TimeoutException")
+        self.assertEqual(int(self.agendador.limite), 4)
+        self.assertEqual(self.agendador.sinais["timeout"], 1)
+
+    def test_503_reduz_e_suspende_o_host(self):
+        url = "https://pje1g.trf3.jus.br/pje/home.seam"
+        self.agendador.registrar_resposta_http(url, 503, retry_after="2")
+        self.assertEqual(int(self.agendador.limite), 4)
+        self.assertGreater(self.agendador.reservar_host(url), 1.0)
+
+    def test_rodada_sem_sobrecarga_aumenta_um(self):
+        pje_metricas.registrar_span("acesso.passo4_aba_autos", 30.0, pje_metricas.ERRO, erro="TimeoutException")
+        # +1/limite por processo concluído: pouco mais de uma rodada de 4 leva o limite de 4 a 5
+        for _ in range(5):
+            pje_metricas.registrar_span("processo.total", 1.0, pje_metricas.OK)
+        self.assertEqual(int(self.agendador.limite), 5)
+
+    def test_limite_bloqueia_vagas(self):
+        agendador = pje_agendador.AgendadorPJe(2)
+        try:
+            self.assertTrue(agendador.tentar_ocupar_vaga())
+            self.assertTrue(agendador.tentar_ocupar_vaga())
+            self.assertFalse(agendador.tentar_ocupar_vaga())
+            agendador.liberar_vaga()
+            self.assertTrue(agendador.tentar_ocupar_vaga())
+        finally:
+            agendador.fechar()
+
+
+class TestConvergencia(unittest.TestCase):
+    """O mesmo cenário de `benchmark_pje.py --convergencia`, encurtado: o limite precisa assentar perto da
+    capacidade do servidor simulado."""
+
+    def test_limite_medio_perto_da_capacidade(self):
+        inicio = time.monotonic()
+        resultado = benchmark_pje.executar_convergencia(capacidade=4, limite_max=16, duracao=20.0)
+        self.assertLess(time.monotonic() - inicio, 60.0)
+        self.assertTrue(resultado["convergiu"], resultado)
+        self.assertLess(resultado["limite_final"], resultado["limite_max"], resultado)
+        self.assertGreater(resultado["processos_por_hora"], 0, resultado)
+
+
+if __name__ == "__main__":
+    unittest.main()